@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of edx-dl, run them from the root of the repository with:
+
+    python -m benchmarks.<name>
+"""
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end benchmark of edx-dl against a local stand-in of Open edX
+
+Starts the stand-in of benchmarks.edx_server and runs edx-dl on all of its
+courses once for each number of download workers given (with the same
+number of downloads per host, since all the files come from the same
+host), each time in a new empty directory. Reports the courses downloaded
+per hour and the MB/s written to disk, along with the requests, throttled
+requests and faults seen by the stand-in.
+
+Usage:
+
+    python -m benchmarks.bench_end_to_end [--workers 1,4,16]
+        [--courses N] [--video-size MB] [--latency S] [--bandwidth MB/s]
+        [--throttle-rate R] [--fault-rate R] [--edx-dl-options OPTIONS]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from .edx_server import add_server_arguments, run_edx_dl, server_from_args
+
+
+def directory_size(path):
+    """
+    Returns the total size, in bytes, of the files under path.
+    """
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path)
+               for name in names)
+
+
+def run(server, workers, options):
+    """
+    Downloads all the courses of server with the given number of download
+    workers and returns a dict with the exit_code (or the name of the
+    exception raised), seconds, bytes written and the stats of the server.
+    """
+    directory = tempfile.mkdtemp(prefix='edx-dl-bench-')
+    cwd = os.getcwd()
+    server.reset_stats()
+    try:
+        # The files of edx-dl (limits, caches) are written in the current
+        # directory, so that runs don't influence each other
+        os.chdir(directory)
+        courses = [server.course_url(course)
+                   for course in range(1, server.courses + 1)]
+        started = time.time()
+        try:
+            exit_code = run_edx_dl(server, [
+                '--output-dir', 'Downloaded',
+                '--download-workers', str(workers),
+                '--downloads-per-host', str(workers),
+                '--prefer-cdn-videos', '--with-subtitles',
+            ] + options + courses)
+        except Exception as e:
+            # e.g., the faults injected made edx-dl give up
+            exit_code = type(e).__name__
+        seconds = time.time() - started
+        written = directory_size(os.path.join(directory, 'Downloaded'))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result = {'exit_code': exit_code, 'seconds': seconds, 'bytes': written}
+    result.update(server.stats)
+    return result
+
+
+def report(server, results):
+    row = '%8s %10s %12s %9s %9s %10s %7s %6s'
+    print(row % ('workers', 'seconds', 'courses/h', 'MB/s', 'MB',
+                 'requests', '429s', 'faults'))
+    for workers, result in results:
+        seconds = result['seconds']
+        print(row % (workers, '%.2f' % seconds,
+                     '%.1f' % (server.courses / seconds * 3600),
+                     '%.2f' % (result['bytes'] / seconds / 1e6),
+                     '%.1f' % (result['bytes'] / 1e6),
+                     result['requests'], result['throttled'],
+                     result['faults']) +
+              ('' if result['exit_code'] == 0 else
+               '  (failed: %s)' % result['exit_code']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    add_server_arguments(parser)
+    parser.add_argument('--workers', default='1,4,16',
+                        help='comma separated numbers of download workers')
+    parser.add_argument('--edx-dl-options', default='--quiet',
+                        help='other options given to edx-dl')
+    args = parser.parse_args()
+
+    workers = [int(n) for n in args.workers.split(',')]
+    options = args.edx_dl_options.split()
+    with server_from_args(args) as server:
+        results = [(n, run(server, n, options)) for n in workers]
+    report(server, results)
+
+
+if __name__ == '__main__':
+    main()
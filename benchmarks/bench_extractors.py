@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the page extractors over the pages in test/html
+
+Measures the throughput (pages/s and MB/s) and the peak memory allocated
+by each method of each PageExtractor class on each page:
+extract_units_from_html, extract_sections_from_html and
+extract_courses_from_html, and by edx_json2srt on the documents in
+test/json. The pages with units are also scaled up to 10 and 100 times
+their units, and the transcripts to 10 and 100 times their entries.
+
+The results can be saved as a baseline, and later runs compared with it
+to spot regressions. Timings depend on the machine, so baselines should
+only be compared on the one where they were saved.
+
+Usage:
+
+    python -m benchmarks.bench_extractors [--filter TEXT]
+        [--save-baseline FILE] [--compare FILE [--tolerance 0.2]]
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from edx_dl.common import DEFAULT_FILE_FORMATS
+from edx_dl.parsing import (
+    ClassicEdXPageExtractor,
+    CurrentEdXPageExtractor,
+    NewEdXPageExtractor,
+    edx_json2srt,
+    split_units,
+)
+
+from .fixtures import BASE_URL, html_fixtures, json_fixtures, time_per_call
+
+
+EXTRACTORS = [ClassicEdXPageExtractor, CurrentEdXPageExtractor,
+              NewEdXPageExtractor]
+
+SCALES = [10, 100]
+
+
+def scale_page(page, factor):
+    """
+    Returns page with the part from its first unit to its last one repeated
+    factor times, or None if it has no units.
+    """
+    units = split_units(page)
+    if not units:
+        return None
+    start = page.index(units[0])
+    end = page.rindex(units[-1]) + len(units[-1])
+    return page[:start] + page[start:end] * factor + page[end:]
+
+
+def scale_transcript(transcript, factor):
+    """
+    Returns the JSON transcript with its entries repeated factor times, one
+    after the other, or None if it has no entries.
+    """
+    if not transcript.get('start'):
+        return None
+    duration = max(transcript['end'])
+    scaled = {'start': [], 'end': [], 'text': []}
+    for i in range(factor):
+        scaled['start'] += [s + i * duration for s in transcript['start']]
+        scaled['end'] += [e + i * duration for e in transcript['end']]
+        scaled['text'] += transcript['text']
+    return scaled
+
+
+def build_cases():
+    """
+    Returns the list of (name, func, size in bytes) to be measured.
+    """
+    cases = []
+    pages = html_fixtures()
+    for extractor_class in EXTRACTORS:
+        extractor = extractor_class()
+        prefix = extractor_class.__name__
+        for name, page in pages:
+            cases.append(('%s.units/%s' % (prefix, name),
+                          lambda e=extractor, p=page:
+                          e.extract_units_from_html(p, BASE_URL,
+                                                    DEFAULT_FILE_FORMATS),
+                          page))
+            cases.append(('%s.sections/%s' % (prefix, name),
+                          lambda e=extractor, p=page:
+                          e.extract_sections_from_html(p, BASE_URL),
+                          page))
+            cases.append(('%s.courses/%s' % (prefix, name),
+                          lambda e=extractor, p=page:
+                          e.extract_courses_from_html(p, BASE_URL),
+                          page))
+            for factor in SCALES:
+                scaled = scale_page(page, factor)
+                if scaled is None:
+                    continue
+                cases.append(('%s.units/%s x%d' % (prefix, name, factor),
+                              lambda e=extractor, p=scaled:
+                              e.extract_units_from_html(p, BASE_URL,
+                                                        DEFAULT_FILE_FORMATS),
+                              scaled))
+
+    for name, transcript in json_fixtures():
+        variants = [(name, transcript)]
+        for factor in SCALES:
+            scaled = scale_transcript(transcript, factor)
+            if scaled is not None:
+                variants.append(('%s x%d' % (name, factor), scaled))
+        for variant_name, variant in variants:
+            cases.append(('edx_json2srt/%s' % variant_name,
+                          lambda t=variant: edx_json2srt(t),
+                          json.dumps(variant)))
+
+    return [(name, func, len(text.encode('utf-8')))
+            for name, func, text in cases]
+
+
+def peak_memory(func):
+    """
+    Returns the peak memory, in bytes, allocated while calling func, or
+    None if it can't be measured.
+    """
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(cases, min_time):
+    """
+    Returns a dict {case name: result} with the pages_per_s, mb_per_s and
+    peak_kb of each case.
+    """
+    results = {}
+    for name, func, size in cases:
+        seconds = time_per_call(func, min_time)
+        peak = peak_memory(func)
+        results[name] = {
+            'pages_per_s': 1.0 / seconds,
+            'mb_per_s': size / seconds / 1e6,
+            'peak_kb': peak / 1024.0 if peak is not None else None,
+        }
+    return results
+
+
+def report(results, baseline=None, tolerance=0.2):
+    """
+    Prints the results, compared with baseline if given, and returns the
+    names of the cases more than tolerance slower than in the baseline.
+    """
+    regressions = []
+    row = '%-72s %10s %9s %10s %9s'
+    print(row % ('case', 'pages/s', 'MB/s', 'peak KB', 'vs base'))
+    for name in sorted(results):
+        result = results[name]
+        peak = result['peak_kb']
+        change = ''
+        if baseline is not None and name in baseline:
+            ratio = result['pages_per_s'] / baseline[name]['pages_per_s']
+            change = '%+.0f%%' % ((ratio - 1) * 100)
+            if ratio < 1 - tolerance:
+                regressions.append(name)
+                change += ' !'
+        print(row % (name, '%.1f' % result['pages_per_s'],
+                     '%.2f' % result['mb_per_s'],
+                     '%.0f' % peak if peak is not None else 'n/a', change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--filter', default='',
+                        help='only run the cases whose name contains TEXT')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum time, in seconds, spent on each case')
+    parser.add_argument('--save-baseline', metavar='FILE',
+                        help='save the results in FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results with the baseline in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction of the baseline throughput that can '
+                        'be lost before reporting a regression')
+    args = parser.parse_args()
+
+    cases = [case for case in build_cases() if args.filter in case[0]]
+    results = measure(cases, args.min_time)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if regressions:
+        print('\n%d regressions:\n  %s' % (len(regressions),
+                                          '\n  '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
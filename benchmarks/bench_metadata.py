@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark of the decoding of the data-metadata attributes of videos
+
+Compares decode_video_metadata from edx_dl.parsing with the previous
+decoding, which created two HTML parsers per video, unescaped with them,
+and compiled the regular expression of the streams in the loop. The
+attributes come from test/html/multiple_units_multiple_youtube_videos.html.
+
+Usage:
+
+    python -m benchmarks.bench_metadata [--number N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import re
+import timeit
+
+from six.moves import html_parser
+
+from edx_dl import parsing
+from edx_dl.parsing import RE_METADATA, decode_video_metadata
+from edx_dl.utils import unescape_html
+
+from .fixtures import HTML_DIR
+
+
+PAGE = os.path.join(HTML_DIR, 'multiple_units_multiple_youtube_videos.html')
+
+
+def legacy_unescape(text):
+    # HTMLParser().unescape was removed in Python 3.9, where it was
+    # html.unescape, but we still pay for creating the parser
+    return getattr(html_parser.HTMLParser(), 'unescape', unescape_html)(text)
+
+
+def legacy_decode_video_metadata(match_metadata):
+    """
+    The decoding as it was in CurrentEdXPageExtractor.extract_unit.
+    """
+    metadata = legacy_unescape(match_metadata)
+    metadata = json.loads(legacy_unescape(metadata))
+    youtube_id = None
+    re_video_speed = re.compile(r'1.0\d+\:(?:.*?)(.{11})')
+    match_video_youtube_url = re_video_speed.search(metadata['streams'])
+    if match_video_youtube_url is not None:
+        youtube_id = match_video_youtube_url.group(1)
+    return (youtube_id,
+            metadata['transcriptAvailableTranslationsUrl'],
+            metadata['transcriptTranslationUrl'].replace('__lang__', '%s'),
+            tuple(url for url in metadata['sources'] if url.endswith('.mp4')))
+
+
+def decode_without_cache(match_metadata):
+    parsing._metadata_cache.clear()
+    return decode_video_metadata(match_metadata)
+
+
+def run(number):
+    with io.open(PAGE, 'r', encoding='utf-8') as f:
+        metadatas = RE_METADATA.findall(f.read())
+
+    decoders = [('legacy', legacy_decode_video_metadata),
+                ('decoder, cold cache', decode_without_cache),
+                ('decoder, warm cache', decode_video_metadata)]
+
+    expected = [legacy_decode_video_metadata(m) for m in metadatas]
+    for name, decode in decoders:
+        assert [decode(m) for m in metadatas] == expected, name
+
+    print('%d data-metadata attributes, %d runs' % (len(metadatas), number))
+    print('%-24s %14s' % ('decoder', 'us/attribute'))
+    for name, decode in decoders:
+        elapsed = min(timeit.repeat(lambda: [decode(m) for m in metadatas],
+                                    number=number, repeat=3))
+        print('%-24s %14.2f' % (name,
+                                elapsed / number / len(metadatas) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--number', type=int, default=1000,
+                        help='number of times the page is decoded')
+    args = parser.parse_args()
+    run(args.number)
+
+
+if __name__ == '__main__':
+    main()
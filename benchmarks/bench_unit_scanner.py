@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the extraction of units from subsection pages
+
+Compares the single pass scanner of edx_dl.parsing with the previous
+extractor, which searched each unit with one regular expression per kind
+of resource, on the pages in test/html and on adversarial pages built to
+trigger the worst case of the regular expressions.
+
+Usage:
+
+    python -m benchmarks.bench_unit_scanner [--repeat N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import re
+
+from edx_dl.common import DEFAULT_FILE_FORMATS, Unit, Video
+from edx_dl.parsing import ClassicEdXPageExtractor
+
+from .fixtures import BASE_URL, best_time, html_fixtures
+
+# Past this time (in seconds) an extractor is not run on bigger sizes of
+# the same adversarial page
+MAX_TIME = 10.0
+
+
+class LegacyExtractor(ClassicEdXPageExtractor):
+    """
+    The extractor as it was before the single pass scanner, kept here as a
+    reference.
+    """
+
+    def extract_units_from_html(self, page, BASE_URL, file_formats):
+        re_units = re.compile('(<div?[^>]id="seq_contents_\d+".*?>.*?<\/div>)',
+                              re.DOTALL)
+        units = []
+
+        for unit_html in re_units.findall(page):
+            unit = self.extract_unit(unit_html, BASE_URL, file_formats)
+            if len(unit.videos) > 0 or len(unit.resources_urls) > 0:
+                units.append(unit)
+        return units
+
+    def extract_unit(self, text, BASE_URL, file_formats):
+        video_youtube_url = self.extract_video_youtube_url(text)
+        available_subs_url, sub_template_url = self.extract_subtitle_urls(text, BASE_URL)
+        mp4_urls = self.extract_mp4_urls(text)
+        videos = [Video(video_youtube_url=video_youtube_url,
+                        available_subs_url=available_subs_url,
+                        sub_template_url=sub_template_url,
+                        mp4_urls=mp4_urls)]
+
+        resources_urls = self.extract_resources_urls(text, BASE_URL,
+                                                     file_formats)
+        return Unit(videos=videos, resources_urls=resources_urls)
+
+    def extract_video_youtube_url(self, text):
+        re_video_youtube_url = re.compile(r'data-streams=&#34;.*?1.0\d+\:(?:.*?)(.{11})')
+        video_youtube_url = None
+        match_video_youtube_url = re_video_youtube_url.search(text)
+
+        if match_video_youtube_url is None:
+            re_video_youtube_url = re.compile(r'https://www.youtube.com/embed/(.{11})\?rel=')
+            match_video_youtube_url = re_video_youtube_url.search(text)
+
+        if match_video_youtube_url is not None:
+            video_id = match_video_youtube_url.group(1)
+            video_youtube_url = 'https://youtube.com/watch?v=' + video_id
+
+        return video_youtube_url
+
+    def extract_subtitle_urls(self, text, BASE_URL):
+        re_sub_template_url = re.compile(r'data-transcript-translation-url=(?:&#34;|")([^"&]*)(?:&#34;|")')
+        re_available_subs_url = re.compile(r'data-transcript-available-translations-url=(?:&#34;|")([^"&]*)(?:&#34;|")')
+        available_subs_url = None
+        sub_template_url = None
+        match_subs = re_sub_template_url.search(text)
+
+        if match_subs:
+            match_available_subs = re_available_subs_url.search(text)
+            if match_available_subs:
+                available_subs_url = BASE_URL + match_available_subs.group(1)
+                sub_template_url = BASE_URL + match_subs.group(1) + "/%s"
+
+        else:
+            re_available_subs_url = re.compile(r'href=(?:&#34;|")([^"&]+)(?:&#34;|")&gt;Download transcript&lt;')
+            match_available_subs = re_available_subs_url.search(text)
+            if match_available_subs:
+                sub_template_url = BASE_URL + match_available_subs.group(1)
+                available_subs_url = None
+
+        return available_subs_url, sub_template_url
+
+    def extract_mp4_urls(self, text):
+        re_mp4_urls = re.compile(r'(?:(https?://[^;]*?\.mp4))')
+        return list(set(re_mp4_urls.findall(text)))
+
+    def extract_resources_urls(self, text, BASE_URL, file_formats):
+        formats = '|'.join(file_formats)
+        re_resources_urls = re.compile(r'&lt;a href=(?:&#34;|")([^"&]*.(?:' + formats + '))(?:&#34;|")')
+        resources_urls = []
+        for url in re_resources_urls.findall(text):
+            if url.startswith('http') or url.startswith('https'):
+                resources_urls.append(url)
+            elif url.startswith('//'):
+                resources_urls.append('https:' + url)
+            else:
+                resources_urls.append(BASE_URL + url)
+
+        re_youtube_links = re.compile(r'&lt;a href=(?:&#34;|")(https?\:\/\/(?:www\.)?(?:youtube\.com|youtu\.?be)\/.*?)(?:&#34;|")')
+        resources_urls += re_youtube_links.findall(text)
+
+        return resources_urls
+
+
+def _unit(body):
+    return '<div id="seq_contents_0">' + body + '</div>'
+
+
+# name: (function building a page of the given size, sizes)
+ADVERSARIAL_PAGES = [
+    # Many urls and no semicolon: 'https?://[^;]*?\.mp4' is tried from
+    # each of them up to the end of the unit
+    ('many urls', lambda n: _unit('http://x/' * n), [1000, 2000, 4000]),
+    # An unterminated data-streams attribute per line
+    ('unterminated streams',
+     lambda n: _unit(('data-streams=&#34;' + 'x' * 50 + '\n') * n),
+     [1000, 2000, 4000]),
+    # The same, all in a single line
+    ('unterminated streams, one line',
+     lambda n: _unit(('data-streams=&#34;' + 'x' * 50) * n),
+     [250, 500, 1000]),
+    # Units which are never closed: each of them is tried up to the end
+    # of the page
+    ('unclosed units', lambda n: '<div id="seq_contents_1">' * n,
+     [100, 200, 400]),
+]
+
+
+def run(repeat):
+    extractors = [('legacy', LegacyExtractor()),
+                  ('scanner', ClassicEdXPageExtractor())]
+    row = '%-44s %8s %12s %12s'
+    print(row % ('page', 'size', 'legacy (s)', 'scanner (s)'))
+
+    for name, page in html_fixtures():
+        times = [best_time(lambda: extractor.extract_units_from_html(
+                               page, BASE_URL, DEFAULT_FILE_FORMATS), repeat)
+                 for _, extractor in extractors]
+        print(row % ((name, len(page)) +
+                     tuple('%.5f' % t for t in times)))
+
+    for name, make_page, sizes in ADVERSARIAL_PAGES:
+        too_slow = set()
+        for size in sizes:
+            page = make_page(size)
+            times = []
+            for extractor_name, extractor in extractors:
+                if extractor_name in too_slow:
+                    times.append('skipped')
+                    continue
+                t = best_time(lambda: extractor.extract_units_from_html(
+                    page, BASE_URL, DEFAULT_FILE_FORMATS), repeat)
+                if t > MAX_TIME:
+                    too_slow.add(extractor_name)
+                times.append('%.5f' % t)
+            print(row % ((name, len(page)) + tuple(times)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each case, the best is kept')
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,564 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-in of an Open edX site
+
+Serves, on a random port of 127.0.0.1, everything edx-dl requests from a
+real site: the CSRF token, the login, the dashboard, the course outlines,
+the subsection pages (built from the pages in test/html), the transcripts
+and the files linked from the units, with synthetic content of the sizes
+given (large ones for the videos). Latency, limited bandwidth, throttling
+(429 with Retry-After) and faults (503 and dropped connections) can be
+injected in the responses.
+
+Every absolute URL of the pages is rewritten to /cdn/ of the stand-in, with
+the position of the subsection in the path, so that no request leaves the
+machine and no file is shared between subsections.
+
+Usage:
+
+    python -m benchmarks.edx_server [--courses N] [--latency S] ...
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from edx_dl import edx_dl
+from edx_dl.common import DEFAULT_FILE_FORMATS
+from edx_dl.parsing import ClassicEdXPageExtractor
+
+from .fixtures import JSON_DIR, html_fixtures
+
+MB = 1024 * 1024
+
+USERNAME = 'student@example.com'
+PASSWORD = 'edx'
+
+CSRF_TOKEN = 'benchmarkcsrftoken'
+SESSION_ID = 'benchmarksessionid'
+
+# The site as it should be added to edx_dl.OPENEDX_SITES
+COURSEWARE_SELECTOR = ('nav', {'aria-label': 'Course Navigation'})
+
+# Requests which are never throttled nor failed, so that edx-dl can always
+# log in and find the courses
+RELIABLE_PATHS = ['/user_api/v1/account/login_session', '/login_ajax',
+                  '/dashboard']
+
+RE_ABSOLUTE_URL = re.compile(r'https?://(?=[a-zA-Z0-9])')
+RE_STATIC_URL = re.compile(r'(&#34;|&quot;|")/static/')
+RE_SUBSECTION = re.compile(
+    r'^/courses/bench/C(\d+)/run/courseware/s(\d+)/ss(\d+)/?$')
+RE_COURSEWARE = re.compile(r'^/courses/bench/C(\d+)/run/courseware/?$')
+RE_TAGGED_FILE = re.compile(r'^/(?:cdn|static)/C\d+/s\d+/ss\d+/')
+
+CONTENT_TYPES = {
+    '.mp4': 'video/mp4',
+    '.pdf': 'application/pdf',
+    '.txt': 'text/plain',
+    '.srt': 'text/plain',
+}
+
+# Content of the synthetic files, repeated up to their size
+FILE_BLOCK = bytearray(range(256)) * 256
+
+# Bytes written at once when the bandwidth is limited
+WRITE_SIZE = 16 * 1024
+
+
+def subsection_pages():
+    """
+    Returns the pages in test/html with units, as seen by the extractor
+    used for sites other than edX.
+    """
+    extractor = ClassicEdXPageExtractor()
+    return [page for _, page in html_fixtures()
+            if extractor.extract_units_from_html(page, '',
+                                                 DEFAULT_FILE_FORMATS)]
+
+
+def transcript_document():
+    """
+    Returns the text of the JSON transcript served for every video.
+    """
+    with io.open(os.path.join(JSON_DIR, 'abridged-01.json'), 'rb') as f:
+        return f.read()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class EdXServer(object):
+    """
+    Local stand-in of an Open edX site, with courses bench/C1/run ...
+    bench/C<courses>/run, each one with the given number of sections and
+    of subsections per section. The subsection pages cycle through the
+    pages in test/html which have units.
+
+    latency is the time, in seconds, waited before answering each request,
+    bandwidth the maximum bytes per second of each response (None means no
+    limit), and throttle_rate and fault_rate the fractions of the requests
+    (but RELIABLE_PATHS) answered with 429, and with a 503 or a connection
+    dropped in the middle of the body. The faults are drawn from a random
+    generator seeded with seed, so runs can be repeated.
+
+    Usage:
+
+    >>> with EdXServer(courses=2, video_size=MB, latency=0.05) as server:
+    ...     server.course_url(1)
+    'http://127.0.0.1:.../courses/bench/C1/run/info'
+    """
+
+    def __init__(self, courses=1, sections=2, subsections=2,
+                 video_size=8 * MB, resource_size=64 * 1024,
+                 latency=0, bandwidth=None, throttle_rate=0, fault_rate=0,
+                 username=USERNAME, password=PASSWORD, seed=0):
+        self.courses = courses
+        self.sections = sections
+        self.subsections = subsections
+        self.video_size = video_size
+        self.resource_size = resource_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle_rate = throttle_rate
+        self.fault_rate = fault_rate
+        self.username = username
+        self.password = password
+
+        self.pages = subsection_pages()
+        self.transcript = transcript_document()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+
+        self._server = None
+        self._thread = None
+        self.url = None
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        """
+        server = _ThreadingHTTPServer(('127.0.0.1', 0), _EdXRequestHandler)
+        server.edx = self
+        self._server = server
+        self.url = 'http://127.0.0.1:%d' % server.server_port
+        self._thread = threading.Thread(target=server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving and closes the listening socket.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def site(self):
+        """
+        Returns the entry of the stand-in for edx_dl.OPENEDX_SITES.
+        """
+        return {'url': self.url, 'courseware-selector': COURSEWARE_SELECTOR}
+
+    def course_url(self, course):
+        """
+        Returns the url of the course number course (starting at 1), as
+        listed in the dashboard.
+        """
+        return '%s/courses/bench/C%d/run/info' % (self.url, course)
+
+    def reset_stats(self):
+        """
+        Sets to zero the counters of requests, bytes sent, throttled
+        requests and faults.
+        """
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes_sent': 0, 'throttled': 0,
+                          'faults': 0}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def draw_failure(self, path):
+        """
+        Returns the failure injected in the response to the request of
+        path: 'throttle', 'error' (a 503), 'drop' (the connection is closed
+        halfway through the body) or None.
+        """
+        if path in RELIABLE_PATHS:
+            return None
+        with self._lock:
+            value = self._random.random()
+            drop = self._random.random() < 0.5
+        if value < self.throttle_rate:
+            self.count('throttled')
+            return 'throttle'
+        if value < self.throttle_rate + self.fault_rate:
+            self.count('faults')
+            return 'drop' if drop else 'error'
+        return None
+
+    def dashboard_page(self):
+        articles = ''.join(
+            '<article class="course"><h3 class="course-title">Course %d</h3>'
+            '<a href="/courses/bench/C%d/run/info">View Course</a></article>'
+            % (course, course)
+            for course in range(1, self.courses + 1))
+        return '<html><body><main>%s</main></body></html>' % articles
+
+    def courseware_page(self, course):
+        chapters = []
+        for section in range(1, self.sections + 1):
+            items = ''.join(
+                '<li><a href="/courses/bench/C%d/run/courseware/s%d/ss%d/">'
+                '<p>Subsection %d</p></a></li>'
+                % (course, section, subsection, subsection)
+                for subsection in range(1, self.subsections + 1))
+            chapters.append('<div class="chapter"><h3><a href="#">Section %d'
+                            '</a></h3><ul>%s</ul></div>' % (section, items))
+        return ('<html><body><nav aria-label="Course Navigation">%s</nav>'
+                '</body></html>' % ''.join(chapters))
+
+    def subsection_page(self, course, section, subsection):
+        index = ((course - 1) * self.sections + section - 1) * \
+            self.subsections + subsection - 1
+        page = self.pages[index % len(self.pages)]
+        tag = 'C%d/s%d/ss%d/' % (course, section, subsection)
+        page = RE_ABSOLUTE_URL.sub('%s/cdn/%s' % (self.url, tag), page)
+        return RE_STATIC_URL.sub(r'\1/static/' + tag, page)
+
+    def file_size(self, path):
+        if path.endswith('.mp4'):
+            return self.video_size
+        return self.resource_size
+
+
+class _EdXRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    _form = {}
+    _truncate = False
+
+    @property
+    def edx(self):
+        return self.server.edx
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self._form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self._handle(send_body=True)
+
+    def _handle(self, send_body):
+        edx = self.edx
+        edx.count('requests')
+        if edx.latency:
+            time.sleep(edx.latency)
+
+        path = urlparse(self.path).path
+        failure = edx.draw_failure(path)
+        if failure == 'throttle':
+            return self._send(429, b'Too Many Requests', send_body,
+                              extra_headers={'Retry-After': '1'})
+        if failure == 'error':
+            return self._send(503, b'Service Unavailable', send_body)
+        self._truncate = failure == 'drop'
+
+        try:
+            self._route(path, send_body)
+        except _Unauthorized:
+            self._send(403, b'Forbidden', send_body)
+
+    def _route(self, path, send_body):
+        edx = self.edx
+        if path == '/user_api/v1/account/login_session':
+            return self._send(200, b'{}', send_body, 'application/json',
+                              cookies={'csrftoken': CSRF_TOKEN})
+        if path == '/login_ajax' and self.command == 'POST':
+            return self._login(send_body)
+        if path == '/dashboard':
+            self._check_session()
+            return self._send_html(edx.dashboard_page(), send_body)
+
+        match = RE_COURSEWARE.match(path)
+        if match and int(match.group(1)) <= edx.courses:
+            self._check_session()
+            return self._send_html(edx.courseware_page(int(match.group(1))),
+                                   send_body)
+
+        match = RE_SUBSECTION.match(path)
+        if match:
+            course, section, subsection = [int(g) for g in match.groups()]
+            if course <= edx.courses and section <= edx.sections and \
+               subsection <= edx.subsections:
+                self._check_session()
+                return self._send_html(
+                    edx.subsection_page(course, section, subsection),
+                    send_body)
+
+        if '/handler/transcript/' in path:
+            self._check_session()
+            return self._transcript(path, send_body)
+
+        if RE_TAGGED_FILE.match(path):
+            return self._send_file(edx.file_size(path), path, send_body)
+
+        return self._send(404, b'Not Found', send_body)
+
+    def _check_session(self):
+        if 'sessionid=' + SESSION_ID not in self.headers.get('Cookie', ''):
+            raise _Unauthorized()
+
+    def _login(self, send_body):
+        form = self._form
+        if self.headers.get('X-CSRFToken') != CSRF_TOKEN:
+            return self._send(403, b'CSRF verification failed', send_body)
+        if form.get('email') != [self.edx.username] or \
+           form.get('password') != [self.edx.password]:
+            body = json.dumps({'success': False,
+                               'value': 'Email or password is incorrect.'})
+            return self._send(400, body.encode('utf-8'), send_body,
+                              'application/json')
+        return self._send(200, b'{"success": true}', send_body,
+                          'application/json',
+                          cookies={'sessionid': SESSION_ID})
+
+    def _transcript(self, path, send_body):
+        action = path.rsplit('/handler/transcript/', 1)[1]
+        if action == 'available_translations':
+            return self._send(200, b'["en", "es"]', send_body,
+                              'application/json')
+        if action.startswith('translation/'):
+            return self._send(200, self.edx.transcript, send_body,
+                              'application/json')
+        if action == 'download':
+            return self._send(200, b'1\n00:00:00,000 --> 00:00:01,000\nHi\n',
+                              send_body, 'text/plain')
+        return self._send(404, b'Not Found', send_body)
+
+    def _send_html(self, page, send_body):
+        self._send(200, page.encode('utf-8'), send_body,
+                   'text/html; charset=utf-8')
+
+    def _send(self, status, body, send_body,
+              content_type='text/plain; charset=utf-8', cookies=None,
+              extra_headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (cookies or {}).items():
+            self.send_header('Set-Cookie', '%s=%s; Path=/' % (name, value))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self._write(body, len(body))
+
+    def _send_file(self, size, path, send_body):
+        """
+        Sends the synthetic file of the given size, or the part of it
+        asked in the Range header.
+        """
+        start, end = 0, size - 1
+        status = 200
+        range_ = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        etag = '"%d"' % size
+        if range_ and range_.startswith('bytes=') and \
+           if_range in (None, etag):
+            first, _, last = range_[len('bytes='):].partition('-')
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        ext = os.path.splitext(path)[1]
+        self.send_response(status)
+        self.send_header('Content-Type',
+                         CONTENT_TYPES.get(ext, 'application/octet-stream'))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if status == 206:
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end, size))
+        self.end_headers()
+        if send_body:
+            self._write(_file_chunks(start, end + 1), end - start + 1)
+
+    def _write(self, data, length):
+        """
+        Writes data (bytes or an iterable of them) of the given length,
+        within the bandwidth of the server, and closes the connection
+        halfway if a fault was injected.
+        """
+        if isinstance(data, bytes):
+            data = [data[i:i + WRITE_SIZE]
+                    for i in range(0, len(data), WRITE_SIZE)]
+        limit = length // 2 if self._truncate else None
+
+        bandwidth = self.edx.bandwidth
+        started = time.time()
+        sent = 0
+        for chunk in data:
+            if limit is not None and sent + len(chunk) > limit:
+                chunk = chunk[:limit - sent]
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if bandwidth:
+                delay = started + float(sent) / bandwidth - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            if limit is not None and sent >= limit:
+                self.close_connection = True
+                break
+        self.edx.count('bytes_sent', sent)
+
+
+class _Unauthorized(Exception):
+    pass
+
+
+def run_edx_dl(server, options, platform='bench'):
+    """
+    Runs edx_dl.main() against the stand-in server with the command line
+    options given (a list), in the current directory and with the
+    stand-in added to edx_dl.OPENEDX_SITES as platform. Returns the exit
+    code of edx-dl.
+    """
+    argv = sys.argv
+    edx_dl.OPENEDX_SITES[platform] = server.site()
+    sys.argv = ['edx-dl', '--platform', platform,
+                '--username', server.username,
+                '--password', server.password] + list(options)
+    try:
+        edx_dl.main()
+        return 0
+    except SystemExit as e:
+        return e.code or 0
+    finally:
+        sys.argv = argv
+        edx_dl.change_openedx_site('edx')
+        del edx_dl.OPENEDX_SITES[platform]
+
+
+def _file_chunks(start, end):
+    """
+    Yields the bytes start to end (exclusive) of a synthetic file in
+    chunks of at most WRITE_SIZE bytes.
+    """
+    block_size = len(FILE_BLOCK)
+    position = start
+    while position < end:
+        offset = position % block_size
+        size = min(WRITE_SIZE, block_size - offset, end - position)
+        yield bytes(FILE_BLOCK[offset:offset + size])
+        position += size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    print('Serving on %s, add it to edx_dl.OPENEDX_SITES as:' % server.url)
+    print('    %r' % server.site())
+    print('and log in as %s with password %s. Courses:' %
+          (server.username, server.password))
+    for course in range(1, args.courses + 1):
+        print('    %s' % server.course_url(course))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def add_server_arguments(parser):
+    """
+    Adds the options of the stand-in to the argparse parser.
+    """
+    parser.add_argument('--courses', type=int, default=2,
+                        help='number of courses')
+    parser.add_argument('--sections', type=int, default=2,
+                        help='number of sections of each course')
+    parser.add_argument('--subsections', type=int, default=2,
+                        help='number of subsections of each section')
+    parser.add_argument('--video-size', type=float, default=8,
+                        help='size of each video, in MB')
+    parser.add_argument('--resource-size', type=float, default=64,
+                        help='size of each other file, in KB')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds waited before answering each request')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='maximum MB/s of each response')
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='fraction of the requests answered with 429')
+    parser.add_argument('--fault-rate', type=float, default=0,
+                        help='fraction of the requests answered with 503 or '
+                        'with a connection dropped halfway')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the faults injected')
+
+
+def server_from_args(args):
+    """
+    Returns the EdXServer configured with the options added by
+    add_server_arguments.
+    """
+    return EdXServer(courses=args.courses,
+                     sections=args.sections,
+                     subsections=args.subsections,
+                     video_size=int(args.video_size * MB),
+                     resource_size=int(args.resource_size * 1024),
+                     latency=args.latency,
+                     bandwidth=args.bandwidth * MB if args.bandwidth else None,
+                     throttle_rate=args.throttle_rate,
+                     fault_rate=args.fault_rate,
+                     seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fixtures and timing helpers shared by the benchmarks
+"""
+
+import glob
+import io
+import json
+import os
+import time
+
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'test')
+HTML_DIR = os.path.join(TEST_DIR, 'html')
+JSON_DIR = os.path.join(TEST_DIR, 'json')
+
+BASE_URL = 'https://courses.edx.org'
+
+
+def html_fixtures():
+    """
+    Returns the list of (name, page) of the pages in test/html.
+    """
+    pages = []
+    for filename in sorted(glob.glob(os.path.join(HTML_DIR, '*.html'))):
+        with io.open(filename, 'r', encoding='utf-8') as f:
+            pages.append((os.path.basename(filename), f.read()))
+    return pages
+
+
+def json_fixtures():
+    """
+    Returns the list of (name, object) of the valid documents in test/json.
+    """
+    documents = []
+    for filename in sorted(glob.glob(os.path.join(JSON_DIR, '*.json'))):
+        with io.open(filename, 'r', encoding='utf-8') as f:
+            try:
+                documents.append((os.path.basename(filename), json.load(f)))
+            except ValueError:
+                pass  # some documents are invalid on purpose
+    return documents
+
+
+def best_time(func, repeat):
+    """
+    Returns the best time, in seconds, of repeat calls to func.
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        func()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_per_call(func, min_time):
+    """
+    Calls func repeatedly for at least min_time seconds (and at least
+    once) and returns the average time per call, in seconds.
+    """
+    calls = 0
+    started = time.time()
+    elapsed = 0
+    while calls == 0 or elapsed < min_time:
+        func()
+        calls += 1
+        elapsed = time.time() - started
+    return elapsed / calls
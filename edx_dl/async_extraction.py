@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""
+asyncio based extraction of units (Python 3.6+ only)
+
+The subsection pages are fetched concurrently from a single thread, which
+allows many more requests in flight than a pool of threads at a fraction of
+the cost. If aiohttp is installed it is used to make the requests,
+otherwise they are made with the shared requests session in a pool of as
+many threads as requests in flight.
+"""
+
+import asyncio
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .common import DEFAULT_ASYNC_CONCURRENCY
+from .transport import get_session
+from .page_cache import conditional_headers
+from .metrics import count_bytes, observe_request
+from .profiler import record, record_request
+from .rate_limit import get_rate_limiter
+from .retry import get_host, get_retry_policy, is_retryable
+from .utils import get_content_charset, get_page_response, get_response_text
+
+
+async def _fetch_with_aiohttp(client, url, headers):
+    """
+    Returns the status, headers and decoded contents of the page at url,
+    using the cookies of the shared requests session.
+    """
+    prepared = get_session().prepare_request(
+        requests.Request('GET', url, headers=headers))
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is not None:
+        await asyncio.sleep(rate_limiter.reserve_request(url))
+    started = time.time()
+    try:
+        async with client.get(url,
+                              headers=dict(prepared.headers)) as response:
+            response.raise_for_status()
+            body = await response.read()
+            content_type = response.headers.get('Content-Type', '')
+    except Exception as e:
+        reason = str(getattr(e, 'status', '')) or type(e).__name__
+        observe_request('page', url, time.time() - started, reason=reason)
+        raise
+    # The requests made with aiohttp don't go through the session
+    observe_request('page', url, time.time() - started,
+                    status=response.status)
+    count_bytes(len(body), 'page')
+    record_request(len(body))
+    if rate_limiter is not None:
+        await asyncio.sleep(rate_limiter.reserve_bytes(url, len(body)))
+    page = body.decode(get_content_charset(content_type))
+    return response.status, response.headers, page
+
+
+async def _retrying(url, attempt):
+    """
+    Returns await attempt(), a request to url, retried as told by the retry
+    policy of the run, without blocking the other coroutines while waiting.
+    """
+    policy = get_retry_policy()
+    if policy is None:
+        return await attempt()
+    host = get_host(url)
+    retry = 0
+    while True:
+        try:
+            policy.breaker.check(host)
+            try:
+                result = await attempt()
+            except Exception as e:
+                policy.breaker.record(host, failed=is_retryable(e))
+                raise
+            policy.breaker.record(host, failed=False)
+            return result
+        except Exception as e:
+            delay = policy.delay(url, retry, e)
+        await asyncio.sleep(delay)
+        retry += 1
+
+
+def _fetch_with_requests(url, headers):
+    """
+    Returns the status, headers and decoded contents of the page at url.
+    """
+    response = get_page_response(url, headers)
+    page = get_response_text(response) if response.status_code != 304 else ''
+    return response.status_code, response.headers, page
+
+
+async def extract_units_as_completed(urls, headers, file_formats, parse,
+                                     concurrency=DEFAULT_ASYNC_CONCURRENCY,
+                                     page_cache=None):
+    """
+    Asynchronous generator which yields a tuple (url, units) for each of
+    the urls as soon as its page has been fetched and parsed, keeping at
+    most concurrency requests in flight. parse is a function
+    parse(url, page, file_formats) returning the units of a page.
+
+    If a PageCache is given, the pages are requested conditionally and
+    only parsed again if they changed.
+    """
+    loop = asyncio.get_event_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    # The default executor of the loop has a fixed number of threads, which
+    # would limit the requests in flight instead of concurrency
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    client = None
+    if aiohttp is not None:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        client = aiohttp.ClientSession(connector=connector,
+                                       cookie_jar=aiohttp.DummyCookieJar())
+
+    async def fetch(url):
+        entry = None
+        request_headers = dict(headers)
+        if page_cache is not None:
+            entry = page_cache.lookup(url)
+            request_headers.update(conditional_headers(entry))
+
+        started = None
+
+        async def fetch_once():
+            nonlocal started
+            # The slot is given back while waiting to retry
+            async with semaphore:
+                if started is None:
+                    logging.info("Processing '%s'", url)
+                    started = time.time()
+                if client is not None:
+                    return await _fetch_with_aiohttp(client, url,
+                                                     request_headers)
+                return await loop.run_in_executor(executor,
+                                                  _fetch_with_requests,
+                                                  url, request_headers)
+
+        if client is not None:
+            response = await _retrying(url, fetch_once)
+        else:
+            # The requests made with the session are already retried
+            response = await fetch_once()
+        status, response_headers, page = response
+
+        # Parsed in the executor, so that the other coroutines keep fetching
+        # their pages in the meantime
+        if page_cache is None:
+            units = await loop.run_in_executor(executor, parse, url, page,
+                                               file_formats)
+        else:
+            units = await loop.run_in_executor(executor, page_cache.resolve,
+                                               url, entry, status,
+                                               response_headers, page,
+                                               file_formats, parse)
+        # The coroutines share a thread, so the pages can't be timed as
+        # spans of profile()
+        record('extraction/page', time.time() - started, url)
+        return url, units
+
+    tasks = [loop.create_task(fetch(url)) for url in urls]
+    try:
+        for next_completed in asyncio.as_completed(tasks):
+            yield await next_completed
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if client is not None:
+            await client.close()
+        executor.shutdown(wait=False)
+
+
+async def _collect_units(urls, headers, file_formats, parse, concurrency,
+                         page_cache, callback):
+    all_units = {}
+    async for url, units in extract_units_as_completed(urls, headers,
+                                                       file_formats, parse,
+                                                       concurrency,
+                                                       page_cache):
+        all_units[url] = units
+        if callback is not None:
+            callback(url, units)
+    return all_units
+
+
+def extract_all_units(urls, headers, file_formats, parse,
+                      concurrency=DEFAULT_ASYNC_CONCURRENCY, page_cache=None,
+                      callback=None):
+    """
+    Returns a dict of all the units in the given urls: {url, units}, in the
+    same order as urls, running extract_units_as_completed in a new event
+    loop. If a callback is given, callback(url, units) is called as soon as
+    the units of each url are extracted.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        all_units = loop.run_until_complete(
+            _collect_units(urls, headers, file_formats, parse, concurrency,
+                           page_cache, callback))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    return {url: all_units[url] for url in urls}
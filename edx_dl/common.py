@@ -131,6 +131,22 @@ class Unit(object):
         self.videos = videos
         self.resources_urls = resources_urls
 
+    def to_dict(self):
+        """
+        Returns a representation of the unit made of builtin types, which
+        can be serialized (e.g., as JSON).
+        """
+        return {'videos': [video.to_dict() for video in self.videos],
+                'resources_urls': self.resources_urls}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Builds a unit from the representation returned by to_dict.
+        """
+        return cls(videos=[Video.from_dict(video) for video in d['videos']],
+                   resources_urls=d['resources_urls'])
+
 
 class Video(object):
     """
@@ -156,6 +172,26 @@ class Video(object):
         self.sub_template_url = sub_template_url
         self.mp4_urls = mp4_urls
 
+    def to_dict(self):
+        """
+        Returns a representation of the video made of builtin types, which
+        can be serialized (e.g., as JSON).
+        """
+        return {'video_youtube_url': self.video_youtube_url,
+                'available_subs_url': self.available_subs_url,
+                'sub_template_url': self.sub_template_url,
+                'mp4_urls': self.mp4_urls}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Builds a video from the representation returned by to_dict.
+        """
+        return cls(video_youtube_url=d['video_youtube_url'],
+                   available_subs_url=d['available_subs_url'],
+                   sub_template_url=d['sub_template_url'],
+                   mp4_urls=d['mp4_urls'])
+
 
 class ExitCode(object):
     """
@@ -171,7 +207,25 @@ class ExitCode(object):
 
 
 YOUTUBE_DL_CMD = ['youtube-dl', '--ignore-config']
-DEFAULT_CACHE_FILENAME = 'edx-dl.cache'
+DEFAULT_CACHE_FILENAME = 'edx-dl.cache.db'
+LEGACY_CACHE_FILENAME = 'edx-dl.cache'
+DEFAULT_PAGE_CACHE_DIRNAME = 'edx-dl.pages'
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PAGE_CHUNK_SIZE = 16 * 1024
+DEFAULT_EXTRACTION_WORKERS = 16
+DEFAULT_MAX_EXTRACTION_WORKERS = 64
+DEFAULT_LIMITS_FILENAME = 'edx-dl.limits'
+DEFAULT_ASYNC_CONCURRENCY = 64
+DEFAULT_METRICS_INTERVAL = 60
+DEFAULT_PROGRESS_INTERVAL = 10
+DEFAULT_RETRIES = 5
+DEFAULT_RETRY_BASE_DELAY = 1
+DEFAULT_RETRY_MAX_DELAY = 60
+DEFAULT_BREAKER_THRESHOLD = 10
+DEFAULT_BREAKER_COOLDOWN = 30
+PARTIAL_DOWNLOAD_SUFFIX = '.part'
+PARTIAL_VALIDATOR_SUFFIX = '.validator'
+DEFAULT_SEGMENT_MIN_SIZE = 32 * 1024 * 1024
 DEFAULT_FILE_FORMATS = ['e?ps', 'pdf', 'txt', 'doc', 'xls', 'ppt',
                         'docx', 'xlsx', 'pptx', 'odt', 'ods', 'odp', 'odg',
                         'zip', 'rar', 'gz', 'mp3', 'R', 'Rmd', 'ipynb', 'py']
@@ -11,40 +11,93 @@ import getpass
 import json
 import logging
 import os
-import pickle
 import re
 import sys
+import threading
+import time
 
 from functools import partial
+import multiprocessing
 from multiprocessing.dummy import Pool as ThreadPool
 
-from six.moves.http_cookiejar import CookieJar
-from six.moves.urllib.error import HTTPError, URLError
-from six.moves.urllib.parse import urlencode
-from six.moves.urllib.request import (
-    urlopen,
-    build_opener,
-    install_opener,
-    HTTPCookieProcessor,
-    Request,
-    urlretrieve,
-)
+from requests.exceptions import HTTPError, RequestException
 
 from ._version import __version__
 
 from .common import (
     YOUTUBE_DL_CMD,
     DEFAULT_CACHE_FILENAME,
+    DEFAULT_ASYNC_CONCURRENCY,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_EXTRACTION_WORKERS,
+    DEFAULT_SEGMENT_MIN_SIZE,
+    PARTIAL_DOWNLOAD_SUFFIX,
+    PARTIAL_VALIDATOR_SUFFIX,
     Unit,
     Video,
     ExitCode,
     DEFAULT_FILE_FORMATS,
+    DEFAULT_LIMITS_FILENAME,
+    DEFAULT_MAX_EXTRACTION_WORKERS,
+    DEFAULT_METRICS_INTERVAL,
+    DEFAULT_PAGE_CACHE_DIRNAME,
+    DEFAULT_PROGRESS_INTERVAL,
+    DEFAULT_RETRIES,
+    DEFAULT_RETRY_MAX_DELAY,
+    LEGACY_CACHE_FILENAME,
+)
+from .limiter import AdaptiveLimiter, load_limits, save_limit
+from .metrics import (
+    Metrics,
+    MetricsWriter,
+    count_download,
+    count_unit_cache,
+    get_metrics,
+    request_kind,
+    set_metrics,
 )
+from .page_cache import PageCache, conditional_headers
 from .parsing import (
+    HTML_PARSERS,
     edx_json2srt,
+    get_html_parser,
     get_page_extractor,
     is_youtube_url,
+    set_html_parser,
+)
+from .profiler import (
+    Profiler,
+    get_profiler,
+    profile,
+    record,
+    run_with_cprofile,
+    set_profiler,
+)
+from .progress import (
+    Progress,
+    ProgressReporter,
+    count_received,
+    current_transfer,
+    finish_transfer,
+    in_transfer,
+    plan,
+    set_progress,
+    set_size,
+    skip,
+    start_transfer,
+    youtube_dl_output,
 )
+from .rate_limit import (
+    HostRateLimiter,
+    get_rate_limiter,
+    parse_rate_limit,
+    set_rate_limiter,
+    wait_for_request,
+)
+from .retry import RetryPolicy, retry_call, set_retry_policy
+from .scheduler import DownloadScheduler
+from .transport import configure_session, get_session
+from .unit_cache import UnitCache, discard_pickle_cache
 from .utils import (
     clean_filename,
     directory_name,
@@ -52,8 +105,17 @@ from .utils import (
     get_filename_from_prefix,
     get_page_contents,
     get_page_contents_as_json,
+    get_page_response,
+    get_response_text,
+    iter_response_text,
     mkdir_p,
-    remove_duplicates,
+    write_response_to_file,
+)
+from .youtube import (
+    YoutubeDownloader,
+    get_youtube_downloader,
+    is_youtube_dl_available,
+    set_youtube_downloader,
 )
 
 
@@ -161,12 +223,10 @@ def _get_initial_token(url):
     """
     logging.info('Getting initial CSRF token.')
 
-    cookiejar = CookieJar()
-    opener = build_opener(HTTPCookieProcessor(cookiejar))
-    install_opener(opener)
-    opener.open(url)
+    session = get_session()
+    session.get(url)
 
-    for cookie in cookiejar:
+    for cookie in session.cookies:
         if cookie.name == 'csrftoken':
             logging.info('Found CSRF token.')
             return cookie.value
@@ -181,9 +241,20 @@ def get_available_sections(url, headers):
     """
     logging.debug("Extracting sections for :" + url)
 
-    page = get_page_contents(url, headers)
-    page_extractor = get_page_extractor(url)
-    sections = page_extractor.extract_sections_from_html(page, BASE_URL)
+    with profile('sections/course', url):
+        page = get_page_contents(url, headers)
+        page_extractor = get_page_extractor(url)
+
+        # Only parse the navigation of the course, if the extractor finds
+        # it, since it is a small part of the page
+        sections = []
+        region = page_extractor.find_sections_region(page, COURSEWARE_SEL)
+        if region is not None:
+            sections = page_extractor.extract_sections_from_html(region,
+                                                                 BASE_URL)
+        if not sections:
+            sections = page_extractor.extract_sections_from_html(page,
+                                                                 BASE_URL)
 
     logging.debug("Extracted sections: " + str(sections))
     return sections
@@ -201,8 +272,9 @@ def edx_get_subtitle(url, headers,
             return get_page_contents(url, headers)
         else:
             json_object = get_page_contents_as_json(url, headers)
-            return edx_json2srt(json_object)
-    except URLError as exception:
+            with profile('downloads/subtitle conversion'):
+                return edx_json2srt(json_object)
+    except RequestException as exception:
         logging.warn('edX subtitles (error: %s)', exception)
         return None
     except ValueError as exception:
@@ -216,18 +288,18 @@ def edx_login(url, headers, username, password):
     """
     logging.info('Logging into Open edX site: %s', url)
 
-    post_data = urlencode({'email': username,
-                           'password': password,
-                           'remember': False}).encode('utf-8')
+    post_data = {'email': username,
+                 'password': password,
+                 'remember': False}
 
-    request = Request(url, post_data, headers)
+    response = get_session().post(url, data=post_data, headers=headers)
     try:
-        response = urlopen(request)
+        response.raise_for_status()
     except HTTPError as e:
         logging.info('Error, cannot login: %s', e)
         return {'success': False}
 
-    resp = json.loads(response.read().decode('utf-8'))
+    resp = json.loads(response.content.decode('utf-8'))
 
     return resp
 
@@ -321,6 +393,14 @@ def parse_args():
                         default='',
                         help='set extra options to pass to youtube-dl')
 
+    parser.add_argument('--youtube-dl-subprocess',
+                        dest='youtube_dl_subprocess',
+                        action='store_true',
+                        default=False,
+                        help='run the youtube-dl command for each video '
+                        'instead of reusing youtube_dl in-process (always '
+                        'done with --youtube-dl-options)')
+
     parser.add_argument('--prefer-cdn-videos',
                         dest='prefer_cdn_videos',
                         action='store_true',
@@ -368,18 +448,229 @@ def parse_args():
                         default=False,
                         help='create and use a cache of extracted resources')
 
+    parser.add_argument('--cache-ttl',
+                        dest='cache_ttl',
+                        action='store',
+                        type=float,
+                        default=None,
+                        help='number of days after which the resources in '
+                        'the cache are extracted again (default: never)')
+
+    parser.add_argument('--invalidate-cache',
+                        dest='invalidate_cache',
+                        action='store_true',
+                        default=False,
+                        help='discard the cached resources of the selected '
+                        'courses (or section, with --filter-section) and '
+                        'extract them again')
+
+    parser.add_argument('--page-cache',
+                        dest='page_cache',
+                        action='store_true',
+                        default=False,
+                        help='store the pages of the subsections and their '
+                        'resources in %s, and only download and extract '
+                        'them again if they changed in the server'
+                        % DEFAULT_PAGE_CACHE_DIRNAME)
+
     parser.add_argument('--dry-run',
                         dest='dry_run',
                         action='store_true',
                         default=False,
                         help='makes a dry run, only lists the resources')
 
+    parser.add_argument('--download-workers',
+                        dest='download_workers',
+                        action='store',
+                        type=int,
+                        default=4,
+                        help='maximum number of files downloaded at the '
+                        'same time (default: 4)')
+
+    parser.add_argument('--downloads-per-host',
+                        dest='downloads_per_host',
+                        action='store',
+                        type=int,
+                        default=2,
+                        help='maximum number of files downloaded at the '
+                        'same time from the same host, all of youtube '
+                        'counts as a single host (default: 2)')
+
+    parser.add_argument('--download-segments',
+                        dest='download_segments',
+                        action='store',
+                        type=int,
+                        default=1,
+                        help='number of parallel connections used to '
+                        'download each large file, if the server supports '
+                        'ranges (default: 1)')
+
+    parser.add_argument('--segment-min-size',
+                        dest='segment_min_size',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_SEGMENT_MIN_SIZE,
+                        help='minimum size in bytes of the files downloaded '
+                        'in segments (default: %d)' % DEFAULT_SEGMENT_MIN_SIZE)
+
+    parser.add_argument('--chunk-size',
+                        dest='chunk_size',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_CHUNK_SIZE,
+                        help='size in bytes of the chunks used to write '
+                        'downloaded files to disk (default: %d)'
+                        % DEFAULT_CHUNK_SIZE)
+
     parser.add_argument('--sequential',
                         dest='sequential',
                         action='store_true',
                         default=False,
                         help='extracts the resources from the pages sequentially')
 
+    parser.add_argument('--max-extraction-workers',
+                        dest='max_extraction_workers',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_MAX_EXTRACTION_WORKERS,
+                        help='maximum number of pages requested at the same '
+                        'time when extracting in parallel. The actual number '
+                        'adapts to the latency and errors of the site and is '
+                        'remembered for the next run (default: %d)'
+                        % DEFAULT_MAX_EXTRACTION_WORKERS)
+
+    parser.add_argument('--parse-processes',
+                        dest='parse_processes',
+                        action='store',
+                        type=int,
+                        default=0,
+                        help='number of processes used to parse the pages '
+                        'when extracting in parallel, the threads only '
+                        'request them. Useful for very big courses, where '
+                        'parsing takes longer than downloading '
+                        '(default: 0, parse in the threads)')
+
+    parser.add_argument('--async',
+                        dest='use_async',
+                        action='store_true',
+                        default=False,
+                        help='extracts the resources from the pages with '
+                        'asyncio, allowing many more concurrent requests '
+                        '(requires Python 3.6+)')
+
+    parser.add_argument('--async-concurrency',
+                        dest='async_concurrency',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_ASYNC_CONCURRENCY,
+                        help='maximum number of pages requested at the same '
+                        'time with --async (default: %d)'
+                        % DEFAULT_ASYNC_CONCURRENCY)
+
+    parser.add_argument('--html-parser',
+                        dest='html_parser',
+                        action='store',
+                        choices=HTML_PARSERS,
+                        default=None,
+                        help='parser used for the pages of courses and '
+                        'sections (default: lxml if it is installed, '
+                        'html.parser otherwise)')
+
+    parser.add_argument('--profile',
+                        dest='profile',
+                        action='store_true',
+                        default=False,
+                        help='time each stage of the run and print a '
+                        'summary at the end')
+
+    parser.add_argument('--profile-output',
+                        dest='profile_output',
+                        action='store',
+                        default=None,
+                        help='write the summary of --profile to this file '
+                        'instead of printing it (implies --profile)')
+
+    parser.add_argument('--cprofile-output',
+                        dest='cprofile_output',
+                        action='store',
+                        default=None,
+                        help='also dump the cProfile statistics of the main '
+                        'thread to this file, readable with pstats '
+                        '(implies --profile)')
+
+    parser.add_argument('--metrics-json',
+                        dest='metrics_json',
+                        action='store',
+                        default=None,
+                        help='write the metrics of the run (latencies, '
+                        'bytes, cache hits, files, errors and retries) to '
+                        'this file as JSON')
+
+    parser.add_argument('--metrics-prometheus',
+                        dest='metrics_prometheus',
+                        action='store',
+                        default=None,
+                        help='write the metrics of the run to this file in '
+                        'the text format of Prometheus (e.g., for the '
+                        'textfile collector of node_exporter)')
+
+    parser.add_argument('--metrics-interval',
+                        dest='metrics_interval',
+                        action='store',
+                        type=float,
+                        default=DEFAULT_METRICS_INTERVAL,
+                        help='seconds between writes of the metrics during '
+                        'the run, 0 to only write them at the end '
+                        '(default: %d)' % DEFAULT_METRICS_INTERVAL)
+
+    parser.add_argument('--retries',
+                        dest='retries',
+                        action='store',
+                        type=int,
+                        default=DEFAULT_RETRIES,
+                        help='times a request failed because of a transient '
+                        'error (connection errors, 429 or 5xx statuses) is '
+                        'retried, with exponential backoff, 0 to disable '
+                        'retries (default: %d)' % DEFAULT_RETRIES)
+
+    parser.add_argument('--retry-max-delay',
+                        dest='retry_max_delay',
+                        action='store',
+                        type=float,
+                        default=DEFAULT_RETRY_MAX_DELAY,
+                        help='maximum seconds to wait before retrying a '
+                        'request, even if the server asks for longer with '
+                        'Retry-After (default: %d)' % DEFAULT_RETRY_MAX_DELAY)
+
+    parser.add_argument('--rate-limit',
+                        dest='rate_limits',
+                        action='append',
+                        default=[],
+                        metavar='TARGET=REQUESTS[/BANDWIDTH]',
+                        help='limit the requests per second and the bytes '
+                        'per second (e.g., 500K or 2M) received from each '
+                        'host of TARGET: site (the platform), youtube, cdn '
+                        '(any other host) or a host name, 0 or nothing '
+                        'meaning no limit (e.g., site=5, cdn=/20M, '
+                        'youtube=1/2M). No limits by default. Can be given '
+                        'several times')
+
+    parser.add_argument('--progress-interval',
+                        dest='progress_interval',
+                        action='store',
+                        type=float,
+                        default=DEFAULT_PROGRESS_INTERVAL,
+                        help='seconds between reports of the progress of the '
+                        'downloads (files, MB/s, ETA), printed as a single '
+                        'line with --quiet (default: %d)'
+                        % DEFAULT_PROGRESS_INTERVAL)
+
+    parser.add_argument('--no-progress',
+                        dest='progress',
+                        action='store_false',
+                        default=True,
+                        help='do not report the progress of the downloads')
+
     parser.add_argument('--quiet',
                         dest='quiet',
                         action='store_true',
@@ -399,6 +690,19 @@ def parse_args():
 
     args = parser.parse_args()
 
+    try:
+        set_html_parser(args.html_parser)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.profile_output or args.cprofile_output:
+        args.profile = True
+
+    try:
+        args.rate_limits = dict(parse_rate_limit(spec)
+                                for spec in args.rate_limits)
+    except ValueError as e:
+        parser.error(str(e))
 
     # Initialize the logging system first so that other functions
     # can use it right away.
@@ -434,51 +738,209 @@ def edx_get_headers():
     return headers
 
 
-def extract_units(url, headers, file_formats):
+def extract_units(url, headers, file_formats, page_cache=None,
+                  parse=None):
     """
     Parses a webpage and extracts its resources e.g. video_url, sub_url, etc.
+
+    If a PageCache is given, the page is only transferred and parsed again
+    if it changed since it was stored. parse is the function used to parse
+    the page, extract_units_from_page by default.
+
+    Otherwise, if no parse function is given, the units are extracted
+    while the page is being received.
     """
     logging.info("Processing '%s'", url)
 
-    page = get_page_contents(url, headers)
+    with profile('extraction/page', url):
+        return _extract_units(url, headers, file_formats, page_cache, parse)
+
+
+def _extract_units(url, headers, file_formats, page_cache, parse):
+    if page_cache is None and parse is None:
+        # The body is read while extracting, so a transfer cut halfway is
+        # retried from the request
+        return retry_call(url, _extract_units_from_stream, url, headers,
+                          file_formats)
+
+    if parse is None:
+        parse = extract_units_from_page
+
+    if page_cache is None:
+        page = get_page_contents(url, headers)
+        return parse(url, page, file_formats)
+
+    entry = page_cache.lookup(url)
+    request_headers = dict(headers)
+    request_headers.update(conditional_headers(entry))
+    response = get_page_response(url, request_headers)
+    page = get_response_text(response) if response.status_code != 304 else ''
+    return page_cache.resolve(url, entry, response.status_code,
+                              response.headers, page, file_formats, parse)
+
+
+def _extract_units_from_stream(url, headers, file_formats):
+    response = get_page_response(url, headers, stream=True)
+    page_extractor = get_page_extractor(url)
+    return list(page_extractor.extract_units_from_stream(
+        iter_response_text(response), BASE_URL, file_formats))
+
+
+def extract_units_from_page(url, page, file_formats):
+    """
+    Extracts the resources of the already fetched page of the given url.
+    """
     page_extractor = get_page_extractor(url)
     units = page_extractor.extract_units_from_html(page, BASE_URL, file_formats)
 
     return units
 
 
-def extract_all_units_in_sequence(urls, headers, file_formats):
+def _extract_units_as_dicts(url, page, base_url, file_formats):
+    """
+    Extracts the resources of page in a worker process. The units are
+    returned as dicts, which are smaller to send back than the objects,
+    and the site is given explicitly since the globals of the parent
+    aren't always inherited.
+    """
+    page_extractor = get_page_extractor(url)
+    units = page_extractor.extract_units_from_html(page, base_url,
+                                                   file_formats)
+    return [unit.to_dict() for unit in units]
+
+
+def _extract_units_from_page_in_pool(pool, url, page, file_formats):
+    """
+    Same as extract_units_from_page, but the page is parsed by one of the
+    processes of pool, while the calling thread waits.
+    """
+    units = pool.apply(_extract_units_as_dicts,
+                       (url, page, BASE_URL, file_formats))
+    return [Unit.from_dict(unit) for unit in units]
+
+
+def create_process_pool(processes):
+    """
+    Returns a pool of processes to parse pages in. They are not forked from
+    the current process where it can be avoided, since a child forked while
+    another thread holds a lock (e.g., of logging) would wait for it
+    forever. They use the same HTML parser as the current process.
+    """
+    get_context = getattr(multiprocessing, 'get_context', None)
+    if get_context is None:  # Python 2 can only fork
+        context = multiprocessing
+    elif 'forkserver' in multiprocessing.get_all_start_methods():
+        context = get_context('forkserver')
+    else:
+        context = get_context('spawn')
+    return context.Pool(processes, initializer=set_html_parser,
+                        initargs=(get_html_parser(),))
+
+
+def _extract_units_and_report(extract, callback, url):
+    """
+    Returns the units extracted from url by extract(url), after giving them
+    to callback(url, units) if there is a callback.
+    """
+    units = extract(url)
+    if callback is not None:
+        callback(url, units)
+    return units
+
+
+def extract_all_units_in_sequence(urls, headers, file_formats,
+                                  page_cache=None, callback=None):
     """
     Returns a dict of all the units in the selected_sections: {url, units}
     sequentially, this is clearer for debug purposes
+
+    If a callback is given, callback(url, units) is called as soon as the
+    units of each url are extracted.
     """
     logging.info('Extracting all units information in sequentially.')
     logging.debug('urls: ' + str(urls))
 
-    units = [extract_units(url, headers, file_formats) for url in urls]
+    extract = partial(extract_units, headers=headers,
+                      file_formats=file_formats, page_cache=page_cache)
+    units = [_extract_units_and_report(extract, callback, url)
+             for url in urls]
     all_units = dict(zip(urls, units))
 
     return all_units
 
 
-def extract_all_units_in_parallel(urls, headers, file_formats):
+def extract_all_units_in_parallel(urls, headers, file_formats, limiter=None,
+                                  page_cache=None, parse_processes=0,
+                                  callback=None):
     """
     Returns a dict of all the units in the selected_sections: {url, units}
     in parallel
+
+    The number of concurrent requests is adjusted by the given
+    AdaptiveLimiter, or fixed to DEFAULT_EXTRACTION_WORKERS if there is none.
+
+    If parse_processes is not zero, the threads only fetch the pages and
+    hand them to a pool of that many processes to be parsed, so that the
+    parsing of big courses isn't serialized by the GIL.
+
+    If a callback is given, callback(url, units) is called (from the
+    thread that extracted them) as soon as the units of each url are
+    extracted.
     """
     logging.info('Extracting all units information in parallel.')
     logging.debug('urls: ' + str(urls))
 
-    mapfunc = partial(extract_units, file_formats=file_formats, headers=headers)
-    pool = ThreadPool(16)
-    units = pool.map(mapfunc, urls)
-    pool.close()
-    pool.join()
+    if limiter is None:
+        limiter = AdaptiveLimiter(DEFAULT_EXTRACTION_WORKERS,
+                                  DEFAULT_EXTRACTION_WORKERS,
+                                  min_limit=DEFAULT_EXTRACTION_WORKERS)
+
+    parse = None
+    process_pool = None
+    if parse_processes > 0:
+        logging.info('Parsing the pages in %d processes.', parse_processes)
+        process_pool = create_process_pool(parse_processes)
+        parse = partial(_extract_units_from_page_in_pool, process_pool)
+
+    extract = partial(limiter.run, extract_units,
+                      file_formats=file_formats, headers=headers,
+                      page_cache=page_cache, parse=parse)
+    mapfunc = partial(_extract_units_and_report, extract, callback)
+    pool = ThreadPool(limiter.max_limit)
+    try:
+        units = pool.map(mapfunc, urls)
+    finally:
+        pool.close()
+        pool.join()
+        if process_pool is not None:
+            process_pool.close()
+            process_pool.join()
     all_units = dict(zip(urls, units))
 
+    logging.debug('Concurrency limit after extraction: %d', limiter.limit)
     return all_units
 
 
+def extract_all_units_async(urls, headers, file_formats,
+                            concurrency=DEFAULT_ASYNC_CONCURRENCY,
+                            page_cache=None, callback=None):
+    """
+    Returns a dict of all the units in the selected_sections: {url, units}
+    fetching the pages concurrently with asyncio (Python 3.6+ only)
+
+    If a callback is given, callback(url, units) is called as soon as the
+    units of each url are extracted.
+    """
+    from .async_extraction import extract_all_units
+
+    logging.info('Extracting all units information asynchronously.')
+    logging.debug('urls: ' + str(urls))
+
+    return extract_all_units(urls, headers, file_formats,
+                             extract_units_from_page, concurrency,
+                             page_cache, callback)
+
+
 def _display_sections_menu(course, sections):
     """
     List the weeks for the given course.
@@ -700,69 +1162,344 @@ def _build_filename_from_url(url, target_dir, filename_prefix):
 
 def download_url(url, filename, headers, args):
     """
-    Downloads the given url in filename.
+    Downloads the given url in filename. Transient errors are retried as
+    told by the retry policy of the run, resuming the partial download.
+
+    Returns False if the download failed and the error was ignored.
     """
 
-    if is_youtube_url(url):
-        download_youtube_url(url, filename, headers, args)
-    else:
-        import ssl
-        import requests
-        # FIXME: Ugly hack for coping with broken SSL sites:
-        # https://www.cs.duke.edu/~angl/papers/imc10-cloudcmp.pdf
-        #
-        # We should really ask the user if they want to stop the downloads
-        # or if they are OK proceeding without verification.
-        #
-        # Note that skipping verification by default could be a problem for
-        # people's lives if they happen to live ditatorial countries.
-        #
-        # Note: The mess with various exceptions being caught (and their
-        # order) is due to different behaviors in different Python versions
-        # (e.g., 2.7 vs. 3.4).
-        try:
-            # mitxpro fix for downloading compressed files
-            if 'zip' in url and 'mitxpro' in url:
-                urlretrieve(url, filename)
-            else:
-                r = requests.get(url, headers=headers)
-                with open(filename, 'wb') as fp:
-                    fp.write(r.content)
-        except Exception as e:
-            logging.warn('Got SSL/Connection error: %s', e)
-            if not args.ignore_errors:
-                logging.warn('Hint: if you want to ignore this error, add '
-                             '--ignore-errors option to the command line')
-                raise e
+    with profile('downloads/file', url), request_kind('file'):
+        if is_youtube_url(url):
+            return download_youtube_url(url, filename, headers, args)
+        else:
+            import ssl
+            session = get_session()
+            # FIXME: Ugly hack for coping with broken SSL sites:
+            # https://www.cs.duke.edu/~angl/papers/imc10-cloudcmp.pdf
+            #
+            # We should really ask the user if they want to stop the downloads
+            # or if they are OK proceeding without verification.
+            #
+            # Note that skipping verification by default could be a problem for
+            # people's lives if they happen to live ditatorial countries.
+            #
+            # Note: The mess with various exceptions being caught (and their
+            # order) is due to different behaviors in different Python versions
+            # (e.g., 2.7 vs. 3.4).
+            try:
+                # mitxpro fix for downloading compressed files: store the bytes
+                # exactly as sent by the server, without decoding them.
+                if 'zip' in url and 'mitxpro' in url:
+                    retry_call(url, download_file, url, filename, None,
+                               args.chunk_size, decode_content=False,
+                               get=session.get)
+                elif args.download_segments > 1:
+                    retry_call(url, download_file_segmented, url, filename,
+                               headers, args.chunk_size,
+                               args.download_segments,
+                               args.segment_min_size,
+                               get=session.get, head=session.head)
+                else:
+                    retry_call(url, download_file, url, filename, headers,
+                               args.chunk_size, get=session.get)
+            except Exception as e:
+                logging.warn('Got SSL/Connection error: %s', e)
+                if not args.ignore_errors:
+                    logging.warn('Hint: if you want to ignore this error, add '
+                                 '--ignore-errors option to the command line')
+                    raise e
+                else:
+                    logging.warn('SSL/Connection error ignored: %s', e)
+                    return False
+
+
+def _read_partial_validator(validator_filename):
+    """
+    Returns the validator (ETag or Last-Modified) stored for a partial
+    download or None if there is none.
+    """
+    try:
+        with open(validator_filename, 'r') as f:
+            return f.read().strip() or None
+    except IOError:
+        return None
+
+
+def _get_response_validator(response, decode_content):
+    """
+    Returns the value to be used in the If-Range header to resume the
+    download of response or None if it cannot be resumed safely.
+    """
+    # Ranges are expressed in bytes of the encoded body, so they can't be
+    # used if what we store on disk is the decoded one.
+    encoding = response.headers.get('Content-Encoding', 'identity')
+    if decode_content and encoding.lower() != 'identity':
+        return None
+
+    # Weak ETags are not allowed in If-Range
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def download_file(url, filename, headers, chunk_size, decode_content=True,
+                  get=None):
+    """
+    Downloads the given url in filename streaming the body in chunks of
+    chunk_size bytes, so memory usage stays flat no matter how big the file
+    is. get is a function with the interface of requests.get.
+
+    The data is written to filename + PARTIAL_DOWNLOAD_SUFFIX, which is
+    renamed to filename once the transfer is complete. If a partial file
+    already exists (e.g., from an interrupted run), the transfer is resumed
+    with a Range request guarded by If-Range, so that we start over if the
+    file changed in the server in the meantime.
+    """
+    if get is None:
+        get = get_session().get
+
+    part_filename = filename + PARTIAL_DOWNLOAD_SUFFIX
+    validator_filename = part_filename + PARTIAL_VALIDATOR_SUFFIX
+
+    offset = 0
+    request_headers = dict(headers or {})
+    validator = _read_partial_validator(validator_filename)
+    if os.path.exists(part_filename) and validator is not None:
+        offset = os.path.getsize(part_filename)
+    if offset > 0:
+        logging.info('Resuming download of %s at byte %d', filename, offset)
+        request_headers['Range'] = 'bytes=%d-' % offset
+        request_headers['If-Range'] = validator
+
+    r = get(url, headers=request_headers, stream=True)
+    try:
+        if r.status_code == 416 and offset > 0:
+            # Either the partial file is already complete or the file in
+            # the server is now smaller than what we have, check which one
+            total = r.headers.get('Content-Range', '').rpartition('/')[2]
+            if total != str(offset):
+                r.close()
+                os.remove(part_filename)
+                return download_file(url, filename, headers, chunk_size,
+                                     decode_content, get)
+        else:
+            r.raise_for_status()
+            size = _get_content_length(r)
+            if r.status_code == 206 and offset > 0:
+                mode = 'ab'
+                set_size(offset + size if size is not None else None, offset)
             else:
-                logging.warn('SSL/Connection error ignored: %s', e)
+                # The server ignored our range or the file changed
+                mode = 'wb'
+                validator = _get_response_validator(r, decode_content)
+                if validator is not None:
+                    with open(validator_filename, 'w') as f:
+                        f.write(validator)
+                elif os.path.exists(validator_filename):
+                    os.remove(validator_filename)
+                set_size(size, 0)
+
+            with open(part_filename, mode) as fp:
+                write_response_to_file(r, fp, chunk_size,
+                                       decode_content=decode_content)
+    finally:
+        r.close()
+
+    if os.path.exists(validator_filename):
+        os.remove(validator_filename)
+    getattr(os, 'replace', os.rename)(part_filename, filename)
+
+
+def _get_content_length(response):
+    """
+    Returns the Content-Length of response as an int, or None if unknown.
+    """
+    try:
+        return int(response.headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RangesNotSupported(Exception):
+    """
+    Raised when a server doesn't honor our Range requests.
+    """
+    pass
+
+
+def _download_segment(url, filename, headers, chunk_size, start, end, get):
+    """
+    Downloads the bytes start-end (inclusive) of url at the same position
+    of the (already allocated) file filename.
+    """
+    segment_headers = dict(headers)
+    segment_headers['Range'] = 'bytes=%d-%d' % (start, end)
+
+    r = get(url, headers=segment_headers, stream=True)
+    try:
+        r.raise_for_status()
+        content_range = r.headers.get('Content-Range', '')
+        if r.status_code != 206 or \
+           not content_range.startswith('bytes %d-%d/' % (start, end)):
+            raise RangesNotSupported(url)
+
+        with open(filename, 'r+b') as fp:
+            fp.seek(start)
+            written = write_response_to_file(r, fp, chunk_size,
+                                             decode_content=False)
+    finally:
+        r.close()
+
+    if written != end - start + 1:
+        raise IOError('Incomplete segment %d-%d of %s' % (start, end, url))
+
+
+def download_file_segmented(url, filename, headers, chunk_size, num_segments,
+                            min_size, get=None, head=None):
+    """
+    Downloads the given url in filename splitting it in num_segments byte
+    ranges fetched in parallel, each one written at its position of a
+    preallocated filename + PARTIAL_DOWNLOAD_SUFFIX. get and head are
+    functions with the interfaces of requests.get and requests.head.
+
+    Files smaller than min_size bytes, or from servers which don't support
+    ranges, are downloaded with a single stream by download_file.
+    """
+    if get is None or head is None:
+        session = get_session()
+        get = get or session.get
+        head = head or session.head
+
+    r = head(url, headers=headers, allow_redirects=True)
+    r.close()
+    size = _get_content_length(r) or 0
+    supports_ranges = (
+        r.status_code == 200 and
+        r.headers.get('Accept-Ranges', '').lower() == 'bytes' and
+        r.headers.get('Content-Encoding', 'identity').lower() == 'identity'
+    )
+    if not supports_ranges or size < max(min_size, num_segments):
+        return download_file(url, filename, headers, chunk_size, get=get)
+
+    # Ask for the same version of the file in all the segments, a server
+    # answering with the whole file means that it changed in between.
+    segment_headers = dict(headers or {})
+    validator = _get_response_validator(r, decode_content=False)
+    if validator is not None:
+        segment_headers['If-Range'] = validator
+
+    part_filename = filename + PARTIAL_DOWNLOAD_SUFFIX
+    validator_filename = part_filename + PARTIAL_VALIDATOR_SUFFIX
+    # A preallocated partial file can't be resumed as a single stream
+    if os.path.exists(validator_filename):
+        os.remove(validator_filename)
+    with open(part_filename, 'wb') as fp:
+        fp.truncate(size)
+    set_size(size, 0)
+
+    segment_size = -(-size // num_segments)
+    ranges = [(start, min(start + segment_size, size) - 1)
+              for start in range(0, size, segment_size)]
+    logging.debug('Downloading %s in %d segments', url, len(ranges))
+
+    # The bytes of the segments count in the transfer of this thread
+    transfer = current_transfer()
+
+    def download_segment(range_):
+        with in_transfer(transfer):
+            _download_segment(url, part_filename, segment_headers,
+                              chunk_size, range_[0], range_[1], get)
+
+    pool = ThreadPool(len(ranges))
+    try:
+        pool.map(download_segment, ranges)
+    except RangesNotSupported:
+        logging.info('Server does not honor ranges for %s, downloading it '
+                     'as a single stream', url)
+        os.remove(part_filename)
+        return download_file(url, filename, headers, chunk_size, get=get)
+    finally:
+        pool.close()
+        pool.join()
+
+    getattr(os, 'replace', os.rename)(part_filename, filename)
 
 
 def download_youtube_url(url, filename, headers, args):
     """
     Downloads a youtube URL and applies the filters from args
+
+    Returns False if the download failed and the error was ignored.
     """
     logging.info('Downloading video with URL %s from YouTube.', url)
-    video_format_option = args.format + '/mp4' if args.format else 'mp4'
-    cmd = YOUTUBE_DL_CMD + ['-o', filename, '-f', video_format_option]
-
+    rate_limit = None
+    rate_limiter = get_rate_limiter()
+    if rate_limiter is not None:
+        bandwidth = rate_limiter.get_bandwidth(url)
+        if bandwidth is not None:
+            # Shared by the videos downloaded at the same time
+            rate_limit = max(1, bandwidth // args.downloads_per_host)
+
+    downloader = get_youtube_downloader()
+    if downloader is not None:
+        wait_for_request(url)
+        return downloader.download(url, filename, rate_limit,
+                                   ignore_errors=args.ignore_errors)
+
+    cmd = YOUTUBE_DL_CMD + ['-o', filename, '-f', _get_youtube_format(args)]
     if args.subtitles:
         cmd.append('--all-subs')
+    if rate_limit is not None:
+        cmd.extend(['--limit-rate', str(rate_limit)])
     cmd.extend(args.youtube_dl_options.split())
+
+    wait_for_request(url)
+    if current_transfer() is not None:
+        # Follow the progress of youtube-dl, one line per update
+        cmd.append('--newline')
+        cmd.append(url)
+        return execute_command(cmd, args, output_callback=youtube_dl_output)
     cmd.append(url)
+    return execute_command(cmd, args)
 
-    execute_command(cmd, args)
+
+def _get_youtube_format(args):
+    """
+    Returns the format of the videos downloaded from YouTube
+    """
+    return args.format + '/mp4' if args.format else 'mp4'
+
+
+def _get_youtube_downloader(args):
+    """
+    Returns the in-process downloader of YouTube videos for args, or None
+    if youtube-dl has to be run as a command.
+    """
+    if args.youtube_dl_subprocess:
+        return None
+    if not is_youtube_dl_available():
+        logging.debug('youtube_dl not found, running youtube-dl instead')
+        return None
+    if args.youtube_dl_options.split():
+        logging.debug('Running youtube-dl for its extra options')
+        return None
+    return YoutubeDownloader(_get_youtube_format(args), args.subtitles,
+                             args.downloads_per_host)
 
 
 def download_subtitle(url, filename, headers, args):
     """
     Downloads the subtitle from the url and transforms it to the srt format
     """
-    subs_string = edx_get_subtitle(url, headers)
-    if subs_string:
-        full_filename = os.path.join(os.getcwd(), filename)
-        with open(full_filename, 'wb+') as f:
-            f.write(subs_string.encode('utf-8'))
+    with profile('downloads/subtitle', url), request_kind('subtitle'):
+        subs_string = edx_get_subtitle(url, headers)
+        if subs_string:
+            full_filename = os.path.join(os.getcwd(), filename)
+            data = subs_string.encode('utf-8')
+            with open(full_filename, 'wb+') as f:
+                f.write(data)
+            count_received(len(data))
 
 
 def skip_or_download(downloads, headers, args, f=download_url):
@@ -773,12 +1510,22 @@ def skip_or_download(downloads, headers, args, f=download_url):
     for url, filename in downloads.items():
         if os.path.exists(filename):
             logging.info('[skipping] %s => %s', url, filename)
+            count_download('skipped')
+            skip(url)
             continue
         else:
             logging.info('[download] %s => %s', url, filename)
         if args.dry_run:
             continue
-        f(url, filename, headers, args)
+        transfer = start_transfer(url, filename)
+        try:
+            downloaded = f(url, filename, headers, args)
+        except Exception:
+            count_download('failed')
+            finish_transfer(transfer, ok=False)
+            raise
+        count_download('failed' if downloaded is False else 'downloaded')
+        finish_transfer(transfer, ok=downloaded is not False)
 
 
 def download_video(video, args, target_dir, filename_prefix, headers):
@@ -802,24 +1549,181 @@ def download_video(video, args, target_dir, filename_prefix, headers):
         skip_or_download(sub_downloads, headers, args, download_subtitle)
 
 
-def download_unit(unit, args, target_dir, filename_prefix, headers):
+def _get_video_urls(video, args):
+    """
+    Returns the urls that will be downloaded for the given video
+    """
+    if args.prefer_cdn_videos or video.video_youtube_url is None:
+        return video.mp4_urls
+    return [video.video_youtube_url]
+
+
+def _get_video_url(video, args):
+    """
+    Returns the url that will be used to download the given video
+    """
+    urls = _get_video_urls(video, args)
+    return urls[0] if urls else None
+
+
+def _run_now(url, func, *args):
+    """
+    Runs the download job func(*args) in the current thread
+    """
+    func(*args)
+
+
+def _download_videos_and_resources(video_prefixes, res_downloads, args,
+                                   target_dir, headers):
+    """
+    Downloads the videos given as (video, filename_prefix) and then the
+    resources of a unit, in the current thread
+    """
+    for video, prefix in video_prefixes:
+        download_video(video, args, target_dir, prefix, headers)
+    skip_or_download(res_downloads, headers, args)
+
+
+def download_unit(unit, args, target_dir, filename_prefix, headers,
+                  scheduler=None):
     """
     Downloads the urls in unit based on args in the given target_dir
     with filename_prefix
+
+    If a scheduler is given, the downloads are submitted to it instead of
+    being done right away. The subtitles of a video are downloaded in the
+    same job as the video itself, since their name depends on it.
     """
+    submit = scheduler.submit if scheduler is not None else _run_now
+
+    # The subtitles are only known when downloading them
+    plan(url for video in unit.videos
+         for url in _get_video_urls(video, args))
+    plan(unit.resources_urls)
+
     if len(unit.videos) == 1:
-        download_video(unit.videos[0], args, target_dir, filename_prefix,
-                       headers)
+        video_prefixes = [(unit.videos[0], filename_prefix)]
     else:
         # we change the filename_prefix to avoid conflicts when downloading
         # subtitles
-        for i, video in enumerate(unit.videos, 1):
-            new_prefix = filename_prefix + ('-%02d' % i)
-            download_video(video, args, target_dir, new_prefix, headers)
+        video_prefixes = [(video, filename_prefix + ('-%02d' % i))
+                          for i, video in enumerate(unit.videos, 1)]
 
     res_downloads = _build_url_downloads(unit.resources_urls, target_dir,
                                          filename_prefix)
-    skip_or_download(res_downloads, headers, args)
+
+    if args.subtitles and video_prefixes:
+        # The name of the subtitles is taken from the first file starting
+        # with the prefix of their video, which the resources (or their
+        # partial files) would also match while being downloaded
+        submit(_get_video_url(video_prefixes[0][0], args),
+               _download_videos_and_resources,
+               video_prefixes, res_downloads, args, target_dir, headers)
+        return
+
+    for video, prefix in video_prefixes:
+        submit(_get_video_url(video, args), download_video,
+               video, args, target_dir, prefix, headers)
+    for url, filename in res_downloads.items():
+        submit(url, skip_or_download, {url: filename}, headers, args)
+
+
+class DownloadPipeline(object):
+    """
+    Downloads the units of the selected subsections while the rest of them
+    are still being extracted.
+
+    The units of each subsection are given to add() as soon as they are
+    extracted, in any order. They are downloaded in the order of the
+    selections as soon as the units of all the previous subsections are
+    known, so that the filename prefixes (numbered in each section) and the
+    removal of repeated urls are the same as if all the units had been
+    extracted first.
+
+    Usage:
+
+      >>> pipeline = DownloadPipeline(args, selections, headers)
+      >>> extractor(urls, headers, file_formats, callback=pipeline.add)
+      >>> pipeline.join()
+    """
+
+    def __init__(self, args, selections, headers):
+        self.args = args
+        self.headers = headers
+        self.scheduler = DownloadScheduler(args.download_workers,
+                                           args.downloads_per_host)
+        # Number of urls extracted, and left after removing repeated ones
+        self.num_urls = 0
+        self.num_filtered_urls = 0
+
+        # (section number, target_dir, subsection url) in download order
+        self._subsections = []
+        for selected_course, selected_sections in selections.items():
+            coursename = directory_name(selected_course.name)
+            for selected_section in selected_sections:
+                section_dirname = "%02d-%s" % (selected_section.position,
+                                               selected_section.name)
+                target_dir = os.path.join(args.output_dir, coursename,
+                                          clean_filename(section_dirname))
+                mkdir_p(target_dir)
+                section = len(self._subsections), target_dir
+                for subsection in selected_section.subsections:
+                    self._subsections.append(section + (subsection.url,))
+
+        self._next = 0
+        self._counters = {}  # {section number: number of units}
+        self._units = {}  # {url: units} not yet downloaded
+        self._filtered_units = {}  # {url: units} without repeated urls
+        self._existing_urls = set()
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self):
+        """
+        Urls of the subsections in download order.
+        """
+        return [url for _, _, url in self._subsections]
+
+    def add(self, url, units):
+        """
+        Adds the units extracted from the subsection url, downloading them
+        (and those of the following subsections already added) if all the
+        previous subsections have been added.
+        """
+        with self._lock:
+            self._units[url] = units
+            while self._next < len(self._subsections):
+                section, target_dir, next_url = self._subsections[self._next]
+                if next_url not in self._units and \
+                   next_url not in self._filtered_units:
+                    break
+                self._download(section, target_dir, next_url)
+                self._next += 1
+
+    def _download(self, section, target_dir, url):
+        filtered_units = self._filtered_units.get(url)
+        if filtered_units is None:
+            units = {url: self._units.pop(url)}
+            with profile('remove duplicates'):
+                filtered_units = remove_repeated_urls(units,
+                                                      self._existing_urls)[url]
+            self._filtered_units[url] = filtered_units
+            self.num_urls += num_urls_in_units_dict(units)
+            self.num_filtered_urls += num_urls_in_units_dict(
+                {url: filtered_units})
+
+        for unit in filtered_units:
+            counter = self._counters.get(section, 0) + 1
+            self._counters[section] = counter
+            filename_prefix = "%02d" % counter
+            download_unit(unit, self.args, target_dir, filename_prefix,
+                          self.headers, self.scheduler)
+
+    def join(self):
+        """
+        Waits until all the downloads are finished.
+        """
+        self.scheduler.join()
 
 
 def download(args, selections, all_units, headers):
@@ -831,31 +1735,35 @@ def download(args, selections, all_units, headers):
     # Download Videos
     # notice that we could iterate over all_units, but we prefer to do it over
     # sections/subsections to add correct prefixes and show nicer information.
+    pipeline = DownloadPipeline(args, selections, headers)
+    for url in pipeline.urls:
+        pipeline.add(url, all_units.get(url, []))
+    pipeline.join()
 
-    for selected_course, selected_sections in selections.items():
-        coursename = directory_name(selected_course.name)
-        for selected_section in selected_sections:
-            section_dirname = "%02d-%s" % (selected_section.position,
-                                           selected_section.name)
-            target_dir = os.path.join(args.output_dir, coursename,
-                                      clean_filename(section_dirname))
-            mkdir_p(target_dir)
-            counter = 0
-            for subsection in selected_section.subsections:
-                units = all_units.get(subsection.url, [])
-                for unit in units:
-                    counter += 1
-                    filename_prefix = "%02d" % counter
-                    download_unit(unit, args, target_dir, filename_prefix,
-                                  headers)
-
-
-def remove_repeated_urls(all_units):
+
+def _remove_existing_urls(urls, existing_urls):
+    """
+    Returns the urls which are not in the set existing_urls, nor repeated,
+    adding them to it.
+    """
+    new_urls = []
+    for url in urls:
+        if url not in existing_urls:
+            new_urls.append(url)
+            existing_urls.add(url)
+    return new_urls
+
+
+def remove_repeated_urls(all_units, existing_urls=None):
     """
     Removes repeated urls from the units, it does not consider subtitles.
     This is done to avoid repeated downloads.
+
+    The urls in the set existing_urls (e.g., from previous calls) are also
+    removed, and the urls kept are added to it.
     """
-    existing_urls = set()
+    if existing_urls is None:
+        existing_urls = set()
     filtered_units = {}
     for url, units in all_units.items():
         reduced_units = []
@@ -869,7 +1777,7 @@ def remove_repeated_urls(all_units):
                     video_youtube_url = video.video_youtube_url
                     existing_urls.add(video_youtube_url)
 
-                mp4_urls, existing_urls = remove_duplicates(video.mp4_urls, existing_urls)
+                mp4_urls = _remove_existing_urls(video.mp4_urls, existing_urls)
 
                 if video_youtube_url is not None or len(mp4_urls) > 0:
                     videos.append(Video(video_youtube_url=video_youtube_url,
@@ -877,7 +1785,8 @@ def remove_repeated_urls(all_units):
                                         sub_template_url=video.sub_template_url,
                                         mp4_urls=mp4_urls))
 
-            resources_urls, existing_urls = remove_duplicates(unit.resources_urls, existing_urls)
+            resources_urls = _remove_existing_urls(unit.resources_urls,
+                                                   existing_urls)
 
             if len(videos) > 0 or len(resources_urls) > 0:
                 reduced_units.append(Unit(videos=videos,
@@ -908,7 +1817,9 @@ def num_urls_in_units_dict(units_dict):
 
 def extract_all_units_with_cache(all_urls, headers, file_formats,
                                  filename=DEFAULT_CACHE_FILENAME,
-                                 extractor=extract_all_units_in_parallel):
+                                 extractor=extract_all_units_in_parallel,
+                                 max_age=None, invalidate=False,
+                                 callback=None):
     """
     Extracts the units which are not in the cache and extract their resources
     returns the full list of units (cached+new)
@@ -917,32 +1828,51 @@ def extract_all_units_with_cache(all_urls, headers, file_formats,
     known (and extracted) objects from URLs. This is useful to follow courses
     week by week since we won't parse the already known subsections/units,
     additionally it speeds development of code unrelated to extraction.
-    """
-    cached_units = {}
 
-    if os.path.exists(filename):
-        with open(filename, 'rb') as f:
-            cached_units = pickle.load(f)
+    Only the units of all_urls are read from the cache, and only the newly
+    extracted ones are written to it. Cached units are only used if they
+    were extracted with the same page extractor version and file_formats,
+    and less than max_age seconds ago (if given). If invalidate is True, the
+    cached units of all_urls are discarded first.
+
+    If a callback is given, callback(url, units) is called with the cached
+    units right away, and given to the extractor for the new ones.
+    """
+    cache = UnitCache(filename)
+    try:
+        if filename == DEFAULT_CACHE_FILENAME:
+            discard_pickle_cache(LEGACY_CACHE_FILENAME)
+        if invalidate:
+            logging.info('invalidating %d urls in cache [%s]', len(all_urls),
+                         filename)
+            cache.invalidate(all_urls)
+        if max_age is not None:
+            cache.expire(max_age)
+
+        cached_units = cache.get_many(all_urls, file_formats, max_age)
+
+        # we filter the cached urls
+        new_urls = [url for url in all_urls if url not in cached_units]
+        count_unit_cache(hits=len(all_urls) - len(new_urls),
+                         misses=len(new_urls))
+        logging.info('loading %d urls from cache [%s]', len(cached_units),
+                     filename)
+        if callback is not None:
+            for url in all_urls:
+                if url in cached_units:
+                    callback(url, cached_units[url])
+            new_units = extractor(new_urls, headers, file_formats,
+                                  callback=callback)
+        else:
+            new_units = extractor(new_urls, headers, file_formats)
+        cache.put_many(new_units, file_formats)
+    finally:
+        cache.close()
 
-    # we filter the cached urls
-    new_urls = [url for url in all_urls if url not in cached_units]
-    logging.info('loading %d urls from cache [%s]', len(cached_units.keys()),
-                 filename)
-    new_units = extractor(new_urls, headers, file_formats)
     all_units = cached_units.copy()
     all_units.update(new_units)
 
-    return all_units
-
-
-def write_units_to_cache(units, filename=DEFAULT_CACHE_FILENAME):
-    """
-    writes units to cache
-    """
-    logging.info('writing %d urls to cache [%s]', len(units.keys()),
-                 filename)
-    with open(filename, 'wb') as f:
-        pickle.dump(units, f)
+    return {url: all_units[url] for url in all_urls}
 
 
 def extract_urls_from_units(all_units, format_):
@@ -983,11 +1913,59 @@ def save_urls_to_file(urls, filename):
     file_.close()
 
 
+def _write_profile(profiler, filename):
+    """
+    Prints the summary of profiler, or writes it in filename if given.
+    """
+    summary = profiler.summary()
+    if filename is None:
+        sys.stderr.write(summary)
+    else:
+        with open(filename, 'w') as f:
+            f.write(summary)
+        logging.info('Profile written to %s', filename)
+
+
 def main():
     """
     Main program function
     """
     args = parse_args()
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler()
+        set_profiler(profiler)
+
+    metrics_writer = None
+    if args.metrics_json or args.metrics_prometheus:
+        set_metrics(Metrics())
+        metrics_writer = MetricsWriter(get_metrics(), args.metrics_json,
+                                       args.metrics_prometheus,
+                                       args.metrics_interval)
+        metrics_writer.start()
+
+    if args.retries > 0:
+        set_retry_policy(RetryPolicy(args.retries,
+                                     max_delay=args.retry_max_delay))
+
+    try:
+        if args.cprofile_output:
+            return run_with_cprofile(args.cprofile_output, _main, args)
+        return _main(args)
+    finally:
+        set_retry_policy(None)
+        set_rate_limiter(None)
+        set_youtube_downloader(None)
+        if metrics_writer is not None:
+            metrics_writer.stop()
+            set_metrics(None)
+        if profiler is not None:
+            set_profiler(None)
+            _write_profile(profiler, args.profile_output)
+
+
+def _main(args):
     logging.info('edx_dl version %s', __version__)
     file_formats = parse_file_formats(args)
 
@@ -1001,31 +1979,51 @@ def main():
         logging.error("You must supply username and password to log-in")
         exit(ExitCode.MISSING_CREDENTIALS)
 
-    # Prepare Headers
-    headers = edx_get_headers()
-
-    # Login
-    resp = edx_login(LOGIN_API, headers, args.username, args.password)
+    # All the requests share the connections of a single session, which
+    # must be able to keep one connection alive for each concurrent request.
+    # Downloads start while the pages are still being extracted.
+    session = configure_session(
+        max(args.max_extraction_workers,
+            args.async_concurrency if args.use_async else 0) +
+        args.download_workers * args.download_segments)
+    if any(any(limits) for limits in args.rate_limits.values()):
+        set_rate_limiter(HostRateLimiter(args.rate_limits, BASE_URL))
+    # The requests are paced before being timed
+    for observer in [get_profiler(), get_metrics(), get_rate_limiter()]:
+        if observer is not None:
+            observer.watch_session(session)
+
+    with profile('login'):
+        # Prepare Headers
+        with profile('login/csrf token', EDX_HOMEPAGE):
+            headers = edx_get_headers()
+
+        # Login
+        with profile('login/login', LOGIN_API):
+            resp = edx_login(LOGIN_API, headers, args.username,
+                             args.password)
     if not resp.get('success', False):
         logging.error(resp.get('value', "Wrong Email or Password."))
         exit(ExitCode.WRONG_EMAIL_OR_PASSWORD)
 
     # Parse and select the available courses
-    courses = get_courses_info(DASHBOARD, headers)
+    with profile('courses', DASHBOARD):
+        courses = get_courses_info(DASHBOARD, headers)
     available_courses = [course for course in courses if course.state == 'Started']
     selected_courses = parse_courses(args, available_courses)
 
     # Parse the sections and build the selections dict filtered by sections
-    if args.platform == 'edx':
-        all_selections = {selected_course:
-                          get_available_sections(selected_course.url.replace('info', 'course'),
-                                                 headers)
-                          for selected_course in selected_courses}
-    else:
-        all_selections = {selected_course:
-                          get_available_sections(selected_course.url.replace('info', 'courseware'),
-                                                 headers)
-                          for selected_course in selected_courses}
+    with profile('sections'):
+        if args.platform == 'edx':
+            all_selections = {selected_course:
+                              get_available_sections(selected_course.url.replace('info', 'course'),
+                                                     headers)
+                              for selected_course in selected_courses}
+        else:
+            all_selections = {selected_course:
+                              get_available_sections(selected_course.url.replace('info', 'courseware'),
+                                                     headers)
+                              for selected_course in selected_courses}
 
     selections = parse_sections(args, all_selections)
     _display_selections(selections)
@@ -1038,39 +2036,96 @@ def main():
                 for selected_section in selected_sections
                 for subsection in selected_section.subsections]
 
-    extractor = extract_all_units_in_parallel
+    page_cache = None
+    if args.page_cache:
+        page_cache = PageCache(DEFAULT_PAGE_CACHE_DIRNAME)
+
+    learned_limits = load_limits(DEFAULT_LIMITS_FILENAME)
+    limiter = AdaptiveLimiter(learned_limits.get(args.platform,
+                                                 DEFAULT_EXTRACTION_WORKERS),
+                              args.max_extraction_workers)
+    extractor = partial(extract_all_units_in_parallel, limiter=limiter,
+                        page_cache=page_cache,
+                        parse_processes=args.parse_processes)
     if args.sequential:
-        extractor = extract_all_units_in_sequence
-
-    if args.cache:
-        all_units = extract_all_units_with_cache(all_urls, headers,
-                                                 file_formats,
-                                                 extractor=extractor)
-    else:
-        all_units = extractor(all_urls, headers, file_formats)
+        extractor = partial(extract_all_units_in_sequence,
+                            page_cache=page_cache)
+    elif args.use_async:
+        extractor = partial(extract_all_units_async,
+                            concurrency=args.async_concurrency,
+                            page_cache=page_cache)
 
     parse_units(selections)
 
-    if args.cache:
-        write_units_to_cache(all_units)
+    # When downloading, the units of each subsection start downloading as
+    # soon as they are extracted (in order), instead of after extracting
+    # all of them
+    pipeline = None
+    callback = None
+    reporter = None
+    if args.export_filename is None:
+        logging.info("Output directory: " + args.output_dir)
+        set_youtube_downloader(_get_youtube_downloader(args))
+        downloads_started = time.time()
+        if args.progress and not args.dry_run:
+            progress = Progress()
+            set_progress(progress)
+            reporter = ProgressReporter(progress, args.progress_interval,
+                                        quiet=args.quiet)
+            reporter.start()
+        pipeline = DownloadPipeline(args, selections, headers)
+        callback = pipeline.add
+
+    try:
+        with profile('extraction'):
+            if args.cache:
+                max_age = None
+                if args.cache_ttl is not None:
+                    max_age = args.cache_ttl * 24 * 60 * 60
+                all_units = extract_all_units_with_cache(all_urls, headers,
+                                                         file_formats,
+                                                         extractor=extractor,
+                                                         max_age=max_age,
+                                                         invalidate=args.invalidate_cache,
+                                                         callback=callback)
+            else:
+                all_units = extractor(all_urls, headers, file_formats,
+                                      callback=callback)
+
+        # Remember the concurrency limit learned for this platform
+        if not args.sequential and not args.use_async:
+            save_limit(DEFAULT_LIMITS_FILENAME, args.platform, limiter.limit)
+
+        if pipeline is not None:
+            pipeline.join()
+    finally:
+        if reporter is not None:
+            reporter.stop()
+            set_progress(None)
+
+    if pipeline is not None:
+        # The downloads overlap with the extraction
+        record('downloads', time.time() - downloads_started)
+        logging.warn('Removed %d duplicated urls from %d in total',
+                     (pipeline.num_urls - pipeline.num_filtered_urls),
+                     pipeline.num_urls)
+        return
 
     # This removes all repeated important urls
     # FIXME: This is not the best way to do it but it is the simplest, a
     # better approach will be to create symbolic or hard links for the repeated
     # units to avoid losing information
-    filtered_units = remove_repeated_urls(all_units)
+    with profile('remove duplicates'):
+        filtered_units = remove_repeated_urls(all_units)
     num_all_urls = num_urls_in_units_dict(all_units)
     num_filtered_urls = num_urls_in_units_dict(filtered_units)
     logging.warn('Removed %d duplicated urls from %d in total',
                  (num_all_urls - num_filtered_urls), num_all_urls)
 
-    # finally we download or export all the resources
-    if args.export_filename is not None:
-        logging.info('exporting urls to file %s', args.export_filename)
-        urls = extract_urls_from_units(filtered_units, args.export_format)
-        save_urls_to_file(urls, args.export_filename)
-    else:
-        download(args, selections, filtered_units, headers)
+    # finally we export all the resources
+    logging.info('exporting urls to file %s', args.export_filename)
+    urls = extract_urls_from_units(filtered_units, args.export_format)
+    save_urls_to_file(urls, args.export_filename)
 
 
 if __name__ == '__main__':
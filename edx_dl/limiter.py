@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Adaptive concurrency control for the extraction of units
+"""
+
+import json
+import logging
+import threading
+import time
+
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+
+def is_congestion_error(exception):
+    """
+    Returns True if exception is a sign of the server being overloaded or
+    throttling us (as opposed to, e.g., a missing page).
+    """
+    if isinstance(exception, HTTPError) and exception.response is not None:
+        status = exception.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exception, (ConnectionError, Timeout))
+
+
+class AdaptiveLimiter(object):
+    """
+    Limits the number of concurrent requests with an AIMD (additive
+    increase, multiplicative decrease) policy, as TCP does with its
+    congestion window:
+
+    * The limit grows by one after a full limit of requests finish without
+      errors and with a latency in line with the recent ones.
+    * The limit is multiplied by backoff when a request fails because of
+      throttling or server errors, or when its latency is more than
+      latency_tolerance times the recent average (and at least
+      min_spike_latency seconds, so that jitter on very fast responses is
+      ignored). Requests that were already in flight when the limit was
+      last decreased don't decrease it again.
+
+    Usage:
+
+      >>> limiter = AdaptiveLimiter(initial_limit=8, max_limit=64)
+      >>> page = limiter.run(get_page_contents, url, headers)
+    """
+
+    def __init__(self, initial_limit, max_limit, min_limit=1,
+                 latency_tolerance=2.0, backoff=0.5, min_spike_latency=0.1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.min_spike_latency = min_spike_latency
+        self.backoff = backoff
+
+        self._limit = min(max(int(initial_limit), self.min_limit),
+                          self.max_limit)
+        self._successes = 0
+        self._in_flight = 0
+        self._mean_latency = None
+        self._last_decrease = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        """
+        Current number of concurrent requests allowed.
+        """
+        return self._limit
+
+    def acquire(self):
+        """
+        Waits until a new request is allowed and returns its start time, to
+        be given back to release.
+        """
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return time.time()
+
+    def release(self, started, congested=False):
+        """
+        Records the end of the request started at started, adjusting the
+        limit. congested tells if the request failed because of throttling
+        or server errors.
+        """
+        now = time.time()
+        latency = now - started
+
+        with self._cond:
+            self._in_flight -= 1
+
+            spike = (self._mean_latency is not None and
+                     latency >= self.min_spike_latency and
+                     latency > self._mean_latency * self.latency_tolerance)
+            if congested or spike:
+                if started >= self._last_decrease:
+                    self._limit = max(self.min_limit,
+                                      int(self._limit * self.backoff))
+                    self._successes = 0
+                    self._last_decrease = now
+                    logging.debug('Concurrency limit decreased to %d',
+                                  self.limit)
+            else:
+                self._successes += 1
+                if self._successes >= self._limit:
+                    self._limit = min(self.max_limit, self._limit + 1)
+                    self._successes = 0
+
+            if self._mean_latency is None:
+                self._mean_latency = latency
+            else:
+                self._mean_latency = 0.9 * self._mean_latency + 0.1 * latency
+
+            self._cond.notify_all()
+
+    def run(self, func, *args, **kwargs):
+        """
+        Calls func(*args, **kwargs) once it is allowed, recording its latency
+        and outcome.
+        """
+        started = self.acquire()
+        congested = False
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            congested = is_congestion_error(e)
+            raise
+        finally:
+            self.release(started, congested)
+
+
+def load_limits(filename):
+    """
+    Returns the dict {platform: limit} with the concurrency limits learned
+    in previous runs, stored in filename.
+    """
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_limit(filename, platform, limit):
+    """
+    Stores the concurrency limit learned for platform in filename.
+    """
+    limits = load_limits(filename)
+    limits[platform] = limit
+    with open(filename, 'w') as f:
+        json.dump(limits, f, indent=2, sort_keys=True)
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+
+"""
+Metrics of a run of edx-dl, exported as JSON and in the text exposition
+format of Prometheus
+
+The metrics are:
+
+* the latency of the requests, as histograms by kind of request (page,
+  json, subtitle or file),
+* the bytes transferred by kind of request,
+* the hits and misses of the cache of units,
+* the files downloaded, skipped (because they exist) and failed,
+* the errors (error statuses and exceptions) and retries by host.
+
+The latency of a streamed request is the time until its headers are
+received, for the others it includes the body. The kind of the requests is
+set by the callers with request_kind(), pages being the default.
+
+Collecting is disabled unless a Metrics is set with set_metrics(), in which
+case the module level functions are cheap no-ops.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from six.moves.urllib.parse import urlparse
+
+from .common import DEFAULT_METRICS_INTERVAL
+
+DEFAULT_REQUEST_KIND = 'page'
+
+# Upper bounds, in seconds, of the buckets of the latency histograms
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0]
+
+
+def get_host(url):
+    """
+    Returns the host of url, as used to label the metrics.
+    """
+    return urlparse(url).netloc
+
+
+class Histogram(object):
+    """
+    Histogram of observations with cumulative buckets, as Prometheus'.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        buckets = [(_format_bound(bound), count)
+                   for bound, count in zip(self.buckets, self.counts)]
+        buckets.append(('+Inf', self.count))
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': dict(buckets)}
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+class Metrics(object):
+    """
+    Counters of a run, safe to update from several threads.
+
+    Usage:
+
+      >>> metrics = Metrics()
+      >>> metrics.watch_session(get_session())
+      >>> ...
+      >>> metrics.write('metrics.json', 'metrics.prom')
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.latency = {}  # {kind: Histogram}
+        self.bytes = {}  # {kind: bytes}
+        self.unit_cache = {'hit': 0, 'miss': 0}
+        self.downloads = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+        self.errors = {}  # {host: {reason: count}}
+        self.retries = {}  # {host: count}
+
+    def observe_request(self, kind, url, seconds, status=None, reason=None):
+        """
+        Records a request of the given kind to url which took seconds and
+        was answered with status, or failed because of the exception named
+        reason.
+        """
+        if reason is None and status is not None and status >= 400:
+            reason = str(status)
+        with self._lock:
+            histogram = self.latency.get(kind)
+            if histogram is None:
+                histogram = self.latency[kind] = Histogram()
+            histogram.observe(seconds)
+            if reason is not None:
+                errors = self.errors.setdefault(get_host(url), {})
+                errors[reason] = errors.get(reason, 0) + 1
+
+    def count_bytes(self, kind, num_bytes):
+        with self._lock:
+            self.bytes[kind] = self.bytes.get(kind, 0) + num_bytes
+
+    def count_unit_cache(self, hits, misses):
+        with self._lock:
+            self.unit_cache['hit'] += hits
+            self.unit_cache['miss'] += misses
+
+    def count_download(self, result):
+        """
+        Counts a file 'downloaded', 'skipped' or 'failed'.
+        """
+        with self._lock:
+            self.downloads[result] += 1
+
+    def count_retry(self, url):
+        with self._lock:
+            host = get_host(url)
+            self.retries[host] = self.retries.get(host, 0) + 1
+
+    def watch_session(self, session):
+        """
+        Records the requests made through the requests session, wrapping
+        the send method of its adapters.
+        """
+        adapters = []
+        for adapter in session.adapters.values():
+            if adapter not in adapters:
+                adapters.append(adapter)
+        for adapter in adapters:
+            adapter.send = self._timed_send(adapter.send)
+
+    def _timed_send(self, send):
+        def timed_send(request, **kwargs):
+            kind = get_request_kind()
+            started = time.time()
+            try:
+                response = send(request, **kwargs)
+                if not kwargs.get('stream'):
+                    # It would be read right after anyway
+                    self.count_bytes(kind, len(response.content))
+            except Exception as e:
+                self.observe_request(kind, request.url,
+                                     time.time() - started,
+                                     reason=type(e).__name__)
+                raise
+            self.observe_request(kind, request.url, time.time() - started,
+                                 status=response.status_code)
+            return response
+        return timed_send
+
+    def to_dict(self):
+        """
+        Returns the metrics as a dict, as written in JSON.
+        """
+        with self._lock:
+            return {
+                'started': self.started,
+                'duration_seconds': time.time() - self.started,
+                'requests': {kind: histogram.to_dict()
+                             for kind, histogram in self.latency.items()},
+                'bytes': dict(self.bytes),
+                'unit_cache': dict(self.unit_cache),
+                'downloads': dict(self.downloads),
+                'errors': {host: dict(reasons)
+                           for host, reasons in self.errors.items()},
+                'retries': dict(self.retries),
+            }
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the text exposition format of Prometheus.
+        """
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, type_, help_, samples):
+            lines.append('# HELP %s %s' % (name, help_))
+            lines.append('# TYPE %s %s' % (name, type_))
+            for suffix, labels, value in samples:
+                lines.append('%s%s%s %s' % (name, suffix,
+                                            _format_labels(labels),
+                                            _format_value(value)))
+
+        metric('edx_dl_run_start_time_seconds', 'gauge',
+               'Start time of the run since the epoch.',
+               [('', [], data['started'])])
+        metric('edx_dl_run_duration_seconds', 'gauge',
+               'Time since the start of the run.',
+               [('', [], data['duration_seconds'])])
+
+        samples = []
+        for kind, requests in sorted(data['requests'].items()):
+            for bound in sorted(requests['buckets'], key=float):
+                samples.append(('_bucket', [('kind', kind), ('le', bound)],
+                                requests['buckets'][bound]))
+            samples.append(('_sum', [('kind', kind)], requests['sum']))
+            samples.append(('_count', [('kind', kind)], requests['count']))
+        metric('edx_dl_request_duration_seconds', 'histogram',
+               'Latency of the requests by kind.', samples)
+
+        metric('edx_dl_transferred_bytes_total', 'counter',
+               'Bytes received by kind of request.',
+               [('', [('kind', kind)], value)
+                for kind, value in sorted(data['bytes'].items())])
+        metric('edx_dl_unit_cache_lookups_total', 'counter',
+               'Lookups of subsections in the cache of units by result.',
+               [('', [('result', result)], value)
+                for result, value in sorted(data['unit_cache'].items())])
+        metric('edx_dl_files_total', 'counter',
+               'Files downloaded, skipped and failed.',
+               [('', [('result', result)], value)
+                for result, value in sorted(data['downloads'].items())])
+        metric('edx_dl_request_errors_total', 'counter',
+               'Requests answered with an error status or failed, by host '
+               'and status or exception.',
+               [('', [('host', host), ('reason', reason)], value)
+                for host, reasons in sorted(data['errors'].items())
+                for reason, value in sorted(reasons.items())])
+        metric('edx_dl_retries_total', 'counter',
+               'Requests retried by host.',
+               [('', [('host', host)], value)
+                for host, value in sorted(data['retries'].items())])
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_filename=None, prometheus_filename=None):
+        """
+        Writes the metrics to the given files, atomically so that readers
+        never see them half written.
+        """
+        if json_filename is not None:
+            _write_atomically(json_filename,
+                              json.dumps(self.to_dict(), indent=2,
+                                         sort_keys=True) + '\n')
+        if prometheus_filename is not None:
+            _write_atomically(prometheus_filename, self.to_prometheus())
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape_label_value(value))
+                             for name, value in labels)
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _write_atomically(filename, text):
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        f.write(text)
+    getattr(os, 'replace', os.rename)(temp_filename, filename)
+
+
+class MetricsWriter(object):
+    """
+    Writes the metrics every interval seconds from a background thread,
+    and a last time when stopped.
+
+    Usage:
+
+      >>> writer = MetricsWriter(metrics, 'metrics.json', 'metrics.prom')
+      >>> writer.start()
+      >>> ...
+      >>> writer.stop()
+    """
+
+    def __init__(self, metrics, json_filename=None, prometheus_filename=None,
+                 interval=DEFAULT_METRICS_INTERVAL):
+        self.metrics = metrics
+        self.json_filename = json_filename
+        self.prometheus_filename = prometheus_filename
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self):
+        self.metrics.write(self.json_filename, self.prometheus_filename)
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+
+_metrics = None
+_local = threading.local()
+
+
+def get_metrics():
+    """
+    Returns the metrics of the run, or None if they are disabled.
+    """
+    return _metrics
+
+
+def set_metrics(metrics):
+    """
+    Sets the metrics of the run, None disables them.
+    """
+    global _metrics
+    _metrics = metrics
+
+
+def get_request_kind():
+    """
+    Returns the kind of the requests made by the calling thread.
+    """
+    return getattr(_local, 'kind', None) or DEFAULT_REQUEST_KIND
+
+
+@contextmanager
+def request_kind(kind):
+    """
+    Sets the kind of the requests made by the calling thread in its block,
+    unless an enclosing block already did (e.g., the JSON of a subtitle
+    counts as a subtitle).
+    """
+    if getattr(_local, 'kind', None) is not None:
+        yield
+        return
+    _local.kind = kind
+    try:
+        yield
+    finally:
+        _local.kind = None
+
+
+def observe_request(kind, url, seconds, status=None, reason=None):
+    """
+    Records a request made without the shared session, if enabled.
+    """
+    if _metrics is not None:
+        _metrics.observe_request(kind, url, seconds, status, reason)
+
+
+def count_bytes(num_bytes, kind=None):
+    """
+    Counts bytes received, by default of the kind of the requests of the
+    calling thread, if enabled.
+    """
+    if _metrics is not None:
+        _metrics.count_bytes(kind or get_request_kind(), num_bytes)
+
+
+def count_unit_cache(hits, misses):
+    if _metrics is not None:
+        _metrics.count_unit_cache(hits, misses)
+
+
+def count_download(result):
+    if _metrics is not None:
+        _metrics.count_download(result)
+
+
+def count_retry(url):
+    if _metrics is not None:
+        _metrics.count_retry(url)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+On-disk cache of subsection pages revalidated with conditional requests
+
+For each page we store its validators (ETag and Last-Modified), its body
+and the units extracted from it. The next time the page is requested, the
+validators are sent in If-None-Match/If-Modified-Since and, if the server
+answers 304 Not Modified, the stored units are reused without transferring
+nor parsing the page again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from .common import Unit
+from .parsing import get_extractor_version
+from .utils import mkdir_p
+
+
+def conditional_headers(entry):
+    """
+    Returns the headers making a request conditional on the page having
+    changed since the given cache entry was stored.
+    """
+    headers = {}
+    if entry is None:
+        return headers
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+class PageCache(object):
+    """
+    Cache of pages stored in a directory, one JSON file per URL.
+
+    Usage:
+
+      >>> cache = PageCache('edx-dl.pages')
+      >>> entry = cache.lookup(url)
+      >>> headers.update(conditional_headers(entry))
+      >>> response = ...  # request the page with headers
+      >>> units = cache.resolve(url, entry, response.status_code,
+      ...                       response.headers, page, file_formats, parse)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        mkdir_p(directory)
+
+    def _filename(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.json')
+
+    def lookup(self, url):
+        """
+        Returns the entry stored for url or None if there is none.
+        """
+        try:
+            with open(self._filename(url), 'r') as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def store(self, url, response_headers, page, file_formats, units):
+        """
+        Stores the page of url and its units if the response can be
+        revalidated later, that is, if it came with validators.
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        entry = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'page': page,
+            'file_formats': list(file_formats),
+            'extractor': get_extractor_version(url),
+            'units': [unit.to_dict() for unit in units],
+        }
+        # Write to a temporary file first so that a concurrent reader (or an
+        # interrupted run) never sees a half written entry.
+        fd, tmp_filename = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        getattr(os, 'replace', os.rename)(tmp_filename, self._filename(url))
+
+    def resolve(self, url, entry, status, response_headers, page,
+                file_formats, parse):
+        """
+        Returns the units of url given the response (status,
+        response_headers and decoded page) to a request made with the
+        conditional_headers of entry. parse is a function
+        parse(url, page, file_formats) returning the units of a page.
+        """
+        if status == 304 and entry is not None:
+            logging.debug('Page not modified: %s', url)
+            # The stored units can't be reused if they were extracted
+            # differently, but the stored page can
+            if entry['file_formats'] == list(file_formats) and \
+               entry.get('extractor') == get_extractor_version(url):
+                return [Unit.from_dict(unit) for unit in entry['units']]
+            page = entry['page']
+            response_headers = {'ETag': entry['etag'],
+                                'Last-Modified': entry['last_modified']}
+
+        units = parse(url, page, file_formats)
+        self.store(url, response_headers, page, file_formats, units)
+        return units
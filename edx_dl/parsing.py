@@ -8,14 +8,394 @@ import json
 
 from datetime import timedelta, datetime
 
-from six.moves import html_parser
-from bs4 import BeautifulSoup as BeautifulSoup_
+import six
+from bs4 import BeautifulSoup as BeautifulSoup_, SoupStrainer
+from bs4.builder import builder_registry
 
 from .common import Course, Section, SubSection, Unit, Video
+from .utils import unescape_html
 
 
-# Force use of bs4 with html.parser
-BeautifulSoup = lambda page: BeautifulSoup_(page, 'html.parser')
+# bs4 tree builders that can be used to parse the pages, in order of
+# preference: lxml is written in C and parses several times faster than
+# html.parser, which is pure Python but always available.
+HTML_PARSERS = ['lxml', 'html.parser']
+
+_html_parser = None
+
+
+def get_html_parser():
+    """
+    Returns the name of the bs4 tree builder used to parse the pages: the
+    one given to set_html_parser or else the first of HTML_PARSERS that is
+    installed.
+    """
+    global _html_parser
+
+    if _html_parser is None:
+        _html_parser = next(parser for parser in HTML_PARSERS
+                            if builder_registry.lookup(parser) is not None)
+    return _html_parser
+
+
+def set_html_parser(parser):
+    """
+    Sets the bs4 tree builder used to parse the pages (one of HTML_PARSERS),
+    or the default one if parser is None.
+    """
+    global _html_parser
+
+    if parser is not None and builder_registry.lookup(parser) is None:
+        raise ValueError('HTML parser not available: %s' % parser)
+    _html_parser = parser
+
+
+def BeautifulSoup(page, parse_only=None):
+    """
+    Parses page with the bs4 tree builder from get_html_parser. If
+    parse_only (a SoupStrainer) is given, only the tags matching it, and
+    their contents, are built, which is much faster when the data is in a
+    small part of the page.
+    """
+    return BeautifulSoup_(page, get_html_parser(), parse_only=parse_only)
+
+
+def has_class(*names):
+    """
+    Returns a matcher for the class attribute of tags that have any of the
+    given class names, for SoupStrainer. While parsing, SoupStrainer sees
+    the class attribute as a single string, so a plain class name would
+    only match tags with exactly that class.
+    """
+    names = set(names)
+
+    def match(value):
+        if value is None:
+            return False
+        if isinstance(value, six.string_types):
+            value = value.split()
+        return not names.isdisjoint(value)
+
+    return match
+
+
+RE_TAG_ATTRIBUTE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+
+def _get_tag_attributes(tag):
+    """
+    Returns the dict of attributes of the start tag '<name attr=...>'.
+    """
+    attributes = {}
+    name_end = re.match(r'<[^\s>/]+', tag).end()
+    for match in RE_TAG_ATTRIBUTE.finditer(tag, name_end, len(tag) - 1):
+        value = next((group for group in match.groups()[1:]
+                      if group is not None), '')
+        attributes.setdefault(match.group(1).lower(), value)
+    return attributes
+
+
+def _attributes_match(attributes, selector_attributes):
+    for name, value in selector_attributes.items():
+        if name == 'class':
+            if value not in attributes.get('class', '').split():
+                return False
+        elif attributes.get(name) != value:
+            return False
+    return True
+
+
+def find_region(page, selector):
+    """
+    Returns the part of page with the first element matching selector, a
+    tuple (tag name, attributes) like the courseware-selector of the sites,
+    or None if there is no such element.
+
+    The element is located by looking at the tags with the given name, as
+    text, so that only the region has to be parsed later. If the element is
+    not closed the region extends up to the end of the page.
+    """
+    name, selector_attributes = selector
+    re_tags = re.compile(r'<(/?)%s(?=[\s>/])[^>]*>' % re.escape(name),
+                         re.IGNORECASE)
+
+    tags = re_tags.finditer(page)
+    for start in tags:
+        if start.group(1) or not _attributes_match(
+                _get_tag_attributes(start.group()), selector_attributes):
+            continue
+        depth = 1
+        for tag in tags:
+            if tag.group(1):
+                depth -= 1
+            elif not tag.group().endswith('/>'):
+                depth += 1
+            if depth == 0:
+                return page[start.start():tag.end()]
+        return page[start.start():]
+    return None
+
+
+# Regular expressions used to extract the resources of the units. They are
+# compiled only once, here, instead of on each call.
+RE_UNIT_START = re.compile(r'<div?[^>]id="seq_contents_\d+"')
+RE_VIDEO_STREAMS = re.compile(r'data-streams=&#34;.*?1.0\d+\:(?:.*?)(.{11})')
+RE_VIDEO_EMBED = re.compile(r'https://www.youtube.com/embed/(.{11})\?rel=')
+RE_SUB_TEMPLATE_URL = re.compile(r'data-transcript-translation-url=(?:&#34;|")([^"&]*)(?:&#34;|")')
+RE_AVAILABLE_SUBS_URL = re.compile(r'data-transcript-available-translations-url=(?:&#34;|")([^"&]*)(?:&#34;|")')
+RE_DOWNLOAD_TRANSCRIPT = re.compile(r'href=(?:&#34;|")([^"&]+)(?:&#34;|")&gt;Download transcript&lt;')
+RE_YOUTUBE_LINK = re.compile(r'&lt;a href=(?:&#34;|")(https?\:\/\/(?:www\.)?(?:youtube\.com|youtu\.?be)\/.*?)(?:&#34;|")')
+RE_YOUTUBE_URL = re.compile(r'(https?\:\/\/(?:www\.)?(?:youtube\.com|youtu\.?be)\/.*?)')
+
+# All the patterns above (but RE_UNIT_START) can only match starting at one
+# of these prefixes, so they are the only positions the scanner looks at.
+RE_SCAN_CANDIDATES = re.compile(r'data-|href=|http')
+
+_re_resources_urls = {}
+
+
+def get_resources_urls_regex(file_formats):
+    """
+    Returns the (cached) compiled regular expression matching the links to
+    files with the given file_formats.
+    """
+    key = tuple(file_formats)
+    regex = _re_resources_urls.get(key)
+    if regex is None:
+        formats = '|'.join(file_formats)
+        regex = re.compile(r'&lt;a href=(?:&#34;|")([^"&]*.(?:' + formats + '))(?:&#34;|")')
+        _re_resources_urls[key] = regex
+    return regex
+
+
+class UnitScan(object):
+    """
+    Raw resources found by scan_unit in the text of a unit.
+    """
+    def __init__(self):
+        self.video_streams_id = None
+        self.video_embed_id = None
+        self.sub_template_url = None
+        self.available_subs_url = None
+        self.download_transcript_url = None
+        self.mp4_urls = []
+        self.resources_urls = []
+        self.youtube_links = []
+
+
+def split_units(page):
+    """
+    Returns the list of the <div>s of the units in the page, as matched by
+    the regular expression
+    '(<div?[^>]id="seq_contents_\d+".*?>.*?<\/div>)' with re.DOTALL.
+
+    The search is done without backtracking: if a unit has no closing
+    </div>, none of the following ones has, so we stop instead of trying
+    again from each of them, which is quadratic.
+    """
+    units = []
+    pos = 0
+    while True:
+        start = RE_UNIT_START.search(page, pos)
+        if start is None:
+            break
+        tag_end = page.find('>', start.end())
+        end = page.find('</div>', tag_end + 1) if tag_end != -1 else -1
+        if end == -1:
+            break
+        pos = end + len('</div>')
+        units.append(page[start.start():pos])
+    return units
+
+
+def iter_units(chunks):
+    """
+    Generator version of split_units for a page given as an iterable of
+    pieces of text (e.g., as they are received): each unit is yielded as
+    soon as its closing </div> arrives. Only the text of the current unit
+    (or, between units, the text after the last '>') is kept in memory.
+    """
+    buffer = ''
+    in_unit = False
+    tag_end = -1
+    pos = 0  # where to go on searching in buffer
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            if not in_unit:
+                start = RE_UNIT_START.search(buffer)
+                if start is None:
+                    # RE_UNIT_START can't match across a '>', so a unit
+                    # can only begin after the last one
+                    buffer = buffer[buffer.rfind('>') + 1:]
+                    break
+                buffer = buffer[start.start():]
+                in_unit = True
+                tag_end = -1
+                pos = start.end() - start.start()
+            if tag_end == -1:
+                tag_end = buffer.find('>', pos)
+                if tag_end == -1:
+                    pos = len(buffer)
+                    break
+                pos = tag_end + 1
+            end = buffer.find('</div>', pos)
+            if end == -1:
+                pos = max(pos, len(buffer) - len('</div>') + 1)
+                break
+            end += len('</div>')
+            yield buffer[:end]
+            buffer = buffer[end:]
+            in_unit = False
+
+
+def scan_unit(text, file_formats):
+    """
+    Finds all the resources of the unit in text with a single linear walk.
+
+    This is equivalent to searching text with each of the RE_* expressions
+    (and the one from get_resources_urls_regex) separately, but the text is
+    only walked once and each expression is only tried at the positions
+    where it can match.
+
+    The mp4 urls are the ones matched by the regular expression
+    'https?://[^;]*?\.mp4', but they are found without backtracking: the
+    expression would be tried from each 'http' up to the next ';', which
+    is quadratic on texts with many urls and few semicolons.
+    """
+    scan = UnitScan()
+    re_resources_urls = get_resources_urls_regex(file_formats)
+    mp4_end = 0  # mp4 urls don't overlap
+    youtube_end = 0  # nor do the YouTube links
+    next_mp4 = next_semicolon = -1
+    # RE_VIDEO_STREAMS doesn't match across lines, if it fails at a position
+    # it will fail at all the following ones in the same line
+    streams_line_end = -1
+    length = len(text)
+
+    for candidate in RE_SCAN_CANDIDATES.finditer(text):
+        pos = candidate.start()
+        token = candidate.group()
+
+        if token == 'http':
+            if scan.video_embed_id is None:
+                match = RE_VIDEO_EMBED.match(text, pos)
+                if match:
+                    scan.video_embed_id = match.group(1)
+
+            if pos < mp4_end:
+                continue
+            if text.startswith('://', pos + 4):
+                start = pos + 7
+            elif text.startswith('s://', pos + 4):
+                start = pos + 8
+            else:
+                continue
+            if next_mp4 < start and next_mp4 != length:
+                next_mp4 = text.find('.mp4', start)
+                next_mp4 = length if next_mp4 == -1 else next_mp4
+            if next_semicolon < start and next_semicolon != length:
+                next_semicolon = text.find(';', start)
+                next_semicolon = length if next_semicolon == -1 else next_semicolon
+            if next_mp4 < next_semicolon:
+                mp4_end = next_mp4 + len('.mp4')
+                scan.mp4_urls.append(text[pos:mp4_end])
+
+        elif token == 'href=':
+            if scan.download_transcript_url is None:
+                match = RE_DOWNLOAD_TRANSCRIPT.match(text, pos)
+                if match:
+                    scan.download_transcript_url = match.group(1)
+
+            if text.startswith('&lt;a ', pos - 6):
+                match = re_resources_urls.match(text, pos - 6)
+                if match:
+                    scan.resources_urls.append(match.group(1))
+                if pos - 6 >= youtube_end:
+                    match = RE_YOUTUBE_LINK.match(text, pos - 6)
+                    if match:
+                        youtube_end = match.end()
+                        scan.youtube_links.append(match.group(1))
+
+        else:  # token == 'data-'
+            if scan.video_streams_id is None and pos > streams_line_end:
+                match = RE_VIDEO_STREAMS.match(text, pos)
+                if match:
+                    scan.video_streams_id = match.group(1)
+                    continue
+                elif text.startswith('data-streams=&#34;', pos):
+                    streams_line_end = text.find('\n', pos)
+                    streams_line_end = length if streams_line_end == -1 else streams_line_end
+            if scan.sub_template_url is None:
+                match = RE_SUB_TEMPLATE_URL.match(text, pos)
+                if match:
+                    scan.sub_template_url = match.group(1)
+                    continue
+            if scan.available_subs_url is None:
+                match = RE_AVAILABLE_SUBS_URL.match(text, pos)
+                if match:
+                    scan.available_subs_url = match.group(1)
+
+    return scan
+
+
+RE_METADATA = re.compile(r'data-metadata=&#39;(.*?)&#39;')
+RE_VIDEO_SPEED = re.compile(r'1.0\d+\:(?:.*?)(.{11})')
+
+# Entities found in the data-metadata attributes. '&amp;' must be replaced
+# last, so that the '&' it produces aren't taken as new entities.
+METADATA_ENTITIES = [('&#34;', '"'), ('&quot;', '"'), ('&#39;', "'"),
+                     ('&lt;', '<'), ('&gt;', '>'), ('&amp;', '&')]
+
+# Maximum number of data-metadata attributes remembered by
+# decode_video_metadata
+METADATA_CACHE_SIZE = 4096
+
+_metadata_cache = {}
+
+
+def _unescape_metadata(text):
+    """
+    Same as unescape_html, but much faster on texts where all the entities
+    are in METADATA_ENTITIES, which are replaced as plain strings.
+    """
+    entities = [(entity, char) for entity, char in METADATA_ENTITIES
+                if entity in text]
+    if sum(text.count(entity) for entity, _ in entities) != text.count('&'):
+        return unescape_html(text)
+    for entity, char in entities:
+        text = text.replace(entity, char)
+    return text
+
+
+def decode_video_metadata(metadata):
+    """
+    Decodes the data-metadata attribute of a video (JSON, escaped twice as
+    HTML) and returns the tuple (youtube_id, available_subs_path,
+    sub_template_path, mp4_urls), where the paths are relative to the site
+    and youtube_id is None if the video isn't on Youtube.
+
+    The results are memoized, since the same videos are often found again
+    (in other runs of a course, or when extracting again the same pages).
+    """
+    decoded = _metadata_cache.get(metadata)
+    if decoded is not None:
+        return decoded
+
+    data = json.loads(_unescape_metadata(_unescape_metadata(metadata)))
+    youtube_id = None
+    match_video_youtube_url = RE_VIDEO_SPEED.search(data['streams'])
+    if match_video_youtube_url is not None:
+        youtube_id = match_video_youtube_url.group(1)
+    decoded = (youtube_id,
+               data['transcriptAvailableTranslationsUrl'],
+               data['transcriptTranslationUrl'].replace('__lang__', '%s'),
+               tuple(url for url in data['sources'] if url.endswith('.mp4')))
+
+    if len(_metadata_cache) >= METADATA_CACHE_SIZE:
+        _metadata_cache.clear()
+    _metadata_cache[metadata] = decoded
+    return decoded
 
 
 def edx_json2srt(o):
@@ -58,20 +438,46 @@ class PageExtractor(object):
       >>> d = parsing.SubclassFromPageExtractor()
       >>> units = d.extract_units_from_html(page, BASE_URL)
       >>> ...
+
+    Subclasses must increase VERSION whenever they change the units they
+    extract from a page, so that the units cached by older versions are not
+    used anymore.
     """
 
+    VERSION = 1
+
     def extract_units_from_html(self, page, BASE_URL, file_formats):
         """
         Method to extract the resources (units) from the given page
         """
         raise NotImplementedError("Subclasses should implement this")
 
+    def extract_units_from_stream(self, chunks, BASE_URL, file_formats):
+        """
+        Generator of the resources (units) of a page given as an iterable of
+        pieces of its text, e.g., as they are received. Subclasses can yield
+        each unit as soon as it is complete; by default the whole page is
+        read first and given to extract_units_from_html.
+        """
+        page = ''.join(chunks)
+        for unit in self.extract_units_from_html(page, BASE_URL, file_formats):
+            yield unit
+
     def extract_sections_from_html(self, page, BASE_URL):
         """
         Method to extract the sections (and subsections) from an html page
         """
         raise NotImplementedError("Subclasses should implement this")
 
+    def find_sections_region(self, page, courseware_selector):
+        """
+        Returns the part of page with the sections, which is faster to parse
+        than the whole page, or None if they can't be located. The
+        courseware_selector of the site is given for the layouts which use
+        it.
+        """
+        return None
+
     def extract_courses_from_html(self, page, BASE_URL):
         """
         Method to extract the courses from an html page
@@ -89,66 +495,65 @@ class ClassicEdXPageExtractor(PageExtractor):
         # in this function we avoid using beautifulsoup for performance reasons
         # parsing html with regular expressions is really nasty, don't do this if
         # you don't need to !
-        re_units = re.compile('(<div?[^>]id="seq_contents_\d+".*?>.*?<\/div>)',
-                              re.DOTALL)
         units = []
 
-        for unit_html in re_units.findall(page):
+        for unit_html in split_units(page):
             unit = self.extract_unit(unit_html, BASE_URL, file_formats)
             if len(unit.videos) > 0 or len(unit.resources_urls) > 0:
                 units.append(unit)
         return units
 
+    def extract_units_from_stream(self, chunks, BASE_URL, file_formats):
+        """
+        Extract Units from the html of a subsection webpage given in pieces,
+        each one as soon as its <div> is complete, so that they can be
+        extracted while the rest of the page is being received.
+        """
+        for unit_html in iter_units(chunks):
+            unit = self.extract_unit(unit_html, BASE_URL, file_formats)
+            if len(unit.videos) > 0 or len(unit.resources_urls) > 0:
+                yield unit
+
     def extract_unit(self, text, BASE_URL, file_formats):
         """
         Parses the <div> of each unit and extracts the urls of its resources
         """
-        video_youtube_url = self.extract_video_youtube_url(text)
-        available_subs_url, sub_template_url = self.extract_subtitle_urls(text, BASE_URL)
-        mp4_urls = self.extract_mp4_urls(text)
+        scan = scan_unit(text, file_formats)
+        video_youtube_url = self._video_youtube_url(scan)
+        available_subs_url, sub_template_url = self._subtitle_urls(scan, BASE_URL)
+        mp4_urls = list(set(scan.mp4_urls))
         videos = [Video(video_youtube_url=video_youtube_url,
                         available_subs_url=available_subs_url,
                         sub_template_url=sub_template_url,
                         mp4_urls=mp4_urls)]
 
-        resources_urls = self.extract_resources_urls(text, BASE_URL,
-                                                     file_formats)
+        resources_urls = self._resources_urls(scan, BASE_URL)
         return Unit(videos=videos, resources_urls=resources_urls)
 
     def extract_video_youtube_url(self, text):
-        re_video_youtube_url = re.compile(r'data-streams=&#34;.*?1.0\d+\:(?:.*?)(.{11})')
-        video_youtube_url = None
-        match_video_youtube_url = re_video_youtube_url.search(text)
-
-        if match_video_youtube_url is None:
-            re_video_youtube_url = re.compile(r'https://www.youtube.com/embed/(.{11})\?rel=')
-            match_video_youtube_url = re_video_youtube_url.search(text)
-
-        if match_video_youtube_url is not None:
-            video_id = match_video_youtube_url.group(1)
-            video_youtube_url = 'https://youtube.com/watch?v=' + video_id
+        return self._video_youtube_url(scan_unit(text, []))
 
-        return video_youtube_url
+    def _video_youtube_url(self, scan):
+        video_id = scan.video_streams_id or scan.video_embed_id
+        if video_id is None:
+            return None
+        return 'https://youtube.com/watch?v=' + video_id
 
     def extract_subtitle_urls(self, text, BASE_URL):
-        re_sub_template_url = re.compile(r'data-transcript-translation-url=(?:&#34;|")([^"&]*)(?:&#34;|")')
-        re_available_subs_url = re.compile(r'data-transcript-available-translations-url=(?:&#34;|")([^"&]*)(?:&#34;|")')
+        return self._subtitle_urls(scan_unit(text, []), BASE_URL)
+
+    def _subtitle_urls(self, scan, BASE_URL):
         available_subs_url = None
         sub_template_url = None
-        match_subs = re_sub_template_url.search(text)
 
-        if match_subs:
-            match_available_subs = re_available_subs_url.search(text)
-            if match_available_subs:
-                available_subs_url = BASE_URL + match_available_subs.group(1)
-                sub_template_url = BASE_URL + match_subs.group(1) + "/%s"
+        if scan.sub_template_url is not None:
+            if scan.available_subs_url is not None:
+                available_subs_url = BASE_URL + scan.available_subs_url
+                sub_template_url = BASE_URL + scan.sub_template_url + "/%s"
 
-        else:
-            re_available_subs_url=re.compile(r'href=(?:&#34;|")([^"&]+)(?:&#34;|")&gt;Download transcript&lt;')
-            match_available_subs = re_available_subs_url.search(text)
-            if match_available_subs:
-                sub_template_url = BASE_URL + match_available_subs.group(1)
-                available_subs_url = None
+        elif scan.download_transcript_url is not None:
+            sub_template_url = BASE_URL + scan.download_transcript_url
+            available_subs_url = None
 
         return available_subs_url, sub_template_url
 
@@ -157,12 +562,11 @@ class ClassicEdXPageExtractor(PageExtractor):
         Looks for available links to the mp4 version of the videos
         """
         # mp4 urls may be in two places, in the field data-sources, and as <a>
-        # refs This regex tries to match all the appearances, however we
+        # refs The scanner tries to match all the appearances, however we
         # exclude the ';' # character in the urls, since it is used to separate
         # multiple urls in one string, however ';' is a valid url name
         # character, but it is not really common.
-        re_mp4_urls = re.compile(r'(?:(https?://[^;]*?\.mp4))')
-        mp4_urls = list(set(re_mp4_urls.findall(text)))
+        mp4_urls = list(set(scan_unit(text, []).mp4_urls))
 
         return mp4_urls
 
@@ -171,10 +575,11 @@ class ClassicEdXPageExtractor(PageExtractor):
         Extract resources looking for <a> references in the webpage and
         matching the given file formats
         """
-        formats = '|'.join(file_formats)
-        re_resources_urls = re.compile(r'&lt;a href=(?:&#34;|")([^"&]*.(?:' + formats + '))(?:&#34;|")')
+        return self._resources_urls(scan_unit(text, file_formats), BASE_URL)
+
+    def _resources_urls(self, scan, BASE_URL):
         resources_urls = []
-        for url in re_resources_urls.findall(text):
+        for url in scan.resources_urls:
             if url.startswith('http') or url.startswith('https'):
                 resources_urls.append(url)
             elif url.startswith('//'):
@@ -184,12 +589,17 @@ class ClassicEdXPageExtractor(PageExtractor):
 
         # we match links to youtube videos as <a href> and add them to the
         # download list
-        re_youtube_links = re.compile(r'&lt;a href=(?:&#34;|")(https?\:\/\/(?:www\.)?(?:youtube\.com|youtu\.?be)\/.*?)(?:&#34;|")')
-        youtube_links = re_youtube_links.findall(text)
-        resources_urls += youtube_links
+        resources_urls += scan.youtube_links
 
         return resources_urls
 
+    def find_sections_region(self, page, courseware_selector):
+        """
+        Returns the navigation of the course, found with the
+        courseware_selector of the site
+        """
+        return find_region(page, courseware_selector)
+
     def extract_sections_from_html(self, page, BASE_URL):
         """
         Extract sections (Section->SubSection) from the html page
@@ -220,7 +630,7 @@ class ClassicEdXPageExtractor(PageExtractor):
 
             return subsections
 
-        soup = BeautifulSoup(page)
+        soup = BeautifulSoup(page, SoupStrainer('div', class_=has_class('chapter')))
         sections_soup = soup.find_all('div', attrs={'class': 'chapter'})
 
         sections = [Section(position=i,
@@ -238,7 +648,9 @@ class ClassicEdXPageExtractor(PageExtractor):
         """
         Extracts courses (Course) from the html page
         """
-        soup = BeautifulSoup(page)
+        # All the course structures below are tags with the class course
+        soup = BeautifulSoup(page, SoupStrainer(['article', 'div'],
+                                                class_=has_class('course')))
 
         # First, try with new course structure (as of December 2017).  If
         # that doesn't work, we fallback to an older course structure
@@ -284,35 +696,36 @@ class CurrentEdXPageExtractor(ClassicEdXPageExtractor):
     A new page extractor for the recent changes in layout of edx
     """
     def extract_unit(self, text, BASE_URL, file_formats):
-        re_metadata = re.compile(r'data-metadata=&#39;(.*?)&#39;')
         videos = []
-        match_metadatas = re_metadata.findall(text)
-        for match_metadata in match_metadatas:
-            metadata = html_parser.HTMLParser().unescape(match_metadata)
-            metadata = json.loads(html_parser.HTMLParser().unescape(metadata))
+        for match_metadata in RE_METADATA.findall(text):
+            youtube_id, available_subs_path, sub_template_path, mp4_urls = \
+                decode_video_metadata(match_metadata)
             video_youtube_url = None
-            re_video_speed = re.compile(r'1.0\d+\:(?:.*?)(.{11})')
-            match_video_youtube_url = re_video_speed.search(metadata['streams'])
-            if match_video_youtube_url is not None:
-                video_id = match_video_youtube_url.group(1)
-                video_youtube_url = 'https://youtube.com/watch?v=' + video_id
+            if youtube_id is not None:
+                video_youtube_url = 'https://youtube.com/watch?v=' + youtube_id
             # notice that the concrete languages come now in
             # so we can eventually build the full urls here
             # subtitles_download_urls = {sub_lang:
             #                            BASE_URL + metadata['transcriptTranslationUrl'].replace('__lang__', sub_lang)
             #                            for sub_lang in metadata['transcriptLanguages'].keys()}
-            available_subs_url = BASE_URL + metadata['transcriptAvailableTranslationsUrl']
-            sub_template_url = BASE_URL + metadata['transcriptTranslationUrl'].replace('__lang__', '%s')
-            mp4_urls = [url for url in metadata['sources'] if url.endswith('.mp4')]
+            available_subs_url = BASE_URL + available_subs_path
+            sub_template_url = BASE_URL + sub_template_path
             videos.append(Video(video_youtube_url=video_youtube_url,
                                 available_subs_url=available_subs_url,
                                 sub_template_url=sub_template_url,
-                                mp4_urls=mp4_urls))
+                                mp4_urls=list(mp4_urls)))
 
         resources_urls = self.extract_resources_urls(text, BASE_URL,
                                                      file_formats)
         return Unit(videos=videos, resources_urls=resources_urls)
 
+    def find_sections_region(self, page, courseware_selector):
+        """
+        Returns the navigation of the course, which isn't the one found by
+        the courseware_selector of the site in this layout
+        """
+        return find_region(page, ('nav', {'class': 'course-navigation'}))
+
     def extract_sections_from_html(self, page, BASE_URL):
         """
         Extract sections (Section->SubSection) from the html page
@@ -343,7 +756,7 @@ class CurrentEdXPageExtractor(ClassicEdXPageExtractor):
 
             return subsections
 
-        soup = BeautifulSoup(page)
+        soup = BeautifulSoup(page, SoupStrainer('div', class_=has_class('chapter-content-container')))
         sections_soup = soup.find_all('div', attrs={'class': 'chapter-content-container'})
 
         sections = [Section(position=i,
@@ -363,6 +776,13 @@ class NewEdXPageExtractor(CurrentEdXPageExtractor):
     A new page extractor for the latest changes in layout of edx
     """
 
+    def find_sections_region(self, page, courseware_selector):
+        """
+        The sections are in the outline of the course, which is most of the
+        page in this layout, so the whole page is parsed
+        """
+        return None
+
     def extract_sections_from_html(self, page, BASE_URL):
         """
         Extract sections (Section->SubSection) from the html page
@@ -393,7 +813,7 @@ class NewEdXPageExtractor(CurrentEdXPageExtractor):
 
             return subsections
 
-        soup = BeautifulSoup(page)
+        soup = BeautifulSoup(page, SoupStrainer('li', class_=has_class('outline-item', 'section')))
         sections_soup = soup.find_all('li', class_=['outline-item','section'])
 
         sections = [Section(position=i,
@@ -427,6 +847,14 @@ def get_page_extractor(url):
         return ClassicEdXPageExtractor()
 
 
+def get_extractor_version(url):
+    """
+    Returns a string identifying the page extractor used for url and its
+    version
+    """
+    page_extractor = get_page_extractor(url)
+    return '%s-%d' % (type(page_extractor).__name__, page_extractor.VERSION)
+
+
 def is_youtube_url(url):
-    re_youtube_url = re.compile(r'(https?\:\/\/(?:www\.)?(?:youtube\.com|youtu\.?be)\/.*?)')
-    return re_youtube_url.match(url)
+    return RE_YOUTUBE_URL.match(url)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-stage timing of a run of edx-dl (--profile)
+
+The stages of a run (login, courses, sections, extraction, downloads...)
+and their sub-steps (each page, file or subtitle) are timed as spans, named
+'stage' or 'stage/sub-step'. The requests made through the shared session
+are counted, with their bytes, in the innermost span of the thread making
+them, or in the innermost span of the thread which created the profiler if
+the thread has none (e.g., the workers extracting the units).
+
+Profiling is disabled unless a Profiler is set with set_profiler(), in which
+case profile() and record() are cheap no-ops.
+"""
+
+import cProfile
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Number of slowest urls kept for each stage
+NUM_SLOWEST_URLS = 3
+
+
+class StageStats(object):
+    """
+    Counters of the spans of a stage and of the requests made in them.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.requests = 0
+        self.bytes = 0
+        self.slowest = []  # heap of (seconds, url)
+
+
+class Profiler(object):
+    """
+    Collects the timing of the stages of a run.
+
+    Usage:
+
+      >>> profiler = Profiler()
+      >>> profiler.watch_session(get_session())
+      >>> with profiler.stage('courses', url):
+      ...     courses = get_courses_info(url, headers)
+      >>> print(profiler.summary())
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = OrderedDict()  # {name: StageStats}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._main_stack = self._stack()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    def current_stage(self):
+        """
+        Returns the name of the span the requests of the calling thread are
+        counted in, or None.
+        """
+        stack = self._stack() or self._main_stack
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def stage(self, name, url=None):
+        """
+        Context manager timing its block as a span of the stage name. The
+        spans with an url are candidates to the slowest urls of the stage.
+        """
+        with self._lock:
+            self._stats(name)  # the stages are listed in order of start
+        stack = self._stack()
+        stack.append(name)
+        started = time.time()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self.record(name, time.time() - started, url)
+
+    def record(self, name, seconds, url=None):
+        """
+        Records a span of the stage name which took the given seconds.
+        """
+        with self._lock:
+            stats = self._stats(name)
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if url is not None:
+                heapq.heappush(stats.slowest, (seconds, url))
+                if len(stats.slowest) > NUM_SLOWEST_URLS:
+                    heapq.heappop(stats.slowest)
+
+    def record_request(self, num_bytes):
+        """
+        Counts a request, which transferred num_bytes, in the current
+        stage of the calling thread.
+        """
+        name = self.current_stage() or 'other'
+        with self._lock:
+            stats = self._stats(name)
+            stats.requests += 1
+            stats.bytes += num_bytes
+
+    def response_hook(self, response, *args, **kwargs):
+        """
+        requests hook counting the responses. The bytes of streamed
+        responses are taken from their Content-Length, since their bodies
+        haven't been read yet.
+        """
+        if kwargs.get('stream'):
+            try:
+                num_bytes = int(response.headers.get('Content-Length', 0))
+            except ValueError:
+                num_bytes = 0
+        else:
+            num_bytes = len(response.content)
+        self.record_request(num_bytes)
+        return response
+
+    def watch_session(self, session):
+        """
+        Counts the requests made through the requests session.
+        """
+        session.hooks['response'].append(self.response_hook)
+
+    def summary(self):
+        """
+        Returns the report of the stages as text.
+        """
+        lines = ['Profile of the run: %.2f s' % (time.time() - self.started),
+                 '']
+        row = '%-32s %7s %10s %9s %9s %12s'
+        lines.append(row % ('stage', 'calls', 'total (s)', 'max (s)',
+                            'requests', 'bytes'))
+        with self._lock:
+            stages = list(self.stages.items())
+            for name, stats in stages:
+                lines.append(row % (name, stats.calls,
+                                    '%.3f' % stats.seconds,
+                                    '%.3f' % stats.max_seconds,
+                                    stats.requests, stats.bytes))
+
+            slowest = [(name, sorted(stats.slowest, reverse=True))
+                       for name, stats in stages if stats.slowest]
+        if slowest:
+            lines += ['', 'Slowest urls:']
+            for name, spans in slowest:
+                lines.append('  %s' % name)
+                lines += ['    %8.3f s  %s' % span for span in spans]
+        return '\n'.join(lines) + '\n'
+
+
+_profiler = None
+
+
+def get_profiler():
+    """
+    Returns the profiler of the run, or None if profiling is disabled.
+    """
+    return _profiler
+
+
+def set_profiler(profiler):
+    """
+    Sets the profiler of the run, None disables profiling.
+    """
+    global _profiler
+    _profiler = profiler
+
+
+@contextmanager
+def profile(name, url=None):
+    """
+    Times its block as a span of the stage name if profiling is enabled.
+    """
+    profiler = _profiler
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name, url):
+            yield
+
+
+def record(name, seconds, url=None):
+    """
+    Records a span of the stage name if profiling is enabled.
+    """
+    if _profiler is not None:
+        _profiler.record(name, seconds, url)
+
+
+def record_request(num_bytes):
+    """
+    Counts a request made without the shared session if profiling is
+    enabled.
+    """
+    if _profiler is not None:
+        _profiler.record_request(num_bytes)
+
+
+def run_with_cprofile(filename, func, *args, **kwargs):
+    """
+    Calls func(*args, **kwargs) under cProfile and dumps the statistics
+    (of the calling thread only) in filename, in the format of pstats.
+    """
+    cprofiler = cProfile.Profile()
+    cprofiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        cprofiler.disable()
+        cprofiler.dump_stats(filename)
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+
+"""
+Aggregate progress of the downloads
+
+The files are planned as soon as their units are given to the scheduler,
+and each download is tracked as a Transfer from the thread doing it, which
+reports its size when known (e.g., from Content-Length or from the output
+of youtube-dl) and the bytes received. The sizes of the files not started
+yet, or without a known size, are estimated with the average size of the
+files with the same extension (or of all of them), to give the total
+planned bytes and the ETA.
+
+Tracking is disabled unless a Progress is set with set_progress(), in which
+case the module level functions are cheap no-ops.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from six.moves.urllib.parse import urlparse
+
+from .common import DEFAULT_PROGRESS_INTERVAL
+
+# Seconds of history used to compute the current throughput
+RATE_WINDOW = 30
+
+# Progress lines of youtube-dl --newline, e.g.,
+# [download]  12.3% of ~45.67MiB at  1.23MiB/s ETA 00:30
+RE_YOUTUBE_DL_PROGRESS = re.compile(
+    r'^\[download\]\s+([\d.]+)% of\s+~?\s*([\d.]+)\s*([KMGT]?i?B)')
+
+SIZE_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3,
+              'TiB': 1024 ** 4, 'KB': 1000, 'MB': 1000 ** 2,
+              'GB': 1000 ** 3, 'TB': 1000 ** 4}
+
+
+def get_extension(url):
+    """
+    Returns the (lowercase) extension of the file of url, or ''.
+    """
+    return os.path.splitext(urlparse(url).path)[1].lower()
+
+
+def parse_youtube_dl_progress(line):
+    """
+    Returns (total bytes, bytes received) from a progress line of
+    youtube-dl, or None if line isn't one.
+    """
+    match = RE_YOUTUBE_DL_PROGRESS.match(line.strip())
+    if match is None:
+        return None
+    percent, size, unit = match.groups()
+    if unit not in SIZE_UNITS:
+        return None
+    total = int(float(size) * SIZE_UNITS[unit])
+    return total, int(total * min(float(percent), 100.0) / 100)
+
+
+def format_bytes(num_bytes):
+    for unit, size in [('GB', 1e9), ('MB', 1e6), ('KB', 1e3)]:
+        if num_bytes >= size:
+            return '%.1f %s' % (num_bytes / size, unit)
+    return '%d B' % num_bytes
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '%dh%02dm' % (seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return '%dm%02ds' % (seconds // 60, seconds % 60)
+    return '%ds' % seconds
+
+
+class Transfer(object):
+    """
+    The download of url into filename by the thread worker.
+    """
+
+    def __init__(self, url, filename, worker):
+        self.url = url
+        self.filename = filename
+        self.worker = worker
+        self.size = None
+        self.received = 0
+
+
+class Progress(object):
+    """
+    Planned, running and finished downloads, safe to update from several
+    threads.
+
+    Usage:
+
+      >>> progress = Progress()
+      >>> progress.plan(url)
+      >>> transfer = progress.start(url, filename)
+      >>> progress.set_size(transfer, size)
+      >>> progress.add_received(transfer, len(chunk))
+      >>> progress.finish(transfer)
+      >>> progress.snapshot()
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._planned = set()
+        self._pending = {}  # {url: extension} not started yet
+        self._active = []  # [Transfer]
+        self._sizes = {}  # {extension: [number of files, total size]}
+        self.num_done = 0
+        self.num_skipped = 0
+        self.num_failed = 0
+        self.bytes_done = 0  # of the files finished
+        self.received_total = 0  # received in this run, for the throughput
+
+    def plan(self, url):
+        """
+        Adds url to the files to download, if it wasn't already.
+        """
+        with self._lock:
+            if url not in self._planned:
+                self._planned.add(url)
+                self._pending[url] = get_extension(url)
+
+    def start(self, url, filename):
+        """
+        Returns the Transfer of url into filename by the calling thread.
+        """
+        transfer = Transfer(url, filename, threading.current_thread().name)
+        with self._lock:
+            if url not in self._planned:
+                self._planned.add(url)
+            self._pending.pop(url, None)
+            self._active.append(transfer)
+        return transfer
+
+    def skip(self, url):
+        """
+        Counts url as skipped, since its file exists.
+        """
+        with self._lock:
+            self._planned.add(url)
+            self._pending.pop(url, None)
+            self.num_skipped += 1
+
+    def set_size(self, transfer, size, received=None):
+        """
+        Sets the size of transfer and, if given, the bytes already
+        received (e.g., when resuming or restarting it).
+        """
+        with self._lock:
+            transfer.size = size
+            if received is not None:
+                transfer.received = received
+
+    def add_received(self, transfer, num_bytes):
+        with self._lock:
+            transfer.received += num_bytes
+            self.received_total += num_bytes
+
+    def set_received(self, transfer, received):
+        """
+        Sets the bytes received of transfer, for sources (like youtube-dl)
+        which only report the total.
+        """
+        with self._lock:
+            self.received_total += max(0, received - transfer.received)
+            transfer.received = received
+
+    def finish(self, transfer, ok=True):
+        with self._lock:
+            self._active.remove(transfer)
+            if not ok:
+                self.num_failed += 1
+                return
+            self.num_done += 1
+            size = max(transfer.received, transfer.size or 0)
+            self.bytes_done += size
+            extension = get_extension(transfer.url)
+            count_size = self._sizes.setdefault(extension, [0, 0])
+            count_size[0] += 1
+            count_size[1] += size
+
+    def _estimate(self, extension):
+        count, size = self._sizes.get(extension, (0, 0))
+        if count == 0:
+            count = sum(c for c, _ in self._sizes.values())
+            size = sum(s for _, s in self._sizes.values())
+        return size // count if count else None
+
+    def snapshot(self):
+        """
+        Returns a dict with the files planned, done, skipped, failed and
+        active, the bytes received and the estimated total bytes (None if
+        there is nothing to base the estimation on yet), and the status of
+        each active transfer as (worker, filename, received, size).
+        """
+        with self._lock:
+            received = self.bytes_done
+            total = self.bytes_done
+            known = True
+            for transfer in self._active:
+                received += transfer.received
+                size = transfer.size
+                if size is None:
+                    size = self._estimate(get_extension(transfer.url))
+                if size is None:
+                    known = False
+                else:
+                    total += max(size, transfer.received)
+            for extension in self._pending.values():
+                size = self._estimate(extension)
+                if size is None:
+                    known = False
+                else:
+                    total += size
+            return {
+                'planned': len(self._planned),
+                'done': self.num_done,
+                'skipped': self.num_skipped,
+                'failed': self.num_failed,
+                'active': len(self._active),
+                'received': received,
+                'total': total if known else None,
+                'received_total': self.received_total,
+                'transfers': [(t.worker, os.path.basename(t.filename),
+                               t.received, t.size) for t in self._active],
+            }
+
+
+class ProgressReporter(object):
+    """
+    Reports the progress every interval seconds from a background thread,
+    and a last time when stopped: a summary line and the status of each
+    worker, or only the summary line if quiet (printed to stderr, since
+    the log only shows errors then).
+
+    Usage:
+
+      >>> reporter = ProgressReporter(progress, interval=10, quiet=False)
+      >>> reporter.start()
+      >>> ...
+      >>> reporter.stop()
+    """
+
+    def __init__(self, progress, interval=DEFAULT_PROGRESS_INTERVAL,
+                 quiet=False, stream=None):
+        self.progress = progress
+        self.interval = interval
+        self.quiet = quiet
+        self.stream = stream or sys.stderr
+        self._samples = deque()  # (time, bytes received in the run)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.report(final=True)
+
+    def _rate(self, now, received_total):
+        """
+        Returns the bytes per second received in the last RATE_WINDOW
+        seconds (or since the start).
+        """
+        self._samples.append((now, received_total))
+        while len(self._samples) > 2 and \
+                self._samples[1][0] <= now - RATE_WINDOW:
+            self._samples.popleft()
+        first_time, first_received = self._samples[0]
+        if len(self._samples) == 1:
+            first_time, first_received = self.progress.started, 0
+        elapsed = now - first_time
+        return (received_total - first_received) / elapsed if elapsed else 0
+
+    def summary(self, snapshot, rate, elapsed=None):
+        """
+        Returns the line summarizing snapshot with the given throughput.
+        """
+        line = 'Progress: %d/%d files' % (
+            snapshot['done'] + snapshot['skipped'] + snapshot['failed'],
+            snapshot['planned'])
+        if snapshot['skipped'] or snapshot['failed']:
+            line += ' (%d skipped, %d failed)' % (snapshot['skipped'],
+                                                  snapshot['failed'])
+        line += ', %s' % format_bytes(snapshot['received'])
+        total = snapshot['total']
+        if total is not None:
+            line += ' of ~%s' % format_bytes(total)
+        line += ', %.2f MB/s' % (rate / 1e6)
+        if elapsed is not None:
+            line += ', done in %s' % format_duration(elapsed)
+        elif total is not None and rate > 0:
+            remaining = max(0, total - snapshot['received'])
+            line += ', ETA %s' % format_duration(remaining / rate)
+        return line
+
+    def report(self, final=False):
+        now = time.time()
+        snapshot = self.progress.snapshot()
+        if final:
+            elapsed = now - self.progress.started
+            rate = snapshot['received_total'] / elapsed if elapsed else 0
+            lines = [self.summary(snapshot, rate, elapsed)]
+        else:
+            rate = self._rate(now, snapshot['received_total'])
+            lines = [self.summary(snapshot, rate)]
+            if not self.quiet:
+                for worker, filename, received, size in \
+                        sorted(snapshot['transfers']):
+                    if size:
+                        status = '%3d%% of %s' % (100 * received // size,
+                                                  format_bytes(size))
+                    else:
+                        status = format_bytes(received)
+                    lines.append('  [%s] %s: %s' % (worker, filename, status))
+
+        if self.quiet:
+            self.stream.write(lines[0] + '\n')
+            self.stream.flush()
+        else:
+            for line in lines:
+                logging.info(line)
+
+
+_progress = None
+_local = threading.local()
+
+
+def get_progress():
+    """
+    Returns the progress of the run, or None if it isn't tracked.
+    """
+    return _progress
+
+
+def set_progress(progress):
+    """
+    Sets the progress of the run, None disables tracking it.
+    """
+    global _progress
+    _progress = progress
+
+
+def plan(urls):
+    """
+    Adds urls to the files to download, if tracking the progress.
+    """
+    if _progress is not None:
+        for url in urls:
+            if url is not None:
+                _progress.plan(url)
+
+
+def skip(url):
+    if _progress is not None:
+        _progress.skip(url)
+
+
+def current_transfer():
+    """
+    Returns the transfer of the calling thread, or None.
+    """
+    return getattr(_local, 'transfer', None)
+
+
+@contextmanager
+def in_transfer(transfer):
+    """
+    Makes transfer the one of the calling thread in its block, e.g., for
+    the threads downloading segments of a file.
+    """
+    previous = current_transfer()
+    _local.transfer = transfer
+    try:
+        yield
+    finally:
+        _local.transfer = previous
+
+
+def start_transfer(url, filename):
+    """
+    Starts tracking the download of url into filename by the calling
+    thread and returns its transfer, or None if the progress isn't tracked.
+    """
+    if _progress is None:
+        return None
+    transfer = _progress.start(url, filename)
+    _local.transfer = transfer
+    return transfer
+
+
+def finish_transfer(transfer, ok=True):
+    """
+    Finishes the transfer returned by start_transfer, which failed unless
+    ok.
+    """
+    if transfer is not None:
+        _local.transfer = None
+        if _progress is not None:
+            _progress.finish(transfer, ok)
+
+
+def set_size(size, received=None):
+    """
+    Sets the size of the transfer of the calling thread, if any.
+    """
+    transfer = current_transfer()
+    if _progress is not None and transfer is not None:
+        _progress.set_size(transfer, size, received)
+
+
+def count_received(num_bytes):
+    """
+    Adds bytes received to the transfer of the calling thread, if any.
+    """
+    transfer = current_transfer()
+    if _progress is not None and transfer is not None:
+        _progress.add_received(transfer, num_bytes)
+
+
+def youtube_dl_output(line):
+    """
+    Handles a line of the output of youtube-dl --newline, updating the
+    transfer of the calling thread with its progress lines and logging the
+    others.
+    """
+    size_received = parse_youtube_dl_progress(line)
+    if size_received is None:
+        logging.info(line.rstrip())
+        return
+    transfer = current_transfer()
+    if _progress is not None and transfer is not None:
+        size, received = size_received
+        _progress.set_size(transfer, size)
+        _progress.set_received(transfer, received)
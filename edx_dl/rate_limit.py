@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-host limits of the rate of requests and of the bandwidth
+
+Each host has up to two token buckets shared by all the threads of the
+process: one of requests per second, taken before each request, and one of
+bytes per second, taken as the bodies are received. Both allow bursts of
+one second worth of tokens. The limits of a host are given by target:
+
+* 'site': the host of the Open edX platform,
+* 'youtube': all of YouTube (as a single host, like the download
+  scheduler does), whose videos are downloaded by youtube-dl,
+* 'cdn': any other host, e.g., the CDNs serving the videos,
+* or the name of a host, which takes precedence over the above.
+
+Limiting is disabled unless a HostRateLimiter is set with
+set_rate_limiter(), in which case the module level functions are cheap
+no-ops.
+"""
+
+import threading
+import time
+
+from six.moves.urllib.parse import urlparse
+
+# Units accepted in the bandwidth limits, as youtube-dl's --limit-rate
+BANDWIDTH_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_bandwidth(value):
+    """
+    Returns the bytes per second given by value, a number optionally
+    followed by K, M or G (e.g., 500K or 2.5M), or None if empty or 0.
+    """
+    value = value.strip().upper()
+    unit = value[-1:] if value[-1:] in BANDWIDTH_UNITS else ''
+    number = float(value[:len(value) - len(unit)] or 0)
+    if number < 0:
+        raise ValueError('Negative bandwidth: %s' % value)
+    return int(number * BANDWIDTH_UNITS[unit]) or None
+
+
+def parse_rate_limit(spec):
+    """
+    Returns (target, (requests per second, bytes per second)) from spec,
+    TARGET=REQUESTS_PER_SECOND[/BANDWIDTH] (e.g., site=5, cdn=/20M or
+    youtube=1/2M), None meaning no limit. Raises ValueError if spec isn't
+    valid.
+    """
+    target, sep, limits = spec.partition('=')
+    target = target.strip()
+    if not sep or not target:
+        raise ValueError('Invalid rate limit: %s' % spec)
+    requests_per_second, _, bandwidth = limits.partition('/')
+    rate = float(requests_per_second or 0)
+    if rate < 0:
+        raise ValueError('Negative rate of requests: %s' % spec)
+    return target, (rate or None, parse_bandwidth(bandwidth))
+
+
+class TokenBucket(object):
+    """
+    Token bucket filled with rate tokens per second up to capacity (by
+    default, one second worth). Tokens can be taken before they are
+    available, the taker waiting until the debt is paid off, so that large
+    takes (e.g., a chunk bigger than the capacity) and concurrent takers are
+    served in order.
+
+    Usage:
+
+      >>> bucket = TokenBucket(rate=5)
+      >>> bucket.take()  # sleeps if needed
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.time):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else
+                              max(1.0, self.rate))
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Takes tokens and returns the seconds to wait before using them.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def take(self, tokens=1):
+        """
+        Takes tokens, sleeping until they are available.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class HostRateLimiter(object):
+    """
+    Token buckets of requests and bytes per second of each host, with the
+    limits given by target in limits, {target: (requests per second, bytes
+    per second)}, None meaning no limit. site_url is the url of the Open
+    edX platform, whose host is the 'site' target.
+
+    Usage:
+
+      >>> limiter = HostRateLimiter({'site': (5, None)}, BASE_URL)
+      >>> limiter.watch_session(get_session())
+    """
+
+    def __init__(self, limits, site_url=None):
+        self.limits = dict(limits)
+        self.site_host = urlparse(site_url).netloc if site_url else None
+        self._lock = threading.Lock()
+        self._buckets = {}  # {host key: (requests bucket, bytes bucket)}
+
+    def get_limits(self, host_key):
+        """
+        Returns the (requests per second, bytes per second) of host_key.
+        """
+        if host_key in self.limits:
+            return self.limits[host_key]
+        if host_key == 'youtube':
+            target = 'youtube'
+        elif host_key == self.site_host:
+            target = 'site'
+        else:
+            target = 'cdn'
+        return self.limits.get(target, (None, None))
+
+    def _get_buckets(self, url):
+        host_key = _get_host_key(url)
+        with self._lock:
+            buckets = self._buckets.get(host_key)
+            if buckets is None:
+                rate, bandwidth = self.get_limits(host_key)
+                buckets = self._buckets[host_key] = (
+                    TokenBucket(rate) if rate else None,
+                    TokenBucket(bandwidth) if bandwidth else None)
+        return buckets
+
+    def reserve_request(self, url):
+        """
+        Takes a request to url from its bucket and returns the seconds to
+        wait before making it.
+        """
+        bucket = self._get_buckets(url)[0]
+        return bucket.reserve() if bucket is not None else 0.0
+
+    def reserve_bytes(self, url, num_bytes):
+        """
+        Takes num_bytes received from url from its bucket and returns the
+        seconds to wait before receiving more.
+        """
+        bucket = self._get_buckets(url)[1]
+        return bucket.reserve(num_bytes) if bucket is not None else 0.0
+
+    def get_bandwidth(self, url):
+        """
+        Returns the bytes per second allowed from the host of url, or None.
+        """
+        return self.get_limits(_get_host_key(url))[1]
+
+    def watch_session(self, session):
+        """
+        Paces the requests made through the requests session, wrapping the
+        send method of its adapters. The bodies of the streamed responses
+        must be paced by their readers with wait_for_body().
+        """
+        adapters = []
+        for adapter in session.adapters.values():
+            if adapter not in adapters:
+                adapters.append(adapter)
+        for adapter in adapters:
+            adapter.send = self._paced_send(adapter.send)
+
+    def _paced_send(self, send):
+        def paced_send(request, **kwargs):
+            _sleep(self.reserve_request(request.url))
+            response = send(request, **kwargs)
+            if not kwargs.get('stream'):
+                _sleep(self.reserve_bytes(request.url,
+                                          len(response.content)))
+            return response
+        return paced_send
+
+
+def _get_host_key(url):
+    # Imported here since the scheduler depends on the parsing, which
+    # depends on the utils, which depend on this module
+    from .scheduler import get_host_key
+    return get_host_key(url)
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """
+    Returns the rate limiter of the run, or None if there are no limits.
+    """
+    return _rate_limiter
+
+
+def set_rate_limiter(rate_limiter):
+    """
+    Sets the rate limiter of the run, None disables the limits.
+    """
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def wait_for_request(url):
+    """
+    Waits until a request to url is allowed, if limiting.
+    """
+    if _rate_limiter is not None:
+        _sleep(_rate_limiter.reserve_request(url))
+
+
+def wait_for_body(response, num_bytes):
+    """
+    Waits until the num_bytes just received of the body of the (requests)
+    response are paid for, if limiting.
+    """
+    if _rate_limiter is not None:
+        _sleep(_rate_limiter.reserve_bytes(response.url, num_bytes))
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""
+Retries of the requests that failed because of transient errors
+
+A request is retried when it fails because of the network (connection
+errors, timeouts, bodies cut halfway) or the server (408, 429 and 5xx
+statuses), waiting between attempts with exponential backoff and full
+jitter, or as told by the Retry-After header of the response. Other errors
+(e.g., a 404 or an invalid certificate) are raised right away.
+
+The consecutive failures are counted by host, and a host which keeps
+failing is considered down: its circuit is opened and no request is made to
+it for a while. After that, a single request is let through to probe it,
+which closes the circuit if it succeeds or opens it again otherwise. The
+requests to a host with an open circuit wait for it to be probed, as long
+as they have attempts left.
+
+Retries are disabled unless a RetryPolicy is set with set_retry_policy(),
+in which case retry_call() just calls the function given. The calls of
+retry_call() made within another one (e.g., the request of a page whose
+body is read in the same retried call) are attempted once, the outer call
+retrying the whole.
+"""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from requests.exceptions import (
+    ChunkedEncodingError,
+    ConnectionError,
+    ContentDecodingError,
+    HTTPError,
+    RequestException,
+    SSLError,
+    Timeout,
+)
+from six.moves.urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .common import (
+    DEFAULT_BREAKER_COOLDOWN,
+    DEFAULT_BREAKER_THRESHOLD,
+    DEFAULT_RETRIES,
+    DEFAULT_RETRY_BASE_DELAY,
+    DEFAULT_RETRY_MAX_DELAY,
+)
+from .metrics import count_retry
+
+RETRYABLE_STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+
+RETRYABLE_EXCEPTIONS = (ConnectionError, Timeout, ChunkedEncodingError,
+                        ContentDecodingError)
+if aiohttp is not None:
+    RETRYABLE_EXCEPTIONS += (aiohttp.ClientConnectionError,
+                             aiohttp.ClientPayloadError)
+
+
+class CircuitOpenError(RequestException):
+    """
+    Raised instead of making a request to a host whose circuit is open,
+    retry_in seconds before it will be probed again.
+    """
+
+    def __init__(self, host, retry_in):
+        super(CircuitOpenError, self).__init__(
+            'Too many consecutive errors from %s, not retrying for %.0f s'
+            % (host, retry_in))
+        self.host = host
+        self.retry_in = retry_in
+
+
+def get_status(exception):
+    """
+    Returns the HTTP status of the response which caused exception, or
+    None.
+    """
+    if isinstance(exception, HTTPError):
+        response = exception.response
+        return response.status_code if response is not None else None
+    status = getattr(exception, 'status', None)  # aiohttp
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exception):
+    """
+    Returns True if the request which raised exception may succeed if
+    retried.
+    """
+    if isinstance(exception, CircuitOpenError):
+        return True
+    status = get_status(exception)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    if isinstance(exception, SSLError):
+        return False
+    return isinstance(exception, RETRYABLE_EXCEPTIONS)
+
+
+def get_retry_after(exception, now=None):
+    """
+    Returns the seconds to wait before retrying as told by the Retry-After
+    header (in seconds or as a date) of the response which caused
+    exception, or None.
+    """
+    response = getattr(exception, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        headers = getattr(exception, 'headers', None)  # aiohttp
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    date = email.utils.parsedate_tz(value)
+    if date is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, email.utils.mktime_tz(date) - now)
+
+
+def get_host(url):
+    return urlparse(url).netloc
+
+
+class CircuitBreaker(object):
+    """
+    Opens the circuit of a host for cooldown seconds after threshold
+    consecutive failures of its requests.
+
+    Usage:
+
+      >>> breaker = CircuitBreaker(threshold=10, cooldown=30)
+      >>> breaker.check(host)  # raises CircuitOpenError if open
+      >>> breaker.record(host, failed)
+    """
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD,
+                 cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = {}  # {host: consecutive failures}
+        self._opened = {}  # {host: time the circuit was opened}
+        self._probing = set()  # hosts with a probe in flight
+
+    def check(self, host):
+        """
+        Raises CircuitOpenError if no request should be made to host now.
+        Otherwise the request must be recorded when finished, since it may
+        be the probe of the host.
+        """
+        with self._lock:
+            opened = self._opened.get(host)
+            if opened is None:
+                return
+            retry_in = opened + self.cooldown - time.time()
+            if retry_in > 0 or host in self._probing:
+                raise CircuitOpenError(host, max(0.0, retry_in))
+            self._probing.add(host)
+
+    def record(self, host, failed):
+        """
+        Records the outcome of a request to host, failed because of an
+        error worth retrying or not.
+        """
+        with self._lock:
+            self._probing.discard(host)
+            if not failed:
+                self._failures.pop(host, None)
+                if self._opened.pop(host, None) is not None:
+                    logging.info('%s is responding again', host)
+                return
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if host in self._opened or failures >= self.threshold:
+                if host not in self._opened:
+                    logging.warn('%d consecutive errors from %s, pausing '
+                                 'its requests for %d s', failures, host,
+                                 self.cooldown)
+                self._opened[host] = time.time()
+
+    def is_open(self, host):
+        with self._lock:
+            return host in self._opened
+
+
+class RetryPolicy(object):
+    """
+    Retries the calls which fail because of transient errors up to
+    max_retries times, waiting with exponential backoff (base_delay,
+    2 * base_delay, 4 * base_delay... up to max_delay seconds) with full
+    jitter, or the time given by Retry-After (up to max_delay).
+
+    Usage:
+
+      >>> policy = RetryPolicy(max_retries=5)
+      >>> page = policy.call(url, get_page_contents, url, headers)
+    """
+
+    def __init__(self, max_retries=DEFAULT_RETRIES,
+                 base_delay=DEFAULT_RETRY_BASE_DELAY,
+                 max_delay=DEFAULT_RETRY_MAX_DELAY, breaker=None,
+                 sleep=time.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.sleep = sleep
+        self._random = random.Random()
+
+    def backoff(self, retry):
+        """
+        Returns the seconds to wait before the given retry (from 0).
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** retry)
+        return self._random.uniform(0, ceiling)
+
+    def _attempt(self, host, func, args, kwargs):
+        self.breaker.check(host)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.breaker.record(host, failed=is_retryable(e))
+            raise
+        self.breaker.record(host, failed=False)
+        return result
+
+    def delay(self, url, retry, exception):
+        """
+        Returns the seconds to wait before the given retry (from 0) of the
+        request to url which raised exception, or raises it again if it
+        shouldn't be retried.
+        """
+        if retry >= self.max_retries or not is_retryable(exception):
+            raise exception
+        delay = get_retry_after(exception)
+        if delay is None:
+            delay = self.backoff(retry)
+        if isinstance(exception, CircuitOpenError):
+            delay = max(delay, exception.retry_in)
+        delay = min(delay, self.max_delay)
+        logging.info('Retrying %s in %.1f s (%d/%d): %s', url, delay,
+                     retry + 1, self.max_retries, exception)
+        count_retry(url)
+        return delay
+
+    def call(self, url, func, *args, **kwargs):
+        """
+        Returns func(*args, **kwargs), a request to url, retrying it if
+        needed.
+        """
+        host = get_host(url)
+        retry = 0
+        while True:
+            try:
+                return self._attempt(host, func, args, kwargs)
+            except Exception as e:
+                delay = self.delay(url, retry, e)
+            self.sleep(delay)
+            retry += 1
+
+
+_policy = None
+
+# Whether the thread is running a call of retry_call()
+_local = threading.local()
+
+
+def get_retry_policy():
+    """
+    Returns the retry policy of the run, or None if retries are disabled.
+    """
+    return _policy
+
+
+def set_retry_policy(policy):
+    """
+    Sets the retry policy of the run, None disables retries.
+    """
+    global _policy
+    _policy = policy
+
+
+def retry_call(url, func, *args, **kwargs):
+    """
+    Returns func(*args, **kwargs), a request to url, retried as told by the
+    retry policy of the run.
+    """
+    policy = _policy
+    if policy is None or getattr(_local, 'retrying', False):
+        return func(*args, **kwargs)
+    _local.retrying = True
+    try:
+        return policy.call(url, func, *args, **kwargs)
+    finally:
+        _local.retrying = False
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scheduling of concurrent downloads
+"""
+
+import logging
+import sys
+import threading
+
+from six import reraise
+from six.moves.urllib.parse import urlparse
+
+from .parsing import is_youtube_url
+
+
+def get_host_key(url):
+    """
+    Returns the key used to group the downloads of url for concurrency
+    limits. All the youtube videos are grouped together since youtube-dl
+    ends up talking to the same servers for all of them.
+    """
+    if url is None:
+        return None
+    if is_youtube_url(url):
+        return 'youtube'
+    return urlparse(url).netloc
+
+
+class DownloadScheduler(object):
+    """
+    Runs download jobs in a bounded pool of worker threads, allowing at most
+    max_per_host jobs to run at the same time against the same host.
+
+    Jobs are started in submission order, except that a job is passed over
+    while its host is busy so that it doesn't hold a worker idle. The first
+    exception raised by a job stops the scheduling of new jobs and is
+    re-raised by join().
+
+    Usage:
+
+      >>> scheduler = DownloadScheduler(num_workers=4, max_per_host=2)
+      >>> scheduler.submit(url, download_url, url, filename, headers, args)
+      >>> ...
+      >>> scheduler.join()
+    """
+
+    def __init__(self, num_workers, max_per_host):
+        self.num_workers = max(1, num_workers)
+        self.max_per_host = max(1, max_per_host)
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._running = {}  # {host: number of running jobs}
+        self._num_running = 0
+        self._error = None
+        self._closed = False
+        self._threads = []
+
+    def submit(self, url, func, *args):
+        """
+        Schedules func(*args), which downloads url, to be run by a worker.
+        """
+        with self._cond:
+            if self._error is not None:
+                return
+            self._pending.append((get_host_key(url), func, args))
+            self._start_workers()
+            self._cond.notify()
+
+    def join(self):
+        """
+        Waits until all the submitted jobs are finished.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        if self._error is not None:
+            reraise(*self._error)
+
+    def _start_workers(self):
+        if len(self._threads) < self.num_workers:
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self):
+        for i, (host, _, _) in enumerate(self._pending):
+            if host is None or self._running.get(host, 0) < self.max_per_host:
+                return self._pending.pop(i)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if self._error is not None:
+                        return
+                    job = self._next_job()
+                    if job is None:
+                        if self._closed and self._num_running == 0 \
+                           and not self._pending:
+                            return
+                        self._cond.wait()
+                host, func, args = job
+                self._running[host] = self._running.get(host, 0) + 1
+                self._num_running += 1
+
+            try:
+                func(*args)
+            except BaseException:
+                logging.debug('Download job failed', exc_info=True)
+                with self._cond:
+                    if self._error is None:
+                        self._error = sys.exc_info()
+                        self._pending = []
+            finally:
+                with self._cond:
+                    self._running[host] -= 1
+                    self._num_running -= 1
+                    self._cond.notify_all()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+HTTP transport shared by all the requests made by edx-dl
+
+All the pages, JSON documents, subtitles and files are requested through a
+single requests.Session, so that connections are kept alive and reused
+between requests (instead of paying a new TCP and TLS handshake for each of
+them) and the cookies obtained when logging in are sent everywhere.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .common import DEFAULT_EXTRACTION_WORKERS
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size=DEFAULT_EXTRACTION_WORKERS):
+    """
+    Creates a session able to keep up to pool_size connections alive to
+    each host. pool_size should match the number of threads that make
+    requests at the same time, otherwise connections are discarded and
+    created again.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def configure_session(pool_size):
+    """
+    Replaces the shared session by a new one with the given pool_size.
+    This should be called before making any request, since the cookies of
+    the previous session are lost.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(pool_size)
+    return _session
+
+
+def get_session():
+    """
+    Returns the session shared by all the requests, creating it if needed.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+    return _session
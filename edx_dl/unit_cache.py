@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent cache of the units extracted from each subsection
+
+The units are stored in a SQLite database (in WAL mode, so that concurrent
+runs don't block nor clobber each other), one row per subsection URL with
+its units serialized as JSON. Lookups only read the rows of the requested
+URLs and updates only write the new ones, so the cost of using the cache
+depends on the current selection and not on everything ever cached.
+
+Each row is keyed by the URL, the version of the page extractor used for it
+and the set of file formats extracted, since the units depend on all of
+them, and records when it was stored so it can expire.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from .common import Unit
+from .parsing import get_extractor_version
+
+
+# SQLite limits the number of parameters of a query
+_MAX_QUERY_PARAMETERS = 500
+
+# Increase when changing the layout of the database, older caches are
+# discarded
+SCHEMA_VERSION = 2
+
+
+def serialize_units(units):
+    """
+    Returns a compact JSON representation of the list of units.
+    """
+    return json.dumps([unit.to_dict() for unit in units],
+                      separators=(',', ':'))
+
+
+def deserialize_units(data):
+    """
+    Returns the list of units represented by data (from serialize_units).
+    """
+    return [Unit.from_dict(unit) for unit in json.loads(data)]
+
+
+def file_formats_key(file_formats):
+    """
+    Returns a string identifying the set of file_formats.
+    """
+    return ','.join(sorted(set(file_formats)))
+
+
+class UnitCache(object):
+    """
+    Cache of units stored in the SQLite database filename.
+
+    Usage:
+
+      >>> cache = UnitCache('edx-dl.cache.db')
+      >>> cached_units = cache.get_many(urls, file_formats, max_age=86400)
+      >>> cache.put_many(new_units, file_formats)
+      >>> cache.close()
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            version = self._connection.execute(
+                'PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._connection.execute('DROP TABLE IF EXISTS units')
+                self._connection.execute('PRAGMA user_version = %d' %
+                                         SCHEMA_VERSION)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS units ('
+                                     'url TEXT NOT NULL, '
+                                     'extractor TEXT NOT NULL, '
+                                     'file_formats TEXT NOT NULL, '
+                                     'stored_at REAL NOT NULL, '
+                                     'data TEXT NOT NULL, '
+                                     'PRIMARY KEY (url, extractor, '
+                                     'file_formats))')
+
+    def _select(self, columns, urls, condition='', parameters=()):
+        urls = list(set(urls))
+        for i in range(0, len(urls), _MAX_QUERY_PARAMETERS):
+            batch = urls[i:i + _MAX_QUERY_PARAMETERS]
+            query = ('SELECT %s FROM units WHERE url IN (%s) %s' %
+                     (columns, ', '.join('?' * len(batch)), condition))
+            for row in self._connection.execute(query,
+                                                batch + list(parameters)):
+                yield row
+
+    def get_many(self, urls, file_formats, max_age=None):
+        """
+        Returns a dict {url: units} with the cached units of the given urls
+        extracted with the current page extractors and file_formats. Urls
+        which are not in the cache, or whose units were stored more than
+        max_age seconds ago, are not included.
+        """
+        min_stored_at = time.time() - max_age if max_age is not None else 0
+        rows = self._select('url, extractor, data', urls,
+                            'AND file_formats = ? AND stored_at >= ?',
+                            (file_formats_key(file_formats), min_stored_at))
+
+        cached_units = {}
+        for url, extractor, data in rows:
+            if extractor == get_extractor_version(url):
+                cached_units[url] = deserialize_units(data)
+        return cached_units
+
+    def put_many(self, all_units, file_formats):
+        """
+        Stores the units of the dict {url: units}, extracted with the
+        current page extractors and file_formats, replacing the ones
+        previously cached for the same key.
+        """
+        stored_at = time.time()
+        formats = file_formats_key(file_formats)
+        rows = [(url, get_extractor_version(url), formats, stored_at,
+                 serialize_units(units))
+                for url, units in all_units.items()]
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO units (url, extractor, file_formats, '
+                'stored_at, data) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def invalidate(self, urls):
+        """
+        Removes all the cached units of the given urls, for any extractor
+        and file formats.
+        """
+        urls = list(set(urls))
+        with self._connection:
+            for i in range(0, len(urls), _MAX_QUERY_PARAMETERS):
+                batch = urls[i:i + _MAX_QUERY_PARAMETERS]
+                self._connection.execute(
+                    'DELETE FROM units WHERE url IN (%s)' %
+                    ', '.join('?' * len(batch)), batch)
+
+    def expire(self, max_age):
+        """
+        Removes the units stored more than max_age seconds ago.
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM units WHERE stored_at < ?',
+                                     (time.time() - max_age,))
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM units').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+def discard_pickle_cache(pickle_filename):
+    """
+    Renames the old, pickle based, cache file out of the way. Its units are
+    not imported: it doesn't record the extractor version, file formats nor
+    time of each unit, so they would pass as fresh and never be extracted
+    again.
+    """
+    if not os.path.exists(pickle_filename):
+        return
+
+    logging.info('Ignoring the old cache [%s], renamed to [%s.old]',
+                 pickle_filename, pickle_filename)
+    os.rename(pickle_filename, pickle_filename + '.old')
@@ -2,9 +2,14 @@
 # -*- coding: utf-8 -*-
 
 # This module contains generic functions, ideally useful to any other module
-from six.moves.urllib.request import urlopen, Request
 from six.moves import html_parser
 
+try:
+    from html import unescape as unescape_html
+except ImportError:  # Python 2
+    unescape_html = html_parser.HTMLParser().unescape
+
+import codecs
 import errno
 import json
 import logging
@@ -12,6 +17,15 @@ import os
 import string
 import subprocess
 
+from requests.exceptions import HTTPError
+
+from .common import DEFAULT_PAGE_CHUNK_SIZE
+from .metrics import count_bytes, request_kind
+from .progress import count_received
+from .rate_limit import wait_for_body
+from .retry import retry_call
+from .transport import get_session
+
 
 def get_filename_from_prefix(target_dir, filename_prefix):
     """
@@ -29,17 +43,39 @@ def get_filename_from_prefix(target_dir, filename_prefix):
     return None
 
 
-def execute_command(cmd, args):
+def execute_command(cmd, args, output_callback=None):
     """
-    Creates a process with the given command cmd.
+    Creates a process with the given command cmd. If output_callback is
+    given, it's called with each line of the standard output of the process
+    instead of letting it be printed.
+
+    Returns False if the command failed and the error was ignored.
     """
     try:
-        subprocess.check_call(cmd)
+        if output_callback is None:
+            subprocess.check_call(cmd)
+        else:
+            _check_call_with_output(cmd, output_callback)
     except subprocess.CalledProcessError as e:
         if args.ignore_errors:
             logging.warn('External command error ignored: %s', e)
+            return False
         else:
             raise e
+    return True
+
+
+def _check_call_with_output(cmd, output_callback):
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                               universal_newlines=True)
+    try:
+        for line in iter(process.stdout.readline, ''):
+            output_callback(line)
+    finally:
+        process.stdout.close()
+        retcode = process.wait()
+    if retcode:
+        raise subprocess.CalledProcessError(retcode, cmd)
 
 
 def directory_name(initial_name):
@@ -50,18 +86,79 @@ def directory_name(initial_name):
     return result if result != "" else "course_folder"
 
 
+def get_content_charset(content_type, default='utf-8'):
+    """
+    Returns the charset given in the value of a Content-Type header or
+    default if there is none.
+    """
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset' and value.strip(' \'"'):
+            return value.strip(' \'"')
+    return default
+
+
+def get_page_response(url, headers, stream=False):
+    """
+    Get the response for the page at the URL given by url, raising an
+    exception for error statuses. While making the request, we use the
+    headers given in the dictionary in headers. If stream is True, the body
+    is not read until it is requested.
+
+    Requests failed because of transient errors are retried as told by the
+    retry policy of the run.
+    """
+    return retry_call(url, _get_page_response, url, headers, stream)
+
+
+def _get_page_response(url, headers, stream):
+    result = get_session().get(url, headers=headers, stream=stream)
+    try:
+        result.raise_for_status()
+    except HTTPError:
+        # Give the connection back to the pool before retrying
+        result.close()
+        raise
+    return result
+
+
+def get_response_text(result):
+    """
+    Decode the body of the response result as given by its charset.
+    """
+    charset = get_content_charset(result.headers.get('Content-Type', ''))
+    return result.content.decode(charset)
+
+
+def iter_response_text(result, chunk_size=DEFAULT_PAGE_CHUNK_SIZE):
+    """
+    Generator of the body of the response result decoded as given by its
+    charset, in pieces of at most chunk_size bytes, as they are received.
+    """
+    charset = get_content_charset(result.headers.get('Content-Type', ''))
+    decoder = codecs.getincrementaldecoder(charset)()
+    received = 0
+    try:
+        for chunk in result.iter_content(chunk_size):
+            received += len(chunk)
+            wait_for_body(result, len(chunk))
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+    finally:
+        result.close()
+        count_bytes(received)
+
+
 def get_page_contents(url, headers):
     """
     Get the contents of the page at the URL given by url. While making the
     request, we use the headers given in the dictionary in headers.
     """
-    result = urlopen(Request(url, None, headers))
-    try:
-        # for python3
-        charset = result.headers.get_content_charset(failobj="utf-8")
-    except:
-        charset = result.info().getparam('charset') or 'utf-8'
-    return result.read().decode(charset)
+    return get_response_text(get_page_response(url, headers))
 
 
 def get_page_contents_as_json(url, headers):
@@ -69,11 +166,39 @@ def get_page_contents_as_json(url, headers):
     Makes a request to the url and immediately parses the result asuming it is
     formatted as json
     """
-    json_string = get_page_contents(url, headers)
+    with request_kind('json'):
+        json_string = get_page_contents(url, headers)
     json_object = json.loads(json_string)
     return json_object
 
 
+def write_response_to_file(response, fp, chunk_size, decode_content=True):
+    """
+    Streams the body of the (requests) response into the file object fp in
+    chunks of at most chunk_size bytes, so that only one chunk is held in
+    memory at a time. If decode_content is False, the body is written as
+    sent by the server (e.g., without undoing gzip transfer compression).
+
+    Returns the number of bytes written.
+    """
+    if decode_content:
+        chunks = response.iter_content(chunk_size)
+    else:
+        chunks = response.raw.stream(chunk_size, decode_content=False)
+
+    written = 0
+    try:
+        for chunk in chunks:
+            if chunk:
+                fp.write(chunk)
+                written += len(chunk)
+                count_received(len(chunk))
+                wait_for_body(response, len(chunk))
+    finally:
+        count_bytes(written)
+    return written
+
+
 def remove_duplicates(orig_list, seen=set()):
     """
     Returns a new list based on orig_list with elements from the (optional)
@@ -119,8 +244,7 @@ def clean_filename(s, minimal_change=False):
     """
 
     # First, deal with URL encoded strings
-    h = html_parser.HTMLParser()
-    s = h.unescape(s)
+    s = unescape_html(s)
 
     # strip paren portions which contain trailing time length (...)
     s = (
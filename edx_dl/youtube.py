@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+In-process downloads of YouTube videos with youtube_dl
+
+Instead of starting a youtube-dl process for each video, which pays for
+the start of the interpreter and the initialization of the extractors every
+time, the videos are downloaded with a small pool of YoutubeDL instances
+reused between videos, one for each video downloaded at the same time
+(since they can't be shared between threads).
+
+The videos are downloaded as with the youtube-dl command: the same format,
+subtitles, output template and defaults of the command (taken from its own
+option parser). The extra options of --youtube-dl-options are only
+understood by the command, so edx-dl keeps running it when they are given,
+as it does when youtube_dl can't be imported.
+"""
+
+import logging
+import threading
+
+from six.moves import queue
+
+from .progress import current_transfer, get_progress
+
+
+def _import_youtube_dl():
+    """
+    Returns the youtube_dl module, or None if it isn't installed. It is
+    imported on first use, since importing it takes a while.
+    """
+    try:
+        import youtube_dl
+    except ImportError:
+        return None
+    return youtube_dl
+
+
+def is_youtube_dl_available():
+    """
+    Returns True if youtube_dl can be used in-process.
+    """
+    return _import_youtube_dl() is not None
+
+
+# Parameters of YoutubeDL given by the options of the youtube-dl command
+# which apply to the downloads of edx-dl, as they are mapped by
+# youtube_dl._real_main: (parameter, option)
+_PARAMS_FROM_OPTIONS = [
+    ('format', 'format'),
+    ('retries', 'retries'),
+    ('fragment_retries', 'fragment_retries'),
+    ('skip_unavailable_fragments', 'skip_unavailable_fragments'),
+    ('keep_fragments', 'keep_fragments'),
+    ('buffersize', 'buffersize'),
+    ('noresizebuffer', 'noresizebuffer'),
+    ('http_chunk_size', 'http_chunk_size'),
+    ('continuedl', 'continue_dl'),
+    ('nopart', 'nopart'),
+    ('nooverwrites', 'nooverwrites'),
+    ('updatetime', 'updatetime'),
+    ('restrictfilenames', 'restrictfilenames'),
+    ('writesubtitles', 'writesubtitles'),
+    ('writeautomaticsub', 'writeautomaticsub'),
+    ('allsubtitles', 'allsubtitles'),
+    ('subtitlesformat', 'subtitlesformat'),
+    ('subtitleslangs', 'subtitleslangs'),
+    ('socket_timeout', 'socket_timeout'),
+    ('youtube_include_dash_manifest', 'youtube_include_dash_manifest'),
+    ('hls_prefer_native', 'hls_prefer_native'),
+    ('prefer_ffmpeg', 'prefer_ffmpeg'),
+    ('fixup', 'fixup'),
+    ('cachedir', 'cachedir'),
+    ('call_home', 'call_home'),
+    ('geo_bypass', 'geo_bypass'),
+]
+
+
+def _parse_retries(retries):
+    if retries in ('inf', 'infinite'):
+        return float('inf')
+    return int(retries)
+
+
+def get_youtube_dl_params(youtube_dl, video_format, subtitles=False):
+    """
+    Returns the parameters of YoutubeDL equivalent to the youtube-dl command
+    run with -f video_format (and --all-subs if subtitles), including the
+    defaults of the command (e.g., 10 retries), which YoutubeDL doesn't
+    have.
+    """
+    argv = ['--ignore-config', '-f', video_format]
+    if subtitles:
+        argv.append('--all-subs')
+    _, opts, _ = youtube_dl.parseOpts(argv)
+
+    if opts.allsubtitles and not opts.writeautomaticsub:
+        opts.writesubtitles = True
+    if opts.retries is not None:
+        opts.retries = _parse_retries(opts.retries)
+    if opts.fragment_retries is not None:
+        opts.fragment_retries = _parse_retries(opts.fragment_retries)
+    if opts.buffersize is not None:
+        opts.buffersize = youtube_dl.FileDownloader.parse_bytes(
+            opts.buffersize)
+    if opts.http_chunk_size is not None:
+        opts.http_chunk_size = youtube_dl.FileDownloader.parse_bytes(
+            opts.http_chunk_size)
+
+    return dict((param, getattr(opts, option))
+                for param, option in _PARAMS_FROM_OPTIONS)
+
+
+class _Logger(object):
+    """
+    Logger given to YoutubeDL, sending its messages to the logging system
+    instead of stdout.
+    """
+
+    def debug(self, message):
+        if message.startswith('[debug] '):
+            logging.debug(message)
+        else:
+            logging.info(message)
+
+    def warning(self, message):
+        logging.warn(message)
+
+    def error(self, message):
+        logging.error(message)
+
+
+def _progress_hook(status):
+    """
+    Updates the transfer of the calling thread with the progress reported
+    by YoutubeDL.
+    """
+    transfer = current_transfer()
+    progress = get_progress()
+    if transfer is None or progress is None:
+        return
+    received = status.get('downloaded_bytes')
+    size = status.get('total_bytes') or status.get('total_bytes_estimate')
+    if size:
+        progress.set_size(transfer, int(size))
+    if received is not None:
+        progress.set_received(transfer, int(received))
+
+
+class YoutubeDownloader(object):
+    """
+    Downloads YouTube videos with up to max_instances YoutubeDL instances
+    at the same time, created as needed and reused. video_format and
+    subtitles are the equivalents of the -f and --all-subs options of
+    youtube-dl.
+
+    Usage:
+
+      >>> downloader = YoutubeDownloader('mp4', subtitles=True)
+      >>> downloader.download(url, output_template)
+    """
+
+    def __init__(self, video_format, subtitles=False, max_instances=1):
+        self.youtube_dl = _import_youtube_dl()
+        self.params = get_youtube_dl_params(self.youtube_dl, video_format, subtitles)
+        self.params.update({
+            'logger': _Logger(),
+            # The progress is reported by the progress hook
+            'noprogress': True,
+        })
+        self.max_instances = max(1, max_instances)
+        self._instances = queue.Queue()
+        self._num_instances = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._instances.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._num_instances < self.max_instances
+            if create:
+                self._num_instances += 1
+        if not create:
+            return self._instances.get()
+        ydl = self.youtube_dl.YoutubeDL(dict(self.params))
+        ydl.add_progress_hook(_progress_hook)
+        return ydl
+
+    def download(self, url, output_template, rate_limit=None,
+                 ignore_errors=False):
+        """
+        Downloads the video of url to output_template (as given to -o),
+        receiving at most rate_limit bytes per second if given. Errors are
+        logged instead of raised if ignore_errors, and False is returned.
+        """
+        ydl = self._acquire()
+        try:
+            ydl.params['outtmpl'] = output_template
+            ydl.params['ratelimit'] = rate_limit
+            ydl.download([url])
+        except self.youtube_dl.utils.DownloadError as e:
+            if not ignore_errors:
+                raise
+            logging.warn('youtube-dl error ignored: %s', e)
+            return False
+        finally:
+            self._instances.put(ydl)
+        return True
+
+
+_downloader = None
+
+
+def get_youtube_downloader():
+    """
+    Returns the in-process downloader of the run, or None if youtube-dl is
+    run as a command.
+    """
+    return _downloader
+
+
+def set_youtube_downloader(downloader):
+    """
+    Sets the in-process downloader of the run, None to run youtube-dl as a
+    command.
+    """
+    global _downloader
+    _downloader = downloader
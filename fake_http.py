@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fake responses of requests shared by the tests
+"""
+
+
+class FakeRaw(object):
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, chunk_size, decode_content=True):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+class FakeResponse(object):
+    """
+    Response with the given body, status and headers, which records the
+    chunk sizes its body is read with and whether it was closed.
+    """
+    def __init__(self, body=b'', status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = body
+        self.raw = FakeRaw(body)
+        self.chunk_sizes = []
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        self.chunk_sizes.append(chunk_size)
+        return self.raw.stream(chunk_size)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(self.status_code)
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+
+import pytest
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 6),
+                                reason='asyncio extraction needs Python 3.6+')
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = ('<html>%s</html>' % self.path).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = HTTPServer(('127.0.0.1', 0), PageHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:%d' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def parse(url, page, file_formats):
+    return [page]
+
+
+@pytest.mark.parametrize('use_aiohttp', [True, False])
+def test_extract_all_units(server_url, use_aiohttp, monkeypatch):
+    from edx_dl import async_extraction
+
+    if not use_aiohttp:
+        monkeypatch.setattr(async_extraction, 'aiohttp', None)
+    elif async_extraction.aiohttp is None:
+        pytest.skip('aiohttp is not installed')
+
+    urls = ['%s/subsection/%d' % (server_url, i) for i in range(20)]
+    all_units = async_extraction.extract_all_units(urls, {}, [], parse,
+                                                   concurrency=4)
+
+    assert list(all_units.keys()) == urls
+    for i, url in enumerate(urls):
+        assert all_units[url] == ['<html>/subsection/%d</html>' % i]
+
+
+def test_pages_are_parsed_outside_the_event_loop(server_url):
+    from edx_dl import async_extraction
+
+    threads = set()
+
+    def recording_parse(url, page, file_formats):
+        threads.add(threading.current_thread())
+        return [page]
+
+    urls = ['%s/subsection/%d' % (server_url, i) for i in range(4)]
+    async_extraction.extract_all_units(urls, {}, [], recording_parse)
+
+    assert threads
+    assert threading.current_thread() not in threads
+
+
+def test_requests_in_flight_are_not_limited_by_the_default_executor(monkeypatch):
+    from edx_dl import async_extraction
+
+    monkeypatch.setattr(async_extraction, 'aiohttp', None)
+    # More than the threads of the default executor, min(32, cpus + 4)
+    concurrency = max(33, (os.cpu_count() or 1) + 5)
+    barrier = threading.Barrier(concurrency, timeout=10)
+
+    def fetch(url, headers):
+        barrier.wait()
+        return 200, {}, url
+    monkeypatch.setattr(async_extraction, '_fetch_with_requests', fetch)
+
+    urls = ['https://a.org/%d' % i for i in range(concurrency)]
+    all_units = async_extraction.extract_all_units(urls, {}, [], parse,
+                                                   concurrency=concurrency)
+    assert all_units == {url: [url] for url in urls}
+
+
+def test_extract_all_units_error(server_url):
+    from edx_dl import async_extraction
+
+    def failing_parse(url, page, file_formats):
+        raise ValueError(url)
+
+    with pytest.raises(ValueError):
+        async_extraction.extract_all_units([server_url + '/a'], {}, [],
+                                           failing_parse)
@@ -1,17 +1,84 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
+import os
+import sys
+import threading
+
 import pytest
 from edx_dl import edx_dl, parsing
-from edx_dl.common import Unit, Video, DEFAULT_FILE_FORMATS
+from fake_http import FakeResponse
+from edx_dl.common import (
+    Course,
+    Section,
+    SubSection,
+    Unit,
+    Video,
+    DEFAULT_FILE_FORMATS,
+)
+
+
+@pytest.fixture
+def edx_server(monkeypatch):
+    from benchmarks.edx_server import EdXServer
+
+    with EdXServer(video_size=100 * 1024, resource_size=1024) as server:
+        monkeypatch.setattr(edx_dl, 'EDX_HOMEPAGE',
+                            server.url + '/user_api/v1/account/login_session')
+        yield server
 
 
-def test_failed_login():
+def test_failed_login(edx_server):
     resp = edx_dl.edx_login(
-        edx_dl.LOGIN_API, edx_dl.edx_get_headers(), "guest", "guest")
+        edx_server.url + '/login_ajax', edx_dl.edx_get_headers(),
+        "guest", "guest")
     assert not resp.get('success', False)
 
 
+def test_login(edx_server):
+    resp = edx_dl.edx_login(
+        edx_server.url + '/login_ajax', edx_dl.edx_get_headers(),
+        edx_server.username, edx_server.password)
+    assert resp.get('success', False)
+
+
+def test_main_downloads_course(edx_server, tmpdir, monkeypatch):
+    from benchmarks.edx_server import run_edx_dl
+
+    monkeypatch.chdir(str(tmpdir))
+    exit_code = run_edx_dl(edx_server, ['--quiet', '--prefer-cdn-videos',
+                                        '--with-subtitles',
+                                        edx_server.course_url(1)])
+    assert exit_code == 0
+
+    downloaded = []
+    for root, _, names in os.walk(os.path.join(str(tmpdir), 'Downloaded')):
+        downloaded += [os.path.join(root, name) for name in names]
+    videos = [f for f in downloaded if f.endswith('.mp4')]
+    subtitles = [f for f in downloaded if f.endswith('.srt')]
+    assert len(videos) > 0 and len(subtitles) > 0
+    assert all(os.path.getsize(f) == edx_server.video_size for f in videos)
+    assert not [f for f in downloaded if f.endswith('.part')]
+
+
+def test_main_reports_progress(edx_server, tmpdir, monkeypatch, capsys):
+    from benchmarks.edx_server import run_edx_dl
+
+    monkeypatch.chdir(str(tmpdir))
+    exit_code = run_edx_dl(edx_server, ['--quiet', '--prefer-cdn-videos',
+                                        edx_server.course_url(1)])
+    assert exit_code == 0
+
+    downloaded = sum(len(names) for _, _, names in
+                     os.walk(os.path.join(str(tmpdir), 'Downloaded')))
+    lines = capsys.readouterr().err.splitlines()
+    assert len(lines) == 1
+    assert lines[0].startswith('Progress: %d/%d files, ' % (downloaded,
+                                                            downloaded))
+    assert ', done in ' in lines[0]
+
+
 def test_remove_repeated_urls():
     url = "test/html/multiple_units.html"
     site = 'https://courses.edx.org'
@@ -149,3 +216,353 @@ def test_extract_subtitle_urls():
     actual = page_extractor.extract_subtitle_urls(text, "https://base.url")
     print("actual", actual)
     assert expected == actual
+
+
+class FakeServer(object):
+    """
+    Serves body honoring Range/If-Range like a real HTTP server would.
+    """
+    def __init__(self, body, etag='"v1"', ranges=True):
+        self.body = body
+        self.etag = etag
+        self.ranges = ranges
+        self.requests = []
+
+    def head(self, url, headers=None, allow_redirects=False):
+        return FakeResponse(b'', 200, {
+            'ETag': self.etag,
+            'Content-Length': str(len(self.body)),
+            'Accept-Ranges': 'bytes' if self.ranges else 'none',
+        })
+
+    def get(self, url, headers=None, stream=False):
+        self.requests.append(dict(headers or {}))
+        headers = headers or {}
+        response_headers = {'ETag': self.etag}
+        range_ = headers.get('Range')
+        if range_ is None or not self.ranges or \
+           headers.get('If-Range', self.etag) != self.etag:
+            return FakeResponse(self.body, 200, response_headers)
+        start, end = range_[len('bytes='):].split('-')
+        start = int(start)
+        end = int(end) if end else len(self.body) - 1
+        if start >= len(self.body):
+            response_headers['Content-Range'] = 'bytes */%d' % len(self.body)
+            return FakeResponse(b'', 416, response_headers)
+        response_headers['Content-Range'] = 'bytes %d-%d/%d' % (
+            start, end, len(self.body))
+        return FakeResponse(self.body[start:end + 1], 206, response_headers)
+
+
+def _write_partial(filename, data, validator):
+    with open(filename + '.part', 'wb') as f:
+        f.write(data)
+    with open(filename + '.part.validator', 'w') as f:
+        f.write(validator)
+
+
+def test_download_file_fresh(tmpdir):
+    server = FakeServer(b'abcdefghij')
+    filename = str(tmpdir.join('video.mp4'))
+
+    edx_dl.download_file('http://cdn/video.mp4', filename, {}, 3,
+                         get=server.get)
+
+    assert open(filename, 'rb').read() == b'abcdefghij'
+    assert 'Range' not in server.requests[0]
+    assert sorted(tmpdir.listdir()) == [tmpdir.join('video.mp4')]
+
+
+def test_download_file_resumes_partial(tmpdir):
+    server = FakeServer(b'abcdefghij')
+    filename = str(tmpdir.join('video.mp4'))
+    _write_partial(filename, b'abcd', '"v1"')
+
+    edx_dl.download_file('http://cdn/video.mp4', filename, {}, 3,
+                         get=server.get)
+
+    assert open(filename, 'rb').read() == b'abcdefghij'
+    assert server.requests[0]['Range'] == 'bytes=4-'
+    assert server.requests[0]['If-Range'] == '"v1"'
+    assert sorted(tmpdir.listdir()) == [tmpdir.join('video.mp4')]
+
+
+def test_download_file_restarts_if_file_changed(tmpdir):
+    server = FakeServer(b'ABCDEFGHIJ', etag='"v2"')
+    filename = str(tmpdir.join('video.mp4'))
+    _write_partial(filename, b'abcd', '"v1"')
+
+    edx_dl.download_file('http://cdn/video.mp4', filename, {}, 3,
+                         get=server.get)
+
+    assert open(filename, 'rb').read() == b'ABCDEFGHIJ'
+
+
+def test_download_file_complete_partial(tmpdir):
+    server = FakeServer(b'abcdefghij')
+    filename = str(tmpdir.join('video.mp4'))
+    _write_partial(filename, b'abcdefghij', '"v1"')
+
+    edx_dl.download_file('http://cdn/video.mp4', filename, {}, 3,
+                         get=server.get)
+
+    assert open(filename, 'rb').read() == b'abcdefghij'
+    assert len(server.requests) == 1
+
+
+def test_download_file_error_keeps_no_file(tmpdir):
+    filename = str(tmpdir.join('video.mp4'))
+
+    with pytest.raises(IOError):
+        edx_dl.download_file('http://cdn/video.mp4', filename, {}, 3,
+                             get=lambda url, **kw: FakeResponse(status_code=404))
+
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_download_file_segmented(tmpdir, ranges):
+    body = b''.join(b'%04d' % i for i in range(1000))
+    server = FakeServer(body, ranges=ranges)
+    filename = str(tmpdir.join('video.mp4'))
+
+    edx_dl.download_file_segmented('http://cdn/video.mp4', filename, {}, 64,
+                                   num_segments=3, min_size=100,
+                                   get=server.get, head=server.head)
+
+    assert open(filename, 'rb').read() == body
+    assert sorted(tmpdir.listdir()) == [tmpdir.join('video.mp4')]
+    if ranges:
+        assert sorted(r['Range'] for r in server.requests) == \
+            ['bytes=0-1333', 'bytes=1334-2667', 'bytes=2668-3999']
+        assert all(r['If-Range'] == '"v1"' for r in server.requests)
+
+
+def test_download_file_segmented_small_file(tmpdir):
+    server = FakeServer(b'abcdefghij')
+    filename = str(tmpdir.join('video.mp4'))
+
+    edx_dl.download_file_segmented('http://cdn/video.mp4', filename, {}, 64,
+                                   num_segments=3, min_size=100,
+                                   get=server.get, head=server.head)
+
+    assert open(filename, 'rb').read() == b'abcdefghij'
+    assert len(server.requests) == 1
+    assert 'Range' not in server.requests[0]
+
+
+def test_download_file_segmented_ranges_ignored(tmpdir):
+    body = b'x' * 1000
+    server = FakeServer(body, ranges=False)
+    server.head = FakeServer(body).head  # lies about supporting ranges
+    filename = str(tmpdir.join('video.mp4'))
+
+    edx_dl.download_file_segmented('http://cdn/video.mp4', filename, {}, 64,
+                                   num_segments=4, min_size=100,
+                                   get=server.get, head=server.head)
+
+    assert open(filename, 'rb').read() == body
+    assert sorted(tmpdir.listdir()) == [tmpdir.join('video.mp4')]
+
+
+def test_extract_units_from_page_in_pool():
+    url = 'https://courses.edx.org/courses/x/courseware/a/b/'
+    with open('test/html/multiple_units.html', 'r') as f:
+        page = f.read()
+
+    pool = edx_dl.create_process_pool(1)
+    try:
+        units = edx_dl._extract_units_from_page_in_pool(
+            pool, url, page, DEFAULT_FILE_FORMATS)
+    finally:
+        pool.close()
+        pool.join()
+
+    expected = edx_dl.extract_units_from_page(url, page, DEFAULT_FILE_FORMATS)
+    assert [unit.to_dict() for unit in units] == \
+        [unit.to_dict() for unit in expected]
+    assert len(units) > 0
+
+
+_held_lock = threading.Lock()
+
+
+def _try_held_lock():
+    acquired = _held_lock.acquire(timeout=1)
+    if acquired:
+        _held_lock.release()
+    return acquired
+
+
+@pytest.mark.skipif(sys.version_info < (3, 4),
+                    reason='Python 2 can only fork the processes')
+def test_process_pool_with_a_thread_holding_a_lock():
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with _held_lock:
+            held.set()
+            release.wait()
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    try:
+        pool = edx_dl.create_process_pool(1)
+        try:
+            # A forked child would have a copy of the lock, held forever
+            assert pool.apply_async(_try_held_lock).get(timeout=60)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        release.set()
+        thread.join()
+
+
+class PipelineArgs(object):
+    download_workers = 1
+    downloads_per_host = 1
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+
+def _pipeline_downloads(tmpdir, monkeypatch, order):
+    """
+    Returns the (target_dir, filename_prefix, resources_urls) downloaded by a
+    DownloadPipeline when the units of the subsections are added in order.
+    """
+    downloads = []
+    monkeypatch.setattr(edx_dl, 'download_unit',
+                        lambda unit, args, target_dir, filename_prefix, headers, scheduler:
+                        downloads.append((os.path.basename(target_dir),
+                                          filename_prefix,
+                                          unit.resources_urls)))
+    course = Course(id='c', name='Course', url='u', state='Started')
+    sections = [Section(position=1, name='One', url='s1',
+                        subsections=[SubSection(1, 'a', 'a'),
+                                     SubSection(2, 'b', 'b')]),
+                Section(position=2, name='Two', url='s2',
+                        subsections=[SubSection(1, 'c', 'c')])]
+    all_units = {
+        'a': [Unit(videos=[], resources_urls=['http://x/1.pdf'])],
+        'b': [Unit(videos=[], resources_urls=['http://x/2.pdf']),
+              Unit(videos=[], resources_urls=['http://x/1.pdf'])],
+        'c': [Unit(videos=[], resources_urls=['http://x/2.pdf', 'http://x/3.pdf'])],
+    }
+
+    pipeline = edx_dl.DownloadPipeline(PipelineArgs(str(tmpdir)),
+                                       {course: sections}, {})
+    for url in order:
+        pipeline.add(url, all_units[url])
+    pipeline.join()
+    return downloads, pipeline
+
+
+@pytest.mark.parametrize('order', [
+    ['a', 'b', 'c'], ['c', 'b', 'a'], ['b', 'a', 'c'], ['c', 'a', 'b'],
+])
+def test_download_pipeline_is_independent_of_extraction_order(tmpdir, monkeypatch, order):
+    downloads, pipeline = _pipeline_downloads(tmpdir, monkeypatch, order)
+    assert downloads == [
+        ('01-One', '01', ['http://x/1.pdf']),
+        ('01-One', '02', ['http://x/2.pdf']),
+        ('02-Two', '01', ['http://x/3.pdf']),
+    ]
+    assert pipeline.num_urls == 5
+    assert pipeline.num_filtered_urls == 3
+
+
+def test_download_pipeline_waits_for_previous_subsections(tmpdir, monkeypatch):
+    downloads, _ = _pipeline_downloads(tmpdir, monkeypatch, ['b', 'c'])
+    assert downloads == []
+    downloads, _ = _pipeline_downloads(tmpdir, monkeypatch, ['a', 'c'])
+    assert downloads == [('01-One', '01', ['http://x/1.pdf'])]
+
+
+def test_main_writes_profile(edx_server, tmpdir, monkeypatch):
+    from benchmarks.edx_server import run_edx_dl
+
+    monkeypatch.chdir(str(tmpdir))
+    exit_code = run_edx_dl(edx_server, ['--quiet', '--prefer-cdn-videos',
+                                        '--profile-output', 'profile.txt',
+                                        edx_server.course_url(1)])
+    assert exit_code == 0
+
+    with open(str(tmpdir.join('profile.txt'))) as f:
+        summary = f.read()
+    for stage in ['login/csrf token', 'login/login', 'courses',
+                  'sections/course', 'extraction/page', 'downloads/file',
+                  'downloads']:
+        assert '\n%s ' % stage in summary
+
+
+def test_main_writes_metrics(edx_server, tmpdir, monkeypatch):
+    from benchmarks.edx_server import run_edx_dl
+
+    monkeypatch.chdir(str(tmpdir))
+    options = ['--quiet', '--prefer-cdn-videos', '--with-subtitles',
+               '--cache', '--metrics-json', 'metrics.json',
+               edx_server.course_url(1)]
+    assert run_edx_dl(edx_server, options) == 0
+    assert run_edx_dl(edx_server, options) == 0
+
+    with open(str(tmpdir.join('metrics.json'))) as f:
+        data = json.load(f)
+    assert data['unit_cache'] == {'hit': 4, 'miss': 0}
+    assert data['downloads']['skipped'] > 0
+    assert data['downloads']['downloaded'] == 0
+    assert 'json' in data['requests']
+
+
+class RecordingScheduler(object):
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, url, func, *args):
+        self.jobs.append((url, func, args))
+
+
+class UnitArgs(object):
+    prefer_cdn_videos = True
+    dry_run = False
+
+    def __init__(self, subtitles):
+        self.subtitles = subtitles
+
+
+@pytest.mark.parametrize('subtitles', [True, False])
+def test_download_unit_resources_after_videos(tmpdir, monkeypatch, subtitles):
+    downloads = []
+    monkeypatch.setattr(
+        edx_dl, 'download_video',
+        lambda video, args, target_dir, prefix, headers:
+        downloads.append((prefix, video.mp4_urls)))
+    monkeypatch.setattr(
+        edx_dl, 'skip_or_download',
+        lambda res_downloads, headers, args:
+        downloads.append(sorted(res_downloads.values())))
+
+    unit = Unit(videos=[Video(video_youtube_url=None,
+                              available_subs_url=None,
+                              sub_template_url='http://x/subs',
+                              mp4_urls=['http://x/v.mp4'])],
+                resources_urls=['http://x/slides.pdf', 'http://x/notes.pdf'])
+    scheduler = RecordingScheduler()
+    edx_dl.download_unit(unit, UnitArgs(subtitles), str(tmpdir), '01', {},
+                         scheduler)
+    for _, func, args in scheduler.jobs:
+        func(*args)
+
+    resources = [os.path.join(str(tmpdir), '01-notes.pdf'),
+                 os.path.join(str(tmpdir), '01-slides.pdf')]
+    if subtitles:
+        # The resources would be found instead of the video while the name
+        # of its subtitles is looked for
+        assert len(scheduler.jobs) == 1
+        assert downloads == [('01', ['http://x/v.mp4']), resources]
+    else:
+        assert len(scheduler.jobs) == 3
+        assert downloads[0] == ('01', ['http://x/v.mp4'])
+        assert sorted(downloads[1:]) == [[resources[0]], [resources[1]]]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+import requests
+
+from edx_dl.limiter import (
+    AdaptiveLimiter,
+    is_congestion_error,
+    load_limits,
+    save_limit,
+)
+
+
+def _http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_is_congestion_error():
+    assert is_congestion_error(_http_error(429))
+    assert is_congestion_error(_http_error(502))
+    assert is_congestion_error(requests.exceptions.ConnectionError())
+    assert not is_congestion_error(_http_error(404))
+    assert not is_congestion_error(ValueError())
+
+
+def test_limiter_increases_additively():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+    for _ in range(2):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 3
+
+    for _ in range(20):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 4
+
+
+def test_limiter_decreases_multiplicatively_once_per_event():
+    limiter = AdaptiveLimiter(initial_limit=16, max_limit=64)
+    started = [limiter.acquire() for _ in range(4)]
+    for start in started:
+        limiter.release(start, congested=True)
+    assert limiter.limit == 8
+
+    limiter.release(limiter.acquire(), congested=True)
+    assert limiter.limit == 4
+
+
+def test_limiter_decreases_on_latency_spike():
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=64)
+    start = limiter.acquire()
+    limiter.release(start)
+    limit = limiter.limit
+    limiter.release(limiter.acquire() - 10)
+    assert limiter.limit == limit // 2
+
+
+def test_limiter_ignores_jitter_of_fast_requests():
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=64)
+    limiter.release(limiter.acquire())
+    limiter._mean_latency = 0.001
+    limiter.release(limiter.acquire() - 0.01)
+    assert limiter.limit == 8
+
+
+def test_limiter_run_records_congestion():
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=64)
+
+    def fail():
+        raise _http_error(503)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        limiter.run(fail)
+    assert limiter.limit == 4
+    assert limiter.run(lambda x: x + 1, 1) == 2
+
+
+def test_save_and_load_limits(tmpdir):
+    filename = str(tmpdir.join('edx-dl.limits'))
+    assert load_limits(filename) == {}
+
+    save_limit(filename, 'edx', 12)
+    save_limit(filename, 'fun', 5)
+    assert load_limits(filename) == {'edx': 12, 'fun': 5}
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+import pytest
+import requests
+
+from edx_dl import metrics
+from edx_dl.metrics import (
+    Histogram,
+    Metrics,
+    MetricsWriter,
+    get_request_kind,
+    request_kind,
+)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram([0.1, 1.0])
+    for value in [0.05, 0.5, 0.5, 5]:
+        histogram.observe(value)
+
+    assert histogram.to_dict() == {
+        'count': 4,
+        'sum': 6.05,
+        'buckets': {'0.1': 1, '1.0': 3, '+Inf': 4},
+    }
+
+
+def test_errors_are_counted_by_host():
+    m = Metrics()
+    m.observe_request('page', 'https://a.org/1', 0.1, status=200)
+    m.observe_request('page', 'https://a.org/2', 0.1, status=503)
+    m.observe_request('file', 'https://b.org/x.mp4', 0.1,
+                      reason='ConnectionError')
+    m.observe_request('file', 'https://b.org/y.mp4', 0.1,
+                      reason='ConnectionError')
+    m.count_retry('https://b.org/y.mp4')
+
+    data = m.to_dict()
+    assert data['requests']['page']['count'] == 2
+    assert data['requests']['file']['count'] == 2
+    assert data['errors'] == {'a.org': {'503': 1},
+                              'b.org': {'ConnectionError': 2}}
+    assert data['retries'] == {'b.org': 1}
+
+
+def test_to_prometheus():
+    m = Metrics()
+    m.observe_request('page', 'https://a.org/1', 0.02, status=404)
+    m.count_bytes('page', 100)
+    m.count_unit_cache(hits=3, misses=1)
+    m.count_download('skipped')
+
+    lines = m.to_prometheus().splitlines()
+    assert '# TYPE edx_dl_request_duration_seconds histogram' in lines
+    assert 'edx_dl_request_duration_seconds_bucket{kind="page",le="0.01"} 0' \
+        in lines
+    assert 'edx_dl_request_duration_seconds_bucket{kind="page",le="0.025"} 1' \
+        in lines
+    assert 'edx_dl_request_duration_seconds_bucket{kind="page",le="+Inf"} 1' \
+        in lines
+    assert 'edx_dl_request_duration_seconds_count{kind="page"} 1' in lines
+    assert 'edx_dl_transferred_bytes_total{kind="page"} 100' in lines
+    assert 'edx_dl_unit_cache_lookups_total{result="hit"} 3' in lines
+    assert 'edx_dl_files_total{result="skipped"} 1' in lines
+    assert 'edx_dl_request_errors_total{host="a.org",reason="404"} 1' \
+        in lines
+
+
+def test_label_values_are_escaped():
+    m = Metrics()
+    m.count_bytes('a"b\\c', 1)
+    assert 'edx_dl_transferred_bytes_total{kind="a\\"b\\\\c"} 1' in \
+        m.to_prometheus().splitlines()
+
+
+def test_request_kind_of_outer_block_wins():
+    assert get_request_kind() == 'page'
+    with request_kind('subtitle'):
+        with request_kind('json'):
+            assert get_request_kind() == 'subtitle'
+    with request_kind('json'):
+        assert get_request_kind() == 'json'
+    assert get_request_kind() == 'page'
+
+
+def test_module_functions_are_disabled_by_default():
+    assert metrics.get_metrics() is None
+    metrics.count_bytes(10)
+    metrics.count_download('downloaded')
+    metrics.count_retry('https://a.org')
+
+
+def test_watch_session():
+    from benchmarks.edx_server import EdXServer
+
+    m = Metrics()
+    session = requests.Session()
+    m.watch_session(session)
+    with EdXServer() as server:
+        session.get(server.url + '/user_api/v1/account/login_session')
+        with request_kind('json'):
+            # not logged in
+            session.get(server.url + '/dashboard')
+    with pytest.raises(requests.ConnectionError):
+        session.get('http://127.0.0.1:1/')
+
+    data = m.to_dict()
+    assert data['requests']['page']['count'] == 2
+    assert data['requests']['json']['count'] == 1
+    assert data['bytes'] == {'page': 2, 'json': len(b'Forbidden')}
+    host = server.url[len('http://'):]
+    assert data['errors'] == {host: {'403': 1},
+                              '127.0.0.1:1': {'ConnectionError': 1}}
+
+
+def test_metrics_writer(tmpdir):
+    json_filename = str(tmpdir.join('metrics.json'))
+    prometheus_filename = str(tmpdir.join('metrics.prom'))
+    m = Metrics()
+    writer = MetricsWriter(m, json_filename, prometheus_filename,
+                           interval=0.01)
+    writer.start()
+    time.sleep(0.1)
+    assert tmpdir.join('metrics.json').check()
+
+    m.count_download('downloaded')
+    writer.stop()
+    with open(json_filename) as f:
+        assert json.load(f)['downloads']['downloaded'] == 1
+    with open(prometheus_filename) as f:
+        assert 'edx_dl_files_total{result="downloaded"} 1\n' in f.read()
+    assert sorted(f.basename for f in tmpdir.listdir()) == [
+        'metrics.json', 'metrics.prom']
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from edx_dl import parsing
+from edx_dl.common import Unit, Video
+from edx_dl.page_cache import PageCache, conditional_headers
+
+
+URL = 'https://courses.edx.org/courses/course-v1:edX+DemoX+2T2015/courseware/1'
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return PageCache(str(tmpdir.join('pages')))
+
+
+def parse(url, page, file_formats):
+    return [Unit(videos=[Video(video_youtube_url=None,
+                               available_subs_url=None,
+                               sub_template_url=None,
+                               mp4_urls=[page + '.mp4'])],
+                 resources_urls=[page + '.' + f for f in file_formats])]
+
+
+def fail_parse(url, page, file_formats):
+    raise AssertionError('the page should not be parsed again')
+
+
+def test_conditional_headers():
+    assert conditional_headers(None) == {}
+    assert conditional_headers({'etag': '"v1"', 'last_modified': None}) == \
+        {'If-None-Match': '"v1"'}
+    assert conditional_headers({'etag': None,
+                                'last_modified': 'Mon, 01 Jan 2018'}) == \
+        {'If-Modified-Since': 'Mon, 01 Jan 2018'}
+
+
+def test_responses_without_validators_are_not_stored(cache):
+    units = cache.resolve(URL, None, 200, {}, 'page', ['pdf'], parse)
+    assert units[0].resources_urls == ['page.pdf']
+    assert cache.lookup(URL) is None
+
+
+def test_not_modified_reuses_units(cache):
+    cache.resolve(URL, None, 200, {'ETag': '"v1"'}, 'page', ['pdf'], parse)
+    entry = cache.lookup(URL)
+    assert conditional_headers(entry) == {'If-None-Match': '"v1"'}
+
+    units = cache.resolve(URL, entry, 304, {}, '', ['pdf'], fail_parse)
+    assert units[0].videos[0].mp4_urls == ['page.mp4']
+    assert units[0].resources_urls == ['page.pdf']
+
+
+def test_not_modified_with_other_file_formats_parses_stored_page(cache):
+    cache.resolve(URL, None, 200, {'ETag': '"v1"'}, 'page', ['pdf'], parse)
+    entry = cache.lookup(URL)
+
+    units = cache.resolve(URL, entry, 304, {}, '', ['zip'], parse)
+    assert units[0].resources_urls == ['page.zip']
+    assert cache.lookup(URL)['etag'] == '"v1"'
+    assert cache.lookup(URL)['file_formats'] == ['zip']
+
+
+def test_modified_page_is_parsed_and_stored(cache):
+    cache.resolve(URL, None, 200, {'ETag': '"v1"'}, 'page', ['pdf'], parse)
+    entry = cache.lookup(URL)
+
+    units = cache.resolve(URL, entry, 200, {'ETag': '"v2"'}, 'new', ['pdf'],
+                          parse)
+    assert units[0].resources_urls == ['new.pdf']
+    assert cache.lookup(URL)['etag'] == '"v2"'
+
+
+def test_not_modified_with_other_extractor_parses_stored_page(cache,
+                                                              monkeypatch):
+    cache.resolve(URL, None, 200, {'ETag': '"v1"'}, 'page', ['pdf'], parse)
+    entry = cache.lookup(URL)
+    monkeypatch.setattr(parsing.PageExtractor, 'VERSION', 2)
+
+    parsed = []
+
+    def counting_parse(url, page, file_formats):
+        parsed.append(page)
+        return parse(url, page, file_formats)
+
+    units = cache.resolve(URL, entry, 304, {}, '', ['pdf'], counting_parse)
+    assert parsed == ['page']
+    assert units[0].resources_urls == ['page.pdf']
@@ -7,16 +7,37 @@ import json
 
 import pytest
 
+from bs4.builder import builder_registry
+
 from edx_dl.common import DEFAULT_FILE_FORMATS
 
 from edx_dl.parsing import (
+    HTML_PARSERS,
+    RE_YOUTUBE_LINK,
+    decode_video_metadata,
     edx_json2srt,
+    find_region,
     ClassicEdXPageExtractor,
     CurrentEdXPageExtractor,
+    NewEdXPageExtractor,
+    get_html_parser,
+    has_class,
     is_youtube_url,
+    iter_units,
+    scan_unit,
+    set_html_parser,
+    split_units,
 )
 
 
+@pytest.fixture(params=[parser for parser in HTML_PARSERS
+                        if builder_registry.lookup(parser) is not None])
+def html_parser(request):
+    set_html_parser(request.param)
+    yield request.param
+    set_html_parser(None)
+
+
 # Test conversion of JSON subtitles to srt
 def test_empty_json_subtitle():
     with open('test/json/empty.json') as f:
@@ -109,7 +130,7 @@ def test_extract_multiple_units_multiple_youtube_videos():
         ('test/html/empty_sections.html', 0, 0)
     ]
 )
-def test_extract_sections(file, num_sections_expected, num_subsections_expected):
+def test_extract_sections(html_parser, file, num_sections_expected, num_subsections_expected):
     site = 'https://courses.edx.org'
     with open(file, "r") as f:
         sections = CurrentEdXPageExtractor().extract_sections_from_html(f.read(), site)
@@ -124,7 +145,7 @@ def test_extract_sections(file, num_sections_expected, num_subsections_expected)
         ('test/html/dashboard-version-with-divs.html', 'https://courses.edx.org', 18, 14),
     ]
 )
-def test_extract_courses_from_html(filename, site, num_courses_expected, num_available_courses_expected):
+def test_extract_courses_from_html(html_parser, filename, site, num_courses_expected, num_available_courses_expected):
     with open(filename, "r") as f:
         courses = CurrentEdXPageExtractor().extract_courses_from_html(f.read(), site)
         assert len(courses) == num_courses_expected
@@ -132,6 +153,68 @@ def test_extract_courses_from_html(filename, site, num_courses_expected, num_ava
         assert len(available_courses) == num_available_courses_expected
 
 
+def test_find_region():
+    selector = ('nav', {'aria-label': 'Course Navigation'})
+    page = ('<nav aria-label="Main"><a href="/">edX</a></nav>'
+            '<NAV class="x" aria-label=\'Course Navigation\'>'
+            '<nav>a</nav><nav/>b</nav><p>c</p>')
+    assert find_region(page, selector) == ('<NAV class="x" aria-label=\'Course Navigation\'>'
+                                           '<nav>a</nav><nav/>b</nav>')
+    assert find_region('<nav aria-label="Course Navigation">a', selector) == \
+        '<nav aria-label="Course Navigation">a'
+    assert find_region('<navigation aria-label="Course Navigation"></navigation>', selector) is None
+    assert find_region('<section class="a menu">x</section>', ('section', {'class': 'menu'})) == \
+        '<section class="a menu">x</section>'
+
+
+def test_decode_video_metadata():
+    metadata = json.dumps({
+        'streams': '0.75:aaaaaaaaaaa,1.00:3atHHNa2UwI',
+        'transcriptAvailableTranslationsUrl': '/t/available_translations',
+        'transcriptTranslationUrl': '/t/translation/__lang__',
+        'sources': ['https://cdn/v.mp4', 'https://cdn/v.webm'],
+        'title': 'Tom & Jerry <1>',
+    })
+    escaped = metadata.replace('&', '&amp;').replace('"', '&#34;').replace('<', '&lt;')
+    decoded = decode_video_metadata(escaped.replace('&', '&amp;'))
+    assert decoded == ('3atHHNa2UwI', '/t/available_translations',
+                       '/t/translation/%s', ('https://cdn/v.mp4',))
+    assert decode_video_metadata(escaped.replace('&', '&amp;')) is decoded
+
+
+def test_extract_sections_from_region():
+    site = 'https://courses.edx.org'
+    selector = ('nav', {'aria-label': 'Course Navigation'})
+    with open('test/html/multiple_units.html', 'r') as f:
+        page = f.read()
+    region = find_region(page, selector)
+    assert len(region) < len(page) // 10
+    extractor = ClassicEdXPageExtractor()
+    sections = extractor.extract_sections_from_html(page, site)
+    region_sections = extractor.extract_sections_from_html(region, site)
+    assert len(sections) == 5
+    assert [(s.name, s.url, len(s.subsections)) for s in sections] == \
+        [(s.name, s.url, len(s.subsections)) for s in region_sections]
+
+
+def test_set_html_parser():
+    set_html_parser('html.parser')
+    assert get_html_parser() == 'html.parser'
+    set_html_parser(None)
+    assert get_html_parser() in HTML_PARSERS
+    with pytest.raises(ValueError):
+        set_html_parser('no-such-parser')
+
+
+def test_has_class():
+    match = has_class('course')
+    assert match('course')
+    assert match('course audit')
+    assert match(['honor', 'course'])
+    assert not match('course-info')
+    assert not match(None)
+
+
 def test_is_youtube_url():
     invalid_urls = [
         'http://www.google.com/', 'TODO',
@@ -152,3 +235,91 @@ def test_is_youtube_url():
         assert not is_youtube_url(url)
     for url in valid_urls:
         assert is_youtube_url(url)
+
+
+def test_split_units():
+    page = ('<div id="seq_contents_0">a</div>'
+            '<div id="seq_contents_1">b</div>'
+            '<div id="seq_contents_2">c')
+    assert split_units(page) == ['<div id="seq_contents_0">a</div>',
+                                 '<div id="seq_contents_1">b</div>']
+    assert split_units('<div id="seq_contents_0">' * 1000) == []
+
+
+def test_iter_units():
+    page = ('<div id="seq_contents_0">a</div>'
+            '<div id="seq_contents_1">b</div>'
+            '<div id="seq_contents_2">c')
+    for size in (1, 2, 5, 64):
+        chunks = (page[i:i + size] for i in range(0, len(page), size))
+        assert list(iter_units(chunks)) == split_units(page)
+
+
+def test_extract_units_from_stream():
+    site = 'https://courses.edx.org'
+    with open("test/html/multiple_units.html", "r") as f:
+        page = f.read()
+    chunks = (page[i:i + 1000] for i in range(0, len(page), 1000))
+    extractor = ClassicEdXPageExtractor()
+    units = extractor.extract_units_from_stream(chunks, site, DEFAULT_FILE_FORMATS)
+    expected = extractor.extract_units_from_html(page, site, DEFAULT_FILE_FORMATS)
+    assert [unit.to_dict() for unit in units] == [unit.to_dict() for unit in expected]
+
+
+def test_scan_unit():
+    text = ('data-sources=&#34;http://a/1.mp4;https://b/2.mp4;http://c/3.webm&#34; '
+            '&lt;a href=&#34;/static/notes.pdf&#34;&gt;'
+            '&lt;a href=&#34;https://youtu.be/rjOpZ3i6pRo&#34;&gt;'
+            '&lt;a href=&#34;//cdn/slides.pdf&#34;&gt;')
+    scan = scan_unit(text, ['pdf'])
+    assert scan.mp4_urls == ['http://a/1.mp4', 'https://b/2.mp4']
+    assert scan.resources_urls == ['/static/notes.pdf', '//cdn/slides.pdf']
+    assert scan.youtube_links == ['https://youtu.be/rjOpZ3i6pRo']
+    assert scan.video_streams_id is None
+    assert scan_unit('http://x/' * 1000, ['pdf']).mp4_urls == []
+
+
+def test_scan_unit_nested_youtube_links():
+    # The first link ends at the quote opening the second one, which is
+    # skipped since it starts inside the first, as with findall
+    text = ('&lt;a href=&#34;https://youtu.be/a?x=&lt;a href=&#34;'
+            'https://youtu.be/b&#34;&gt; &lt;a href=&#34;https://youtu.be/c&#34;')
+    scan = scan_unit(text, ['pdf'])
+    assert scan.youtube_links == RE_YOUTUBE_LINK.findall(text)
+    assert scan.youtube_links == ['https://youtu.be/a?x=&lt;a href=',
+                                  'https://youtu.be/c']
+
+
+@pytest.mark.parametrize(
+    'filename,extractor_class,num_sections_expected', [
+        ('test/html/multiple_units.html', ClassicEdXPageExtractor, 5),
+        ('test/html/new_sections_structure.html', CurrentEdXPageExtractor, 2),
+        ('test/html/new_sections_structure.html', NewEdXPageExtractor, 0),
+        ('test/html/empty_sections.html', NewEdXPageExtractor, 0),
+    ]
+)
+def test_available_sections_parse_the_page_once(monkeypatch, filename, extractor_class,
+                                                num_sections_expected):
+    from edx_dl import edx_dl
+
+    with open(filename, 'r') as f:
+        page = f.read()
+    extractor = extractor_class()
+    parsed = []
+
+    def extract_sections_from_html(page, BASE_URL):
+        parsed.append(len(page))
+        return extractor_class.extract_sections_from_html(extractor, page, BASE_URL)
+
+    monkeypatch.setattr(extractor, 'extract_sections_from_html', extract_sections_from_html)
+    monkeypatch.setattr(edx_dl, 'get_page_contents', lambda url, headers: page)
+    monkeypatch.setattr(edx_dl, 'get_page_extractor', lambda url: extractor)
+
+    sections = edx_dl.get_available_sections('https://courses.edx.org/c', {})
+    assert len(sections) == num_sections_expected
+    if num_sections_expected:
+        assert len(parsed) == 1
+        assert parsed[0] < len(page) // 2
+    else:
+        # The whole page has been parsed, but only once
+        assert parsed == [len(page)]
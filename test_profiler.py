@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+from edx_dl import profiler
+from edx_dl.profiler import NUM_SLOWEST_URLS, Profiler, profile, record
+from fake_http import FakeResponse
+
+
+def test_stage_times_spans():
+    p = Profiler()
+    with p.stage('extraction'):
+        with p.stage('extraction/page', 'http://a'):
+            pass
+        with p.stage('extraction/page', 'http://b'):
+            pass
+
+    assert list(p.stages) == ['extraction', 'extraction/page']
+    page = p.stages['extraction/page']
+    assert page.calls == 2
+    assert sorted(url for _, url in page.slowest) == ['http://a', 'http://b']
+    assert p.stages['extraction'].seconds >= page.seconds
+
+
+def test_slowest_urls_are_bounded():
+    p = Profiler()
+    for i in range(10):
+        p.record('downloads/file', i, 'http://%d' % i)
+
+    stats = p.stages['downloads/file']
+    assert stats.calls == 10
+    assert stats.max_seconds == 9
+    assert sorted(stats.slowest, reverse=True) == [
+        (i, 'http://%d' % i) for i in range(9, 9 - NUM_SLOWEST_URLS, -1)]
+
+
+def test_requests_are_counted_in_current_stage():
+    p = Profiler()
+
+    def download():
+        with p.stage('downloads/file', 'http://file'):
+            p.response_hook(FakeResponse(headers={'Content-Length': '100'}),
+                            stream=True)
+
+    def extract():
+        # threads without spans count in the stage of the main thread
+        p.response_hook(FakeResponse(b'page'), stream=False)
+
+    with p.stage('extraction'):
+        threads = [threading.Thread(target=download),
+                   threading.Thread(target=extract)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    p.response_hook(FakeResponse(b'x'))
+
+    assert p.stages['downloads/file'].requests == 1
+    assert p.stages['downloads/file'].bytes == 100
+    assert p.stages['extraction'].requests == 1
+    assert p.stages['extraction'].bytes == 4
+    assert p.stages['other'].requests == 1
+
+
+def test_summary():
+    p = Profiler()
+    p.record('courses', 0.5, 'http://dashboard')
+    p.record_request(1234)
+
+    summary = p.summary()
+    assert 'courses' in summary
+    assert 'http://dashboard' in summary
+    assert '1234' in summary
+
+
+def test_profile_is_disabled_by_default():
+    assert profiler.get_profiler() is None
+    with profile('courses', 'http://dashboard'):
+        pass
+    record('courses', 1)
+
+
+def test_profile_uses_profiler_set():
+    p = Profiler()
+    profiler.set_profiler(p)
+    try:
+        with profile('courses', 'http://dashboard'):
+            pass
+        record('downloads', 1)
+    finally:
+        profiler.set_profiler(None)
+
+    assert list(p.stages) == ['courses', 'downloads']
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+
+from six import StringIO
+
+from edx_dl import progress
+from edx_dl.progress import (
+    Progress,
+    ProgressReporter,
+    parse_youtube_dl_progress,
+)
+from edx_dl.utils import execute_command
+
+
+def test_snapshot_estimates_sizes_by_extension():
+    p = Progress()
+    for url in ['https://a.org/1.mp4', 'https://a.org/2.mp4',
+                'https://a.org/1.pdf', 'https://a.org/3.mp4',
+                'https://a.org/1.mp4']:
+        p.plan(url)
+
+    # Nothing to estimate the sizes from yet
+    assert p.snapshot()['total'] is None
+
+    transfer = p.start('https://a.org/1.mp4', 'x/1.mp4')
+    p.set_size(transfer, 1000)
+    p.add_received(transfer, 1000)
+    p.finish(transfer)
+    transfer = p.start('https://a.org/1.pdf', 'x/1.pdf')
+    p.add_received(transfer, 10)
+    p.finish(transfer)
+    p.skip('https://a.org/3.mp4')
+    transfer = p.start('https://a.org/2.mp4', 'x/2.mp4')
+    p.add_received(transfer, 300)
+
+    snapshot = p.snapshot()
+    assert snapshot['planned'] == 4
+    assert (snapshot['done'], snapshot['skipped'], snapshot['failed'],
+            snapshot['active']) == (2, 1, 0, 1)
+    assert snapshot['received'] == 1310
+    # The size of 2.mp4 is estimated with the one of 1.mp4
+    assert snapshot['total'] == 2010
+    assert snapshot['transfers'] == [
+        (threading.current_thread().name, '2.mp4', 300, None)]
+
+    p.set_size(transfer, 500, received=0)
+    p.finish(transfer, ok=False)
+    snapshot = p.snapshot()
+    assert snapshot['failed'] == 1
+    assert snapshot['total'] == 1010
+    assert snapshot['received_total'] == 1310
+
+
+def test_parse_youtube_dl_progress():
+    assert parse_youtube_dl_progress(
+        '[download]  25.0% of 4.00MiB at  1.23MiB/s ETA 00:03\n') == \
+        (4 * 1024 ** 2, 1024 ** 2)
+    assert parse_youtube_dl_progress(
+        '[download]  50.0% of ~2.00KiB at 10.00KiB/s ETA 00:00') == \
+        (2048, 1024)
+    assert parse_youtube_dl_progress(
+        '[download] 100% of 3.00MiB in 00:02') == (3 * 1024 ** 2,
+                                                    3 * 1024 ** 2)
+    assert parse_youtube_dl_progress(
+        '[download] Destination: video.mp4') is None
+    assert parse_youtube_dl_progress('[youtube] abc: Downloading') is None
+
+
+def test_reporter_quiet_prints_one_line():
+    p = Progress()
+    p.plan('https://a.org/1.mp4')
+    p.plan('https://a.org/2.mp4')
+    transfer = p.start('https://a.org/1.mp4', '1.mp4')
+    p.set_size(transfer, 2000000)
+    p.add_received(transfer, 2000000)
+    p.finish(transfer)
+
+    stream = StringIO()
+    reporter = ProgressReporter(p, interval=0, quiet=True, stream=stream)
+    reporter.start()
+    reporter.report()
+    reporter.stop()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith('Progress: 1/2 files, 2.0 MB of ~4.0 MB, ')
+    assert ', ETA ' in lines[0]
+    assert lines[1].startswith('Progress: 1/2 files, 2.0 MB of ~4.0 MB, ')
+    assert ', done in ' in lines[1]
+
+
+def test_module_functions_track_the_transfer_of_the_thread():
+    assert progress.get_progress() is None
+    progress.plan(['https://a.org/1.mp4'])
+    assert progress.start_transfer('https://a.org/1.mp4', '1.mp4') is None
+    progress.count_received(10)
+
+    p = Progress()
+    progress.set_progress(p)
+    try:
+        progress.plan(['https://a.org/1.mp4', None])
+        transfer = progress.start_transfer('https://a.org/1.mp4', '1.mp4')
+        progress.set_size(100)
+
+        def segment():
+            with progress.in_transfer(transfer):
+                progress.count_received(40)
+        thread = threading.Thread(target=segment)
+        thread.start()
+        thread.join()
+        progress.count_received(60)
+        progress.youtube_dl_output('[download] 100% of 1.00KiB in 00:00')
+        assert transfer.size == 1024
+        assert transfer.received == 1024
+        progress.finish_transfer(transfer)
+        assert progress.current_transfer() is None
+    finally:
+        progress.set_progress(None)
+
+    snapshot = p.snapshot()
+    assert snapshot['planned'] == 1
+    assert snapshot['done'] == 1
+    assert snapshot['received'] == 1024
+
+
+def test_execute_command_output_callback():
+    lines = []
+    execute_command([sys.executable, '-c', 'print("a"); print("b")'], None,
+                    output_callback=lines.append)
+    assert lines == ['a\n', 'b\n']
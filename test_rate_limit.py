@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+import requests
+
+from edx_dl.rate_limit import (
+    HostRateLimiter,
+    TokenBucket,
+    parse_bandwidth,
+    parse_rate_limit,
+)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, clock=clock)
+
+    # A burst of one second worth, then paced
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+
+    clock.now += 1.0
+    assert bucket.reserve() == 0.5
+
+    # Never more than the capacity is saved
+    clock.now += 60
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve(4) == 2.0
+
+
+def test_parse_rate_limit():
+    assert parse_bandwidth('500') == 500
+    assert parse_bandwidth('2k') == 2048
+    assert parse_bandwidth('1.5M') == 1024 ** 2 * 3 // 2
+    assert parse_bandwidth('') is None
+    assert parse_bandwidth('0') is None
+
+    assert parse_rate_limit('site=5') == ('site', (5, None))
+    assert parse_rate_limit('cdn=/20M') == ('cdn', (None, 20 * 1024 ** 2))
+    assert parse_rate_limit('youtube=0.5/1M') == ('youtube',
+                                                  (0.5, 1024 ** 2))
+    assert parse_rate_limit('a.org=0') == ('a.org', (None, None))
+    for spec in ['site', '=5', 'site=fast', 'site=-1', 'cdn=/-1M']:
+        with pytest.raises(ValueError):
+            parse_rate_limit(spec)
+
+
+def test_limits_by_target():
+    limiter = HostRateLimiter({'site': (5, None), 'cdn': (None, 1000),
+                               'youtube': (1, 2000), 'b.org': (2, None)},
+                              'https://courses.edx.org')
+    assert limiter.get_limits('courses.edx.org') == (5, None)
+    assert limiter.get_limits('a.org') == (None, 1000)
+    assert limiter.get_limits('b.org') == (2, None)
+    assert limiter.get_limits('youtube') == (1, 2000)
+    assert limiter.get_bandwidth('https://youtu.be/abc') == 2000
+    assert limiter.get_bandwidth('https://courses.edx.org/x') is None
+
+    assert HostRateLimiter({}).get_limits('a.org') == (None, None)
+
+
+def test_buckets_are_per_host():
+    limiter = HostRateLimiter({'cdn': (1, 100)})
+    assert limiter.reserve_request('https://a.org/1') == 0
+    assert limiter.reserve_request('https://b.org/1') == 0
+    assert limiter.reserve_request('https://a.org/2') > 0.9
+    assert limiter.reserve_bytes('https://a.org/1', 100) == 0
+    assert limiter.reserve_bytes('https://a.org/1', 50) > 0.4
+    assert limiter.reserve_bytes('https://b.org/1', 50) == 0
+
+
+class InstantAdapter(requests.adapters.BaseAdapter):
+    """
+    Adapter answering every request right away with an empty page.
+    """
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+def test_watch_session_paces_requests():
+    session = requests.Session()
+    session.mount('https://', InstantAdapter())
+    limiter = HostRateLimiter({'site': (20, None)}, 'https://a.org')
+    limiter.watch_session(session)
+
+    started = time.time()
+    for _ in range(20):
+        session.get('https://b.org/')
+    assert time.time() - started < 0.2
+
+    started = time.time()
+    for _ in range(30):
+        session.get('https://a.org/')
+    # A burst of 20 requests and then 10 more at 20 per second
+    assert 0.45 <= time.time() - started < 1
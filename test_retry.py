@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+import requests
+from requests.exceptions import ConnectionError, HTTPError, SSLError
+
+from edx_dl import metrics, retry
+from edx_dl.metrics import Metrics
+from edx_dl.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_retry_after,
+    is_retryable,
+)
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return HTTPError(response=response)
+
+
+class Failing(object):
+    """
+    Callable raising the given exceptions, one per call, and then
+    returning 'ok'.
+    """
+
+    def __init__(self, *exceptions):
+        self.exceptions = list(exceptions)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.exceptions:
+            raise self.exceptions.pop(0)
+        return 'ok'
+
+
+def test_is_retryable():
+    assert is_retryable(http_error(429))
+    assert is_retryable(http_error(503))
+    assert is_retryable(ConnectionError())
+    assert is_retryable(requests.exceptions.ChunkedEncodingError())
+    assert not is_retryable(http_error(404))
+    assert not is_retryable(SSLError())
+    assert not is_retryable(ValueError())
+
+
+def test_get_retry_after():
+    assert get_retry_after(http_error(429, {'Retry-After': '7'})) == 7
+    assert get_retry_after(
+        http_error(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:30 GMT'}),
+        now=1445412500) == 10
+    assert get_retry_after(http_error(503)) is None
+    assert get_retry_after(http_error(503, {'Retry-After': 'soon'})) is None
+    assert get_retry_after(ConnectionError()) is None
+
+
+def test_retries_with_backoff_and_retry_after():
+    delays = []
+    policy = RetryPolicy(max_retries=3, base_delay=1, max_delay=10,
+                         sleep=delays.append)
+    func = Failing(ConnectionError(), http_error(429, {'Retry-After': '5'}),
+                   http_error(502))
+
+    m = Metrics()
+    metrics.set_metrics(m)
+    try:
+        assert policy.call('https://a.org/x', func) == 'ok'
+    finally:
+        metrics.set_metrics(None)
+
+    assert func.calls == 4
+    assert 0 <= delays[0] <= 1
+    assert delays[1] == 5
+    assert 0 <= delays[2] <= 4
+    assert m.to_dict()['retries'] == {'a.org': 3}
+
+
+def test_gives_up():
+    policy = RetryPolicy(max_retries=2, sleep=lambda delay: None)
+    func = Failing(*[ConnectionError()] * 3)
+    with pytest.raises(ConnectionError):
+        policy.call('https://a.org/x', func)
+    assert func.calls == 3
+
+    func = Failing(http_error(404))
+    with pytest.raises(HTTPError):
+        policy.call('https://a.org/x', func)
+    assert func.calls == 1
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record('a.org', failed=True)
+    breaker.check('a.org')
+    breaker.record('a.org', failed=True)
+    assert breaker.is_open('a.org')
+    with pytest.raises(CircuitOpenError):
+        breaker.check('a.org')
+    breaker.check('b.org')
+
+    time.sleep(0.05)
+    # A single probe is let through
+    breaker.check('a.org')
+    with pytest.raises(CircuitOpenError):
+        breaker.check('a.org')
+    breaker.record('a.org', failed=True)
+    with pytest.raises(CircuitOpenError):
+        breaker.check('a.org')
+
+    time.sleep(0.05)
+    breaker.check('a.org')
+    breaker.record('a.org', failed=False)
+    assert not breaker.is_open('a.org')
+    breaker.check('a.org')
+
+
+def test_open_circuit_waits_for_the_probe():
+    delays = []
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    policy = RetryPolicy(max_retries=2, breaker=breaker,
+                         sleep=delays.append)
+    func = Failing(*[http_error(503)] * 3)
+    with pytest.raises(CircuitOpenError):
+        policy.call('https://a.org/x', func)
+    assert func.calls == 1
+    assert breaker.is_open('a.org')
+    assert 29 < delays[1] <= 30
+
+
+def test_retry_call_without_policy():
+    assert retry.get_retry_policy() is None
+    func = Failing(ConnectionError())
+    with pytest.raises(ConnectionError):
+        retry.retry_call('https://a.org/x', func)
+
+
+def test_get_page_response_retries(monkeypatch):
+    from benchmarks.edx_server import EdXServer
+    from edx_dl.utils import get_page_response
+
+    monkeypatch.setattr(retry, '_policy',
+                        RetryPolicy(max_retries=20, base_delay=0.001,
+                                    max_delay=0.01))
+    with EdXServer(video_size=64 * 1024, throttle_rate=0.5, fault_rate=0.3,
+                   seed=1) as server:
+        for _ in range(5):
+            response = get_page_response(
+                server.url + '/cdn/C1/s1/ss1/a.org/video.mp4', {})
+            assert len(response.content) == server.video_size
+        assert server.stats['throttled'] + server.stats['faults'] > 0
+
+
+def test_nested_retry_calls_are_attempted_once(monkeypatch):
+    monkeypatch.setattr(retry, '_policy',
+                        RetryPolicy(max_retries=3, sleep=lambda delay: None))
+    inner = Failing(ConnectionError(), ConnectionError())
+
+    def outer():
+        return retry.retry_call('https://a.org/x', inner)
+
+    assert retry.retry_call('https://a.org/x', outer) == 'ok'
+    assert inner.calls == 3
+
+
+def test_extract_units_retries_truncated_pages(monkeypatch):
+    from benchmarks.edx_server import SESSION_ID, EdXServer
+    from edx_dl import edx_dl
+
+    monkeypatch.setattr(retry, '_policy',
+                        RetryPolicy(max_retries=3, base_delay=0.001,
+                                    max_delay=0.01))
+    headers = {'Cookie': 'sessionid=' + SESSION_ID}
+    with EdXServer() as server:
+        url = server.url + '/courses/bench/C1/run/courseware/s1/ss1/'
+        expected = edx_dl.extract_units(url, headers, ['pdf'])
+        assert expected
+
+        # Cut the body of the next page halfway
+        failures = ['drop']
+        monkeypatch.setattr(server, 'draw_failure',
+                            lambda path: failures.pop() if failures else None)
+        units = edx_dl.extract_units(url, headers, ['pdf'])
+
+        assert not failures
+        assert [unit.to_dict() for unit in units] == \
+            [unit.to_dict() for unit in expected]
+        assert server.stats['requests'] == 3
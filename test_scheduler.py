@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from edx_dl.scheduler import DownloadScheduler, get_host_key
+
+
+def test_get_host_key():
+    assert get_host_key('https://d2f1egay8yehza.cloudfront.net/a.mp4') == \
+        'd2f1egay8yehza.cloudfront.net'
+    assert get_host_key('https://www.youtube.com/watch?v=rjOpZ3i6pRo') == \
+        'youtube'
+    assert get_host_key('https://youtu.be/rjOpZ3i6pRo') == 'youtube'
+    assert get_host_key(None) is None
+
+
+def test_scheduler_runs_all_jobs():
+    done = []
+    scheduler = DownloadScheduler(num_workers=4, max_per_host=2)
+    for i in range(20):
+        scheduler.submit('http://host%d/file' % (i % 3), done.append, i)
+    scheduler.join()
+
+    assert sorted(done) == list(range(20))
+
+
+def test_scheduler_limits_per_host():
+    lock = threading.Lock()
+    running = {}
+    max_running = {}
+
+    def job(host):
+        with lock:
+            running[host] = running.get(host, 0) + 1
+            max_running[host] = max(max_running.get(host, 0), running[host])
+        time.sleep(0.01)
+        with lock:
+            running[host] -= 1
+
+    scheduler = DownloadScheduler(num_workers=8, max_per_host=2)
+    for i in range(24):
+        host = 'host%d' % (i % 2)
+        scheduler.submit('http://%s/file' % host, job, host)
+    scheduler.join()
+
+    assert max_running == {'host0': 2, 'host1': 2}
+
+
+def test_scheduler_reraises_first_error():
+    def fail():
+        raise ValueError('boom')
+
+    scheduler = DownloadScheduler(num_workers=2, max_per_host=1)
+    scheduler.submit('http://host/a', fail)
+    with pytest.raises(ValueError):
+        scheduler.join()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pickle
+import time
+
+import pytest
+
+from edx_dl import edx_dl, parsing
+from edx_dl.common import Unit, Video
+from edx_dl.unit_cache import (
+    UnitCache,
+    deserialize_units,
+    discard_pickle_cache,
+    serialize_units,
+)
+
+
+def _units(name):
+    return [Unit(videos=[Video(video_youtube_url='https://youtube.com/watch?v=' + name,
+                               available_subs_url=None,
+                               sub_template_url='https://edx/' + name + '/%s',
+                               mp4_urls=['https://cdn/' + name + '.mp4'])],
+                 resources_urls=['https://edx/' + name + '.pdf'])]
+
+
+def _as_dicts(all_units):
+    return {url: [unit.to_dict() for unit in units]
+            for url, units in all_units.items()}
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = UnitCache(str(tmpdir.join('edx-dl.cache.db')))
+    yield cache
+    cache.close()
+
+
+def test_serialization_round_trip():
+    units = _units('a') + [Unit(videos=[], resources_urls=[])]
+    assert [u.to_dict() for u in deserialize_units(serialize_units(units))] == \
+        [u.to_dict() for u in units]
+
+
+def test_get_many_only_returns_cached_urls(cache):
+    cache.put_many({'a': _units('a'), 'b': _units('b')}, ['pdf'])
+
+    cached_units = cache.get_many(['a', 'c'], ['pdf'])
+
+    assert _as_dicts(cached_units) == _as_dicts({'a': _units('a')})
+    assert len(cache) == 2
+
+
+def test_put_many_replaces_entries(cache):
+    cache.put_many({'a': _units('a')}, ['pdf'])
+    cache.put_many({'a': _units('b')}, ['pdf'])
+
+    assert _as_dicts(cache.get_many(['a'], ['pdf'])) == \
+        _as_dicts({'a': _units('b')})
+    assert len(cache) == 1
+
+
+def test_get_many_with_many_urls(cache):
+    all_units = {'url%d' % i: _units(str(i)) for i in range(1200)}
+    cache.put_many(all_units, ['pdf'])
+
+    assert _as_dicts(cache.get_many(list(all_units), ['pdf'])) == \
+        _as_dicts(all_units)
+
+
+def test_discard_pickle_cache(tmpdir, cache):
+    pickle_filename = tmpdir.join('edx-dl.cache')
+    with open(str(pickle_filename), 'wb') as f:
+        pickle.dump({'a': _units('a')}, f)
+
+    discard_pickle_cache(str(pickle_filename))
+
+    # The old units are not trusted, they are extracted again
+    assert cache.get_many(['a'], ['pdf']) == {}
+    assert not pickle_filename.exists()
+    assert tmpdir.join('edx-dl.cache.old').exists()
+
+    discard_pickle_cache(str(pickle_filename))
+    assert tmpdir.join('edx-dl.cache.old').exists()
+
+
+def test_extract_all_units_with_cache(tmpdir):
+    filename = str(tmpdir.join('edx-dl.cache.db'))
+    extracted = []
+
+    def extractor(urls, headers, file_formats):
+        extracted.extend(urls)
+        return {url: _units(url) for url in urls}
+
+    all_units = edx_dl.extract_all_units_with_cache(['a', 'b'], {}, [],
+                                                    filename, extractor)
+    assert list(all_units) == ['a', 'b']
+    assert extracted == ['a', 'b']
+
+    all_units = edx_dl.extract_all_units_with_cache(['c', 'b', 'a'], {}, [],
+                                                    filename, extractor)
+    assert list(all_units) == ['c', 'b', 'a']
+    assert extracted == ['a', 'b', 'c']
+    assert _as_dicts(all_units) == _as_dicts({url: _units(url)
+                                              for url in 'abc'})
+
+
+def test_entries_are_keyed_by_file_formats(cache):
+    cache.put_many({'a': _units('a')}, ['pdf', 'zip'])
+
+    assert list(cache.get_many(['a'], ['zip', 'pdf', 'zip'])) == ['a']
+    assert cache.get_many(['a'], ['pdf']) == {}
+
+
+def test_entries_are_keyed_by_extractor_version(cache, monkeypatch):
+    cache.put_many({'a': _units('a')}, ['pdf'])
+
+    monkeypatch.setattr(parsing.PageExtractor, 'VERSION', 2)
+    assert cache.get_many(['a'], ['pdf']) == {}
+
+
+def test_entries_expire(cache):
+    cache.put_many({'a': _units('a')}, ['pdf'])
+
+    assert list(cache.get_many(['a'], ['pdf'], max_age=60)) == ['a']
+    time.sleep(0.01)
+    assert cache.get_many(['a'], ['pdf'], max_age=0) == {}
+
+    cache.expire(60)
+    assert len(cache) == 1
+    cache.expire(0)
+    assert len(cache) == 0
+
+
+def test_invalidate(cache):
+    cache.put_many({'a': _units('a'), 'b': _units('b')}, ['pdf'])
+    cache.put_many({'a': _units('a')}, ['zip'])
+
+    cache.invalidate(['a'])
+
+    assert cache.get_many(['a'], ['pdf']) == {}
+    assert cache.get_many(['a'], ['zip']) == {}
+    assert list(cache.get_many(['a', 'b'], ['pdf'])) == ['b']
+
+
+def test_old_schema_is_discarded(tmpdir):
+    import sqlite3
+    filename = str(tmpdir.join('edx-dl.cache.db'))
+    connection = sqlite3.connect(filename)
+    connection.execute('CREATE TABLE units (url TEXT PRIMARY KEY, data TEXT)')
+    connection.execute("INSERT INTO units VALUES ('a', '[]')")
+    connection.commit()
+    connection.close()
+
+    cache = UnitCache(filename)
+    assert len(cache) == 0
+    cache.put_many({'a': _units('a')}, ['pdf'])
+    assert list(cache.get_many(['a'], ['pdf'])) == ['a']
+    cache.close()
@@ -4,11 +4,13 @@
 from __future__ import unicode_literals
 
 import subprocess
+import sys
 
 import pytest
 import six
 
 from edx_dl import utils
+from fake_http import FakeResponse
 
 
 def test_clean_filename():
@@ -70,6 +72,15 @@ def test_execute_command_should_fail():
     # actual_res == 2, actual_res
 
 
+def test_execute_command_ignored_error():
+    class Args(object):
+        ignore_errors = True
+
+    assert utils.execute_command([sys.executable, '-c', 'pass'], Args())
+    assert utils.execute_command([sys.executable, '-c', 'exit(2)'],
+                                 Args()) is False
+
+
 def test_get_filename_from_prefix():
     target_dir = '.'
 
@@ -169,3 +180,44 @@ def test_remove_duplicates_with_seen():
     for l, seen_before, reduced_l, seen_after in lists:
         actual_res = utils.remove_duplicates(l, seen_before)
         assert actual_res == (reduced_l, seen_after), actual_res
+
+
+@pytest.mark.parametrize('decode_content', [True, False])
+def test_write_response_to_file(decode_content):
+    body = b'0123456789' * 10
+    response = FakeResponse(body)
+    fp = six.BytesIO()
+
+    written = utils.write_response_to_file(response, fp, 7,
+                                           decode_content=decode_content)
+
+    assert written == len(body)
+    assert fp.getvalue() == body
+    assert response.chunk_sizes == ([7] if decode_content else [])
+
+
+def test_get_content_charset():
+    cases = {
+        '': 'utf-8',
+        'text/html': 'utf-8',
+        'text/html; charset=ISO-8859-1': 'ISO-8859-1',
+        'text/html;charset="latin-1"': 'latin-1',
+        'application/json; foo=bar; Charset=utf-16': 'utf-16',
+        'text/html; charset=': 'utf-8',
+    }
+    for k, v in six.iteritems(cases):
+        actual_res = utils.get_content_charset(k)
+        assert actual_res == v, actual_res
+
+
+def test_iter_response_text():
+    text = 'ação ' * 10
+    response = FakeResponse(text.encode('utf-8'))
+    chunks = list(utils.iter_response_text(response, 3))
+    assert ''.join(chunks) == text
+    assert len(chunks) > 1
+    assert response.closed
+
+    response = FakeResponse(text.encode('latin-1'), headers={
+        'Content-Type': 'text/html; charset=ISO-8859-1'})
+    assert ''.join(utils.iter_response_text(response, 3)) == text
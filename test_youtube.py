@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+
+import pytest
+
+from edx_dl import edx_dl, progress
+from edx_dl.youtube import YoutubeDownloader, is_youtube_dl_available
+
+youtube_dl = pytest.importorskip('youtube_dl')
+
+
+@pytest.fixture
+def server():
+    from benchmarks.edx_server import EdXServer
+
+    with EdXServer(video_size=64 * 1024) as server:
+        yield server
+
+
+def test_downloads_reuse_instances(server, tmpdir):
+    downloader = YoutubeDownloader('mp4', max_instances=2)
+    template = os.path.join(str(tmpdir), 'prefix-%(title)s-%(id)s.%(ext)s')
+
+    p = progress.Progress()
+    progress.set_progress(p)
+    try:
+        for i in range(3):
+            url = server.url + '/cdn/C1/s1/ss1/a.org/video%d.mp4' % i
+            transfer = progress.start_transfer(url, template)
+            downloader.download(url, template)
+            assert transfer.size == transfer.received == server.video_size
+            progress.finish_transfer(transfer)
+    finally:
+        progress.set_progress(None)
+
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'prefix-video%d-video%d.mp4' % (i, i) for i in range(3)]
+    # The downloads were one after the other
+    assert downloader._num_instances == 1
+    assert p.snapshot()['received'] == 3 * server.video_size
+
+
+def test_download_errors(server, tmpdir):
+    downloader = YoutubeDownloader('mp4')
+    template = os.path.join(str(tmpdir), '%(id)s.%(ext)s')
+    url = server.url + '/missing'
+    with pytest.raises(youtube_dl.utils.DownloadError):
+        downloader.download(url, template)
+    assert downloader.download(url, template, ignore_errors=True) is False
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_ignored_errors_count_as_failed(server, tmpdir, monkeypatch):
+    from edx_dl import youtube
+
+    monkeypatch.setattr(youtube, '_downloader', YoutubeDownloader('mp4'))
+    monkeypatch.setattr(edx_dl, 'is_youtube_url', lambda url: True)
+    args = argparse.Namespace(ignore_errors=True, dry_run=False,
+                              downloads_per_host=1)
+    template = os.path.join(str(tmpdir), '%(id)s.%(ext)s')
+    url = server.url + '/missing'
+
+    p = progress.Progress()
+    progress.set_progress(p)
+    try:
+        progress.plan([url])
+        edx_dl.skip_or_download({url: template}, {}, args)
+    finally:
+        progress.set_progress(None)
+
+    snapshot = p.snapshot()
+    assert (snapshot['done'], snapshot['failed']) == (0, 1)
+
+
+def test_get_youtube_downloader():
+    args = argparse.Namespace(format=None, subtitles=True,
+                              downloads_per_host=2, youtube_dl_options='',
+                              youtube_dl_subprocess=False)
+    assert is_youtube_dl_available()
+    downloader = edx_dl._get_youtube_downloader(args)
+    assert downloader.params['format'] == 'mp4'
+    assert downloader.params['allsubtitles']
+    assert downloader.max_instances == 2
+
+    args.format = '22'
+    assert edx_dl._get_youtube_downloader(args).params['format'] == '22/mp4'
+
+    # Only the command understands the extra options
+    args.youtube_dl_options = '--username someone'
+    assert edx_dl._get_youtube_downloader(args) is None
+    args.youtube_dl_options = ''
+    args.youtube_dl_subprocess = True
+    assert edx_dl._get_youtube_downloader(args) is None
+
+
+def test_params_have_the_defaults_of_the_command():
+    downloader = YoutubeDownloader('22/mp4', subtitles=True)
+    params = downloader.params
+
+    assert params['format'] == '22/mp4'
+    assert params['retries'] == 10
+    assert params['fragment_retries'] == 10
+    assert params['continuedl']
+    assert params['buffersize'] == 1024
+    assert params['writesubtitles']
+    assert params['allsubtitles']
+    assert params['noprogress']
+
+    params = YoutubeDownloader('mp4').params
+    assert not params['writesubtitles']
+    assert not params['allsubtitles']